@@ -76,14 +76,96 @@ else:
         }
     }
 
+# Read replica routing (only active when settings_prod configures DATABASES['replica'])
+REPLICA_MAX_LAG_SECONDS = float(os.getenv('REPLICA_MAX_LAG_SECONDS', 5))
+REPLICA_LAG_CHECK_INTERVAL = float(os.getenv('REPLICA_LAG_CHECK_INTERVAL', 5))
+READ_YOUR_WRITES_SECONDS = int(os.getenv('READ_YOUR_WRITES_SECONDS', 15))
+
+# Queries older than this are moved to the compressed archive by archive_queries
+QUERY_ARCHIVE_AFTER_DAYS = int(os.getenv('QUERY_ARCHIVE_AFTER_DAYS', 365))
+
+# Answers still streaming with no new chunk for this long are deleted by archive_queries
+QUERY_STREAM_ABANDON_HOURS = int(os.getenv('QUERY_STREAM_ABANDON_HOURS', 24))
+
+# Daily search counts older than this are rolled into MonthlySearchUsage by rollup_search_counts
+SEARCH_COUNT_RETENTION_DAYS = int(os.getenv('SEARCH_COUNT_RETENTION_DAYS', 35))
+
+# customer.subscription.updated events for one subscription within this window are applied once, newest first
+SUBSCRIPTION_EVENT_COALESCE_SECONDS = int(os.getenv('SUBSCRIPTION_EVENT_COALESCE_SECONDS', 5))
+
+# Stripe-billed subscriptions get this long past their period end for the renewal webhook before expire_subscriptions ends them
+SUBSCRIPTION_EXPIRY_GRACE_HOURS = int(os.getenv('SUBSCRIPTION_EXPIRY_GRACE_HOURS', 24))
+
+# Per-worker ceiling for send_broadcasts; keep under the SMTP provider's sending limit
+BROADCAST_MAX_PER_SECOND = float(os.getenv('BROADCAST_MAX_PER_SECOND', 200))
+
+# Student ID documents are uploaded in chunks of at most STUDENT_ID_CHUNK_BYTES; keep it
+# under DATA_UPLOAD_MAX_MEMORY_SIZE (2.5MB by default)
+STUDENT_ID_MAX_BYTES = int(os.getenv('STUDENT_ID_MAX_BYTES', 20 * 1024 * 1024))
+STUDENT_ID_CHUNK_BYTES = int(os.getenv('STUDENT_ID_CHUNK_BYTES', 1024 * 1024))
+
+# Personal-data exports can be downloaded for this long, then export_user_data deletes them
+DATA_EXPORT_TTL_HOURS = int(os.getenv('DATA_EXPORT_TTL_HOURS', 48))
+
+# Upper bound on how long a cached users/me/ bootstrap lives; writes invalidate it sooner
+BOOTSTRAP_CACHE_SECONDS = int(os.getenv('BOOTSTRAP_CACHE_SECONDS', 3600))
+
+# Responses under COMPRESSION_MIN_BYTES are sent uncompressed. Larger bodies of views with
+# cache_compressed_responses keep their compressed form in a per-worker cache of this many bytes
+COMPRESSION_MIN_BYTES = int(os.getenv('COMPRESSION_MIN_BYTES', 1024))
+COMPRESSION_CACHE_MIN_BYTES = int(os.getenv('COMPRESSION_CACHE_MIN_BYTES', 16 * 1024))
+COMPRESSION_CACHE_MAX_BYTES = int(os.getenv('COMPRESSION_CACHE_MAX_BYTES', 16 * 1024 * 1024))
+
+# Serialized query details are cached in Redis for this long (they're invalidated on change)
+QUERY_DETAIL_CACHE_SECONDS = int(os.getenv('QUERY_DETAIL_CACHE_SECONDS', 6 * 3600))
+
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.DjangoModelPermissionsOrAnonReadOnly'
-    ]
+    ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'accounts.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'accounts.renderers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    # Proxies in front of the app, used to pick the client IP for throttling. The default
+    # matches the platform router in front of the Procfile deployment; 0 uses REMOTE_ADDR.
+    # Never unset: DRF would then trust a client-supplied X-Forwarded-For as is
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', 1)),
+}
+
+# Signed access tokens issued alongside the session ID
+ACCESS_TOKEN_TTL_SECONDS = int(os.getenv('ACCESS_TOKEN_TTL_SECONDS', 900))
+
+# One-time passwords for signup and password reset
+OTP_TTL_SECONDS = int(os.getenv('OTP_TTL_SECONDS', 300))
+OTP_MAX_ATTEMPTS = int(os.getenv('OTP_MAX_ATTEMPTS', 5))
+OTP_RESEND_COOLDOWN_SECONDS = int(os.getenv('OTP_RESEND_COOLDOWN_SECONDS', 60))
+
+# Token-bucket rate limits per endpoint scope, as "burst/refill_per_minute"
+# Buckets are kept per client IP and per submitted email address
+RATE_LIMITS = {
+    'otp': {
+        'ip': os.getenv('RATE_LIMIT_OTP_IP', '20/10'),
+        'email': os.getenv('RATE_LIMIT_OTP_EMAIL', '3/1'),
+    },
+    'login': {
+        'ip': os.getenv('RATE_LIMIT_LOGIN_IP', '30/15'),
+        'email': os.getenv('RATE_LIMIT_LOGIN_EMAIL', '10/2'),
+    },
+    'password_reset': {
+        'ip': os.getenv('RATE_LIMIT_PASSWORD_RESET_IP', '10/5'),
+        'email': os.getenv('RATE_LIMIT_PASSWORD_RESET_EMAIL', '3/1'),
+    },
 }
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'accounts.middleware.CompressionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -241,6 +323,24 @@ MEDIA_URL = '/media/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Uploaded files go to an S3-compatible bucket when one is configured (MinIO in
+# docker-compose.override.yml for local development); otherwise to MEDIA_ROOT
+if os.getenv('AWS_STORAGE_BUCKET_NAME'):
+    STORAGES = {
+        'default': {'BACKEND': 'storages.backends.s3.S3Storage'},
+        'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    }
+    AWS_STORAGE_BUCKET_NAME = os.getenv('AWS_STORAGE_BUCKET_NAME')
+    AWS_S3_ENDPOINT_URL = os.getenv('AWS_S3_ENDPOINT_URL') or None
+    AWS_S3_REGION_NAME = os.getenv('AWS_S3_REGION_NAME') or None
+    AWS_ACCESS_KEY_ID = os.getenv('AWS_ACCESS_KEY_ID')
+    AWS_SECRET_ACCESS_KEY = os.getenv('AWS_SECRET_ACCESS_KEY')
+    # Student IDs are private: no public ACL, short-lived signed URLs only
+    AWS_DEFAULT_ACL = None
+    AWS_QUERYSTRING_AUTH = True
+    AWS_QUERYSTRING_EXPIRE = 600
+    AWS_S3_FILE_OVERWRITE = False
+
 # Session settings
 SESSION_COOKIE_AGE = 86400  # 24 hours in seconds
 SESSION_SAVE_EVERY_REQUEST = True  # Update the session expiry on every request
@@ -65,6 +65,61 @@ except Exception as e:
         }
     }
 
+# Optional read replica for read-heavy endpoints
+DATABASE_REPLICA_URL = os.getenv('DATABASE_REPLICA_URL')
+if DATABASE_REPLICA_URL and DATABASES['default']['ENGINE'] != 'django.db.backends.sqlite3':
+    DATABASES['replica'] = dj_database_url.parse(
+        DATABASE_REPLICA_URL,
+        conn_max_age=600,
+        conn_health_checks=True,
+        ssl_require=True
+    )
+    DATABASES['replica']['OPTIONS'] = {
+        'sslmode': 'require',
+        'connect_timeout': 10,
+        'options': '-c timezone=UTC'
+    }
+    # Tests run against the primary only
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+
+    DATABASE_ROUTERS = ['accounts.db_routers.ReplicaRouter']
+    MIDDLEWARE.insert(
+        MIDDLEWARE.index('accounts.middleware.CustomAuthMiddleware') + 1,
+        'accounts.middleware.ReadReplicaMiddleware'
+    )
+
+# Connection pooling
+# DB_POOL_ENABLED swaps the per-worker persistent connection for a psycopg connection pool.
+# Every worker process opens at most DB_POOL_MAX_SIZE connections, so the total across the
+# deployment is capped at dynos x gunicorn workers x DB_POOL_MAX_SIZE.
+DB_POOL_ENABLED = os.getenv('DB_POOL_ENABLED', 'false').lower() == 'true'
+# Set when DATABASE_URL points at a transaction-mode pooler such as PgBouncer
+DB_EXTERNAL_POOLER = os.getenv('DB_EXTERNAL_POOLER', 'false').lower() == 'true'
+
+for db in DATABASES.values():
+    if db['ENGINE'] != 'django.db.backends.postgresql':
+        continue
+
+    if DB_POOL_ENABLED:
+        # Django manages pooled connections itself and refuses a persistent CONN_MAX_AGE
+        db['CONN_MAX_AGE'] = 0
+        # Pre-ping each connection when it's checked out of the pool
+        db['CONN_HEALTH_CHECKS'] = True
+        db['OPTIONS']['pool'] = {
+            'min_size': int(os.getenv('DB_POOL_MIN_SIZE', 1)),
+            'max_size': int(os.getenv('DB_POOL_MAX_SIZE', 4)),
+            # Seconds a request waits for a free connection before failing
+            'timeout': float(os.getenv('DB_POOL_TIMEOUT', 10)),
+            # Close connections idle for longer than this, down to min_size
+            'max_idle': float(os.getenv('DB_POOL_MAX_IDLE', 300)),
+            'max_lifetime': float(os.getenv('DB_POOL_MAX_LIFETIME', 3600)),
+        }
+
+    if DB_EXTERNAL_POOLER:
+        # Consecutive transactions may land on different server connections, so named
+        # cursors can't survive between them
+        db['DISABLE_SERVER_SIDE_CURSORS'] = True
+
 # Whitenoise for static files - must be first in middleware after SecurityMiddleware
 MIDDLEWARE.insert(1, 'whitenoise.middleware.WhiteNoiseMiddleware')
 
@@ -1,13 +1,25 @@
+import uuid
+
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.utils.translation import gettext_lazy as _
 from django.contrib import messages
+from django.contrib.postgres.search import SearchQuery, SearchVector
+from django.db import connections
+from django.db.models import Count
+from django.utils.html import format_html
 
 from accounts.models import (
     CustomUser, IndividualUser, StudentUser, Company, Employee, 
-    Query, SubscriptionPlan, Subscription, Transaction, UserSearchCount
+    Query, SubscriptionPlan, Subscription, Transaction, UserSearchCount, MonthlySearchUsage,
+    BroadcastCampaign, BroadcastRecipient, AccountDeletion
 )
+from accounts.admin_performance import PerformanceModelAdmin
+from accounts.bootstrap import account_changed, subscription_changed
+from accounts.deletion import request_account_deletion
+from accounts.query_store import invalidate_query_details
 from accounts.stripe_webhooks import sync_missing_transactions
+from accounts.versioning import bump_version, bump_versions
 
 # Custom User Admin with fields specific to our implementation
 class CustomUserAdmin(BaseUserAdmin):
@@ -28,8 +40,17 @@ class CustomUserAdmin(BaseUserAdmin):
     search_fields = ('email',)
     ordering = ('email',)
     filter_horizontal = ('groups', 'user_permissions',)
+    actions = ['delete_in_background']
+
+    def delete_in_background(self, request, queryset):
+        # The built-in delete cascades through every query in one transaction; this disables
+        # the accounts now and leaves the deleting to the delete_accounts worker
+        for user in queryset:
+            request_account_deletion(user)
+        self.message_user(request, f'{queryset.count()} account(s) disabled and queued for deletion.')
+    delete_in_background.short_description = "Disable and delete in the background"
 
-class IndividualUserAdmin(admin.ModelAdmin):
+class IndividualUserAdmin(PerformanceModelAdmin):
     list_display = ('user_email', 'first_name', 'last_name', 'phone_number', 'date_joined')
     search_fields = ('user__email', 'first_name', 'last_name', 'phone_number')
     date_hierarchy = 'date_joined'
@@ -39,12 +60,13 @@ class IndividualUserAdmin(admin.ModelAdmin):
     user_email.short_description = 'Email'
     user_email.admin_order_field = 'user__email'
 
-class StudentUserAdmin(admin.ModelAdmin):
+class StudentUserAdmin(PerformanceModelAdmin):
     list_display = ('user_email', 'first_name', 'last_name', 'has_student_id', 'student_organisation_name', 'date_joined', 'is_approved')
     list_filter = ('is_approved',)
     search_fields = ('user__email', 'first_name', 'last_name', 'student_organisation_name')
     date_hierarchy = 'date_joined'
     actions = ['approve_students', 'disapprove_students']
+    readonly_fields = ('student_id_document',)
     
     def user_email(self, obj):
         return obj.user.email
@@ -55,27 +77,64 @@ class StudentUserAdmin(admin.ModelAdmin):
         return bool(obj.student_id)
     has_student_id.short_description = 'Has ID Document'
     has_student_id.boolean = True
+
+    def student_id_document(self, obj):
+        # Show the downscaled preview so approving doesn't mean downloading the original photo
+        if not obj.student_id:
+            return "Not uploaded yet"
+        if obj.student_id_preview:
+            return format_html(
+                '<a href="{}" target="_blank"><img src="{}" style="max-width: 480px; max-height: 480px;"></a>',
+                obj.student_id.url, obj.student_id_preview.url
+            )
+        return format_html('<a href="{}" target="_blank">Open document</a>', obj.student_id.url)
+    student_id_document.short_description = 'ID Document'
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        account_changed(obj.user_id)
     
     def approve_students(self, request, queryset):
+        user_ids = list(queryset.values_list('user_id', flat=True))
         updated = queryset.update(is_approved=True)
+        account_changed(*user_ids)
         self.message_user(request, f'{updated} student(s) have been approved.')
     approve_students.short_description = "Approve selected students"
     
     def disapprove_students(self, request, queryset):
+        user_ids = list(queryset.values_list('user_id', flat=True))
         updated = queryset.update(is_approved=False)
+        account_changed(*user_ids)
         self.message_user(request, f'{updated} student(s) have been disapproved.')
     disapprove_students.short_description = "Disapprove selected students"
 
-class CompanyAdmin(admin.ModelAdmin):
+class CompanyAdmin(PerformanceModelAdmin):
     list_display = ('user_email', 'name', 'website', 'phone_number', 'employee_count')
     search_fields = ('user__email', 'name', 'website', 'phone_number')
+
+    def get_queryset(self, request):
+        # Counted in the page query rather than with one COUNT per company
+        return super().get_queryset(request).annotate(employees_total=Count('employees'))
+
+    def employee_count(self, obj):
+        return obj.employees_total
+    employee_count.short_description = 'Employees'
+    employee_count.admin_order_field = 'employees_total'
+
+    actions = ['delete_in_background']
+
+    def delete_in_background(self, request, queryset):
+        for company in queryset.select_related('user'):
+            request_account_deletion(company.user)
+        self.message_user(request, f'{queryset.count()} company account(s) and their employees disabled and queued for deletion.')
+    delete_in_background.short_description = "Disable and delete with employees in the background"
     
     def user_email(self, obj):
         return obj.user.email
     user_email.short_description = 'Email'
     user_email.admin_order_field = 'user__email'
 
-class EmployeeAdmin(admin.ModelAdmin):
+class EmployeeAdmin(PerformanceModelAdmin):
     list_display = ('user_email', 'first_name', 'last_name', 'company_name', 'phone_number')
     list_filter = ('company',)
     search_fields = ('user__email', 'first_name', 'last_name', 'company__name')
@@ -91,19 +150,54 @@ class EmployeeAdmin(admin.ModelAdmin):
     company_name.admin_order_field = 'company__name'
 
 @admin.register(Query)
-class QueryAdmin(admin.ModelAdmin):
+class QueryAdmin(PerformanceModelAdmin):
     list_display = ('query_id', 'user', 'query', 'created_at')
+    # A date_hierarchy would scan every query for its distinct dates on each page load
     list_filter = ('created_at',)
-    search_fields = ('query', 'user__email')
-    date_hierarchy = 'created_at'
+    search_fields = ('query',)
+    search_help_text = 'Words from the query text, or an exact user email or query ID'
+    ordering = ('-created_at',)
     readonly_fields = ('query_id', 'created_at', 'updated_at')
 
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        if '@' in search_term:
+            return queryset.filter(user__email=search_term), False
+        try:
+            return queryset.filter(query_id=uuid.UUID(search_term)), False
+        except ValueError:
+            pass
+        if connections[queryset.db].vendor != 'postgresql':
+            return super().get_search_results(request, queryset, search_term)
+        # Same expression as the query_text_search_idx GIN index, so the index answers it
+        matches = SearchQuery(search_term, config='english', search_type='websearch')
+        return queryset.annotate(text_search=SearchVector('query', config='english')).filter(text_search=matches), False
+
+    # Saved queries are served from the query detail cache, so edits made here must drop it
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        invalidate_query_details([obj.pk])
+        bump_version('queries', obj.user_id)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        invalidate_query_details([obj.pk])
+        bump_version('queries', obj.user_id)
+
+    def delete_queryset(self, request, queryset):
+        deleted = list(queryset.values_list('pk', 'user_id'))
+        super().delete_queryset(request, queryset)
+        invalidate_query_details([pk for pk, _ in deleted])
+        bump_versions('queries', {user_id for _, user_id in deleted})
+
 class SubscriptionPlanAdmin(admin.ModelAdmin):
     list_display = ('plan_id', 'name', 'price', 'validity', 'is_popular')
     search_fields = ('plan_id', 'name')
     list_filter = ('is_popular',)
 
-class SubscriptionAdmin(admin.ModelAdmin):
+class SubscriptionAdmin(PerformanceModelAdmin):
     list_display = ('user_email', 'plan_id', 'status', 'current_period_start', 'current_period_end')
     list_filter = ('plan_id', 'status')
     search_fields = ('user__email', 'stripe_customer_id', 'stripe_subscription_id')
@@ -113,6 +207,10 @@ class SubscriptionAdmin(admin.ModelAdmin):
         return obj.user.email
     user_email.short_description = 'User Email'
     user_email.admin_order_field = 'user__email'
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        subscription_changed(obj.user_id)
     
     def sync_stripe_transactions(self, request, queryset):
         try:
@@ -131,17 +229,22 @@ class SubscriptionAdmin(admin.ModelAdmin):
             )
     sync_stripe_transactions.short_description = "Sync missing transactions from Stripe"
 
-class TransactionAdmin(admin.ModelAdmin):
+class TransactionAdmin(PerformanceModelAdmin):
     list_display = ('user_email', 'amount', 'status', 'description', 'date')
-    list_filter = ('status',)
-    search_fields = ('user__email', 'stripe_invoice_id', 'stripe_payment_intent_id', 'description')
-    date_hierarchy = 'date'
+    list_filter = ('status', 'date')
+    exact_search_fields = ('user__email', 'stripe_invoice_id')
+    search_fields = exact_search_fields
+    search_help_text = 'Exact user email or Stripe invoice ID'
     actions = ['sync_stripe_transactions']
     
     def user_email(self, obj):
         return obj.user.email
     user_email.short_description = 'User Email'
     user_email.admin_order_field = 'user__email'
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        subscription_changed(obj.user_id)
     
     def sync_stripe_transactions(self, request, queryset):
         try:
@@ -160,16 +263,59 @@ class TransactionAdmin(admin.ModelAdmin):
             )
     sync_stripe_transactions.short_description = "Sync missing transactions from Stripe"
 
-class UserSearchCountAdmin(admin.ModelAdmin):
+class UserSearchCountAdmin(PerformanceModelAdmin):
     list_display = ('user_email', 'date', 'count')
-    date_hierarchy = 'date'
-    search_fields = ('user__email',)
+    list_filter = ('date',)
+    exact_search_fields = ('user__email',)
+    search_fields = exact_search_fields
+    search_help_text = 'Exact user email'
     
     def user_email(self, obj):
         return obj.user.email
     user_email.short_description = 'User Email'
     user_email.admin_order_field = 'user__email'
 
+class MonthlySearchUsageAdmin(PerformanceModelAdmin):
+    list_display = ('user_email', 'month', 'searches', 'active_days')
+    list_filter = ('month',)
+    exact_search_fields = ('user__email',)
+    search_fields = exact_search_fields
+    search_help_text = 'Exact user email'
+    readonly_fields = ('user', 'month', 'searches', 'active_days', 'updated_at')
+
+    def user_email(self, obj):
+        return obj.user.email
+    user_email.short_description = 'User Email'
+    user_email.admin_order_field = 'user__email'
+
+class BroadcastCampaignAdmin(admin.ModelAdmin):
+    list_display = ('name', 'audience', 'status', 'recipient_count', 'sent_count', 'failed_count', 'created_at', 'finished_at')
+    list_filter = ('status', 'audience')
+    search_fields = ('name', 'subject')
+    readonly_fields = ('status', 'recipient_count', 'sent_count', 'failed_count', 'created_at', 'started_at', 'finished_at')
+    actions = ['queue_campaigns']
+
+    def queue_campaigns(self, request, queryset):
+        # The send_broadcasts worker picks these up; nothing is sent from the web process
+        updated = queryset.filter(status=BroadcastCampaign.STATUS_DRAFT).update(status=BroadcastCampaign.STATUS_QUEUED)
+        self.message_user(request, f'{updated} campaign(s) queued for sending.')
+    queue_campaigns.short_description = "Queue selected campaigns for sending"
+
+class BroadcastRecipientAdmin(PerformanceModelAdmin):
+    list_display = ('email', 'campaign', 'status', 'sent_at')
+    list_filter = ('status', 'campaign')
+    list_select_related = ('campaign',)
+    search_fields = ('email',)
+    raw_id_fields = ('user',)
+    readonly_fields = ('campaign', 'user', 'email', 'name', 'status', 'error', 'claimed_at', 'sent_at')
+
+class AccountDeletionAdmin(admin.ModelAdmin):
+    list_display = ('email', 'account_id', 'status', 'stage', 'deleted_rows', 'attempts', 'created_at', 'finished_at')
+    list_filter = ('status',)
+    search_fields = ('email',)
+    readonly_fields = ('account_id', 'email', 'status', 'stage', 'deleted_rows', 'attempts', 'error',
+                       'started_at', 'finished_at', 'created_at', 'updated_at')
+
 # Create a proxy model for Stripe operations admin panel
 class StripeAdmin(Transaction):
     class Meta:
@@ -255,6 +401,10 @@ admin.site.register(SubscriptionPlan, SubscriptionPlanAdmin)
 admin.site.register(Subscription, SubscriptionAdmin)
 admin.site.register(Transaction, TransactionAdmin)
 admin.site.register(UserSearchCount, UserSearchCountAdmin)
+admin.site.register(MonthlySearchUsage, MonthlySearchUsageAdmin)
+admin.site.register(BroadcastCampaign, BroadcastCampaignAdmin)
+admin.site.register(BroadcastRecipient, BroadcastRecipientAdmin)
+admin.site.register(AccountDeletion, AccountDeletionAdmin)
 
 # Register the Stripe Admin Panel
 admin.site.register(StripeAdmin, StripeAdminPanel)
@@ -0,0 +1,218 @@
+import json
+import logging
+
+from django.conf import settings
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from .models import CustomUser, Employee, SubscriptionPlan, UserSearchCount
+from .redis_client import redis_client, redis_available
+from .versioning import bump_versions, get_versions
+
+logger = logging.getLogger(__name__)
+
+# The bootstrap payload is rebuilt whenever either version changes for the user:
+# 'account' covers the user, profile, approval and search count; 'subscription' covers the
+# effective subscription, which for employees is their company's
+BOOTSTRAP_RESOURCES = ('account', 'subscription')
+
+FREE_SEARCH_LIMIT = 3
+
+# Stripe product IDs stored as plan_id by older webhooks; same mapping as CheckSubscriptionView
+PRODUCT_PLAN_IDS = {
+    'prod_S4x9V4VOusZTNr': 'daily',           # Daily Plan
+    'prod_S4x9sR8V21WjNk': 'student_monthly', # Student Monthly Plan
+    'prod_S1ppgzI3mPdgy3': 'monthly',         # Monthly Plan
+}
+
+EXPORTABLE_PLANS = ('monthly', 'annual', 'student_monthly', 'student_annual')
+
+
+def account_changed(*user_ids):
+    """Invalidate the bootstrap of users whose account, profile, approval or usage changed."""
+    bump_versions('account', user_ids)
+
+
+def subscription_changed(owner_id):
+    """Invalidate the bootstrap of a subscription's owner and, for a company, all its employees."""
+    employee_ids = Employee.objects.filter(company_id=owner_id).values_list('user_id', flat=True)
+    bump_versions('subscription', [owner_id, *employee_ids])
+
+
+def _load_user(user_id, today):
+    """The user with every profile and both candidate subscriptions joined, in one query."""
+    return (
+        CustomUser.objects
+        .select_related(
+            'individualuser', 'studentuser', 'company', 'stripe_subscription',
+            'employee__company__user__stripe_subscription',
+        )
+        .annotate(searches_today=Subquery(
+            UserSearchCount.objects.filter(user=OuterRef('pk'), date=today).values('count')[:1]
+        ))
+        .get(pk=user_id)
+    )
+
+
+def _related(obj, name):
+    try:
+        return getattr(obj, name)
+    except Exception:
+        # Missing reverse one-to-one (RelatedObjectDoesNotExist)
+        return None
+
+
+def _profile_data(user):
+    employee = _related(user, 'employee')
+    if employee:
+        return {
+            "type": "employee",
+            "first_name": employee.first_name,
+            "last_name": employee.last_name,
+            "phone_number": employee.phone_number,
+            "company_name": employee.company.name,
+        }
+    company = _related(user, 'company')
+    if company:
+        return {
+            "type": "company",
+            "name": company.name,
+            "website": company.website,
+            "phone_number": company.phone_number,
+            "employee_limit": company.employee_limit,
+        }
+    for profile_type, name in (("student", 'studentuser'), ("individual", 'individualuser')):
+        profile = _related(user, name)
+        if profile:
+            return {
+                "type": profile_type,
+                "first_name": profile.first_name,
+                "last_name": profile.last_name,
+                "phone_number": profile.phone_number,
+                "date_of_birth": profile.date_of_birth.isoformat() if profile.date_of_birth else None,
+            }
+    return None
+
+
+def _subscription_data(subscription, plan_id):
+    if subscription is None:
+        return {
+            "is_active": False,
+            "plan_id": "free",
+            "plan_name": "Free Plan",
+            "status": "inactive",
+            "current_period_end": None,
+        }
+    plan_name = SubscriptionPlan.objects.filter(plan_id=plan_id).values_list('name', flat=True).first()
+    return {
+        "is_active": subscription.is_active,
+        "plan_id": plan_id,
+        "plan_name": plan_name or plan_id.replace('_', ' ').title(),
+        "status": subscription.status,
+        "current_period_end": subscription.current_period_end.isoformat() if subscription.current_period_end else None,
+    }
+
+
+def _features_data(subscription, plan_id, searches_today):
+    """Same answers as CheckUserFeaturesView, without re-reading the search count."""
+    if subscription is None:
+        remaining = FREE_SEARCH_LIMIT - searches_today
+        return {
+            "can_search": remaining > 0,
+            "can_export": False,
+            "search_limit": FREE_SEARCH_LIMIT,
+            "searches_remaining": remaining,
+            "plan": "free",
+            "message": "You're on the free plan. Upgrade to get unlimited searches and more features.",
+        }
+
+    if subscription.status == 'active' and subscription.plan_id != 'free':
+        can_search, message = True, None
+    elif subscription.plan_id == 'free':
+        if searches_today < FREE_SEARCH_LIMIT:
+            can_search, message = True, None
+        else:
+            can_search, message = False, "You've reached your daily search limit of 3 searches. Please upgrade your plan."
+    else:
+        can_search, message = False, "Your subscription is not active. Please subscribe to continue searching."
+
+    free = plan_id == 'free'
+    return {
+        "can_search": can_search,
+        "can_export": subscription.status == 'active' and subscription.plan_id in EXPORTABLE_PLANS,
+        "search_limit": FREE_SEARCH_LIMIT if free else -1,
+        "searches_remaining": FREE_SEARCH_LIMIT - searches_today if free else -1,
+        "plan": plan_id,
+        "message": message,
+    }
+
+
+def build_bootstrap(user_id, today=None):
+    """
+    Everything the frontend needs at startup. Two queries at most: the user with its
+    profiles, subscriptions and today's search count, and the plan name.
+    """
+    today = today or timezone.now().date()
+    user = _load_user(user_id, today)
+
+    employee = _related(user, 'employee')
+    if employee:
+        subscription = _related(employee.company.user, 'stripe_subscription')
+    else:
+        subscription = _related(user, 'stripe_subscription')
+    plan_id = PRODUCT_PLAN_IDS.get(subscription.plan_id, subscription.plan_id) if subscription else 'free'
+    searches_today = user.searches_today or 0
+
+    student = _related(user, 'studentuser')
+    if student is None:
+        approval = None
+    else:
+        approval = {
+            "is_approved": student.is_approved,
+            "message": "Your account has been approved" if student.is_approved
+            else "Your account is pending approval from an administrator",
+        }
+
+    return {
+        "is_authenticated": True,
+        "user": {
+            "id": user.pk,
+            "email": user.email,
+            "is_company": user.is_company,
+            "is_student": user.is_student,
+            "is_employee": employee is not None,
+        },
+        "profile": _profile_data(user),
+        "subscription": _subscription_data(subscription, plan_id),
+        "features": _features_data(subscription, plan_id, searches_today),
+        "student_approval": approval,
+    }
+
+
+def get_bootstrap(user_id):
+    """
+    build_bootstrap, cached in Redis under the user's current account and subscription
+    versions. Writers bump a version instead of deleting the entry, so a rebuild racing an
+    invalidation can only store under a key nobody reads any more. The day is part of the
+    key because the free search allowance resets at midnight.
+    """
+    today = timezone.now().date()
+    versions = get_versions(BOOTSTRAP_RESOURCES, user_id)
+    if versions is None:
+        return build_bootstrap(user_id, today)
+
+    key = f"bootstrap:{user_id}:{':'.join(versions)}:{today.isoformat()}"
+    try:
+        cached = redis_client.get(key)
+        if cached:
+            return json.loads(cached)
+    except Exception as e:
+        logger.error(f"Could not read bootstrap cache for user {user_id}: {str(e)}")
+
+    data = build_bootstrap(user_id, today)
+    if redis_available():
+        try:
+            redis_client.setex(key, settings.BOOTSTRAP_CACHE_SECONDS, json.dumps(data))
+        except Exception as e:
+            logger.error(f"Could not cache bootstrap for user {user_id}: {str(e)}")
+    return data
@@ -0,0 +1,120 @@
+import logging
+import smtplib
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.html import escape
+
+from .models import BroadcastCampaign, BroadcastRecipient, CustomUser
+
+logger = logging.getLogger(__name__)
+
+# Placeholder -> BroadcastRecipient attribute. They survive template rendering untouched,
+# so a campaign is rendered once and personalised with plain string replacement.
+PLACEHOLDERS = {
+    '[[name]]': 'name',
+    '[[email]]': 'email',
+}
+
+
+def audience_users(audience):
+    users = CustomUser.objects.filter(is_active=True)
+    if audience == BroadcastCampaign.AUDIENCE_INDIVIDUALS:
+        return users.filter(individualuser__isnull=False)
+    if audience == BroadcastCampaign.AUDIENCE_STUDENTS:
+        return users.filter(is_student=True)
+    if audience == BroadcastCampaign.AUDIENCE_COMPANIES:
+        return users.filter(is_company=True)
+    return users
+
+
+def _display_name(email, company_name, *names):
+    """First non-empty (first, last) pair among the profile columns, then the company name, then the address."""
+    for first, last in zip(names[0::2], names[1::2]):
+        if first or last:
+            return f"{first or ''} {last or ''}".strip()
+    return company_name or email.split('@')[0]
+
+
+def queue_recipients(campaign, batch_size=2000):
+    """
+    Snapshot the campaign's audience into BroadcastRecipient rows and return how many exist.
+    Rows already present are left alone, so a run interrupted halfway can simply be repeated.
+    """
+    rows = audience_users(campaign.audience).order_by('id').values_list(
+        'id', 'email', 'company__name',
+        'individualuser__first_name', 'individualuser__last_name',
+        'studentuser__first_name', 'studentuser__last_name',
+        'employee__first_name', 'employee__last_name',
+    )
+
+    batch = []
+    for user_id, email, *names in rows.iterator(chunk_size=batch_size):
+        batch.append(BroadcastRecipient(
+            campaign=campaign, user_id=user_id, email=email, name=_display_name(email, *names)[:255]
+        ))
+        if len(batch) >= batch_size:
+            BroadcastRecipient.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        BroadcastRecipient.objects.bulk_create(batch, ignore_conflicts=True)
+
+    return campaign.recipients.count()
+
+
+def render_campaign(campaign):
+    """Render the shared HTML for a campaign once; only the placeholders differ per recipient."""
+    return render_to_string('email/broadcast.html', {
+        'subject': campaign.subject,
+        'body': campaign.body,
+        'dashboard_url': f"{settings.FRONTEND_URL}/dashboard",
+    })
+
+
+def personalise(html, recipient):
+    for placeholder, attribute in PLACEHOLDERS.items():
+        html = html.replace(placeholder, escape(getattr(recipient, attribute)))
+    return html
+
+
+def send_to_recipients(campaign, html, recipients, connection):
+    """
+    Deliver one batch of claimed recipients over an already-open SMTP connection.
+    Messages go through send_messages one at a time on the shared connection so a rejected
+    address fails only its own recipient, and each outcome is saved as soon as it's known,
+    so a worker that dies mid-batch never leaves a delivered message looking unsent.
+    Returns (sent, failed).
+    """
+    sent = failed = 0
+    for recipient in recipients:
+        message = EmailMultiAlternatives(
+            subject=campaign.subject,
+            body='',
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=[recipient.email],
+            connection=connection,
+        )
+        message.attach_alternative(personalise(html, recipient), 'text/html')
+        try:
+            try:
+                connection.send_messages([message])
+            except smtplib.SMTPServerDisconnected:
+                # Servers drop long-lived sessions; reconnect once and retry this message
+                connection.close()
+                connection.open()
+                connection.send_messages([message])
+        except Exception as e:
+            recipient.status = BroadcastRecipient.STATUS_FAILED
+            recipient.error = str(e)
+            failed += 1
+        else:
+            recipient.status = BroadcastRecipient.STATUS_SENT
+            recipient.sent_at = timezone.now()
+            sent += 1
+        recipient.save(update_fields=['status', 'error', 'sent_at'])
+
+    if failed:
+        logger.warning(f"Campaign {campaign.pk}: {failed} of {len(recipients)} messages failed")
+    return sent, failed
@@ -0,0 +1,51 @@
+from django.http import HttpResponseNotModified
+
+from .tokens import get_request_user_id
+from .versioning import etag_matches, get_versions, make_etag
+
+
+class ConditionalGetMixin:
+    """
+    ETag support for APIViews whose GET responses depend only on per-user version counters.
+
+    Set `etag_resources` to the versioning.py resources the response is built from; every
+    write to them must bump the counter. The ETag is derived from the requesting user's
+    current versions plus `etag_variant()`, so an If-None-Match re-poll is answered 304
+    in dispatch(), before authentication or the view touch the database. Bearer-token
+    requests need only Redis for that; session requests also read their session.
+    """
+    etag_resources = ()
+
+    def etag_variant(self, request, *args, **kwargs):
+        """Everything besides the user that selects the representation: URL arguments and query string."""
+        return (*kwargs.values(), *sorted(request.GET.lists()))
+
+    def get_etag(self, request, user_id, *args, **kwargs):
+        versions = get_versions(self.etag_resources, user_id)
+        if versions is None:
+            return None
+        return make_etag(
+            '+'.join(self.etag_resources), user_id, ':'.join(versions),
+            *self.etag_variant(request, *args, **kwargs)
+        )
+
+    def dispatch(self, request, *args, **kwargs):
+        # Read the versions before the view reads any data, so a write racing this request
+        # bumps past the ETag we hand out rather than hiding behind it
+        etag = None
+        if request.method in ('GET', 'HEAD') and self.etag_resources:
+            user_id = get_request_user_id(request)
+            etag = self.get_etag(request, user_id, *args, **kwargs)
+        if etag and etag_matches(request, etag):
+            response = HttpResponseNotModified()
+            response['ETag'] = etag
+            response['Cache-Control'] = 'private, no-cache'
+            return response
+
+        response = super().dispatch(request, *args, **kwargs)
+        # Only tag the response if authentication settled on the user the ETag was built for
+        user = getattr(self.request, 'user', None)
+        if etag and response.status_code == 200 and getattr(user, 'pk', None) == int(user_id):
+            response['ETag'] = etag
+            response['Cache-Control'] = 'private, no-cache'
+        return response
@@ -0,0 +1,87 @@
+import json
+import tempfile
+import zipfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.core.files import File
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from . import query_store
+from .exports import EXPORT_CHUNK_SIZE, EXPORT_FIELDS
+from .models import (
+    Company, CustomUser, DataExport, Employee, IndividualUser, MonthlySearchUsage, StudentUser, Subscription,
+    Transaction, UserSearchCount,
+)
+
+DOWNLOAD_SALT = 'accounts.data_export'
+
+
+def _rows(queryset, *fields):
+    return queryset.values(*fields).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def export_sections(user):
+    """
+    (file name, row iterator) for every section of a user's export. Rows are produced lazily
+    and the large sections read through server-side cursors, so nothing is loaded whole.
+    """
+    profile_models = [IndividualUser, StudentUser, Company, Employee]
+    return [
+        ('account.jsonl', _rows(
+            CustomUser.objects.filter(pk=user.pk), 'id', 'email', 'is_active', 'is_company', 'is_student', 'last_login'
+        )),
+        ('profile.jsonl', (
+            row for model in profile_models
+            for row in _rows(model.objects.filter(user=user))
+        )),
+        ('subscription.jsonl', _rows(
+            Subscription.objects.filter(user=user),
+            'plan_id', 'status', 'current_period_start', 'current_period_end', 'created_at', 'updated_at'
+        )),
+        ('transactions.jsonl', _rows(
+            Transaction.objects.filter(user=user).order_by('date', 'id'),
+            'stripe_invoice_id', 'amount', 'status', 'description', 'receipt_url', 'date'
+        )),
+        ('queries.jsonl', query_store.iter_user_queries(user, EXPORT_FIELDS, EXPORT_CHUNK_SIZE)),
+        ('search_counts.jsonl', _rows(UserSearchCount.objects.filter(user=user).order_by('date'), 'date', 'count')),
+        ('monthly_search_usage.jsonl', _rows(
+            MonthlySearchUsage.objects.filter(user=user).order_by('month'), 'month', 'searches', 'active_days'
+        )),
+    ]
+
+
+def build_export(export):
+    """
+    Write the export ZIP to a temporary file one JSONL line at a time, then hand that file
+    to storage, which copies it in chunks. Memory use stays at one chunk of rows.
+    """
+    with tempfile.TemporaryFile() as output:
+        with zipfile.ZipFile(output, mode='w', compression=zipfile.ZIP_DEFLATED) as archive:
+            for name, rows in export_sections(export.user):
+                with archive.open(name, mode='w', force_zip64=True) as entry:
+                    for row in rows:
+                        entry.write((json.dumps(row, cls=DjangoJSONEncoder) + "\n").encode('utf-8'))
+
+        export.size = output.tell()
+        output.seek(0)
+        export.file.save(f"{export.export_id}.zip", File(output), save=False)
+    export.expires_at = timezone.now() + timedelta(hours=settings.DATA_EXPORT_TTL_HOURS)
+
+
+def download_token(export):
+    """Signed token naming the export; the download view rejects it once the export expires."""
+    return signing.dumps(str(export.export_id), salt=DOWNLOAD_SALT)
+
+
+def export_from_token(token):
+    """The DataExport a download token refers to, or None if it's forged, expired or gone."""
+    try:
+        export_id = signing.loads(token, salt=DOWNLOAD_SALT, max_age=settings.DATA_EXPORT_TTL_HOURS * 3600)
+    except signing.BadSignature:
+        return None
+    return DataExport.objects.filter(
+        export_id=export_id, status=DataExport.STATUS_DONE, expires_at__gt=timezone.now()
+    ).first()
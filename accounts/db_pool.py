@@ -0,0 +1,33 @@
+import os
+
+from django.db import connections
+
+
+def _pool_metrics(pool):
+    raw = pool.get_stats()
+    pool_max = raw.get('pool_max', 0)
+    in_use = raw.get('pool_size', 0) - raw.get('pool_available', 0)
+    queued = raw.get('requests_queued', 0)
+    return {
+        **raw,
+        'connections_in_use': in_use,
+        # Share of the pool handed out; at 1.0 new requests have to queue for a connection
+        'saturation': round(in_use / pool_max, 3) if pool_max else 0.0,
+        'avg_wait_ms': round(raw.get('requests_wait_ms', 0) / queued, 2) if queued else 0.0,
+    }
+
+
+def get_pool_stats():
+    """
+    Connection pool metrics for every pooled database alias in this worker process.
+
+    Each gunicorn worker owns its own pool, so the numbers describe the worker that
+    served the request. Counters accumulate from the moment the pool was opened.
+    """
+    stats = {}
+    for alias in connections:
+        pool = getattr(connections[alias], 'pool', None)
+        if pool is None:
+            continue
+        stats[alias] = _pool_metrics(pool)
+    return {'pid': os.getpid(), 'pooled': bool(stats), 'databases': stats}
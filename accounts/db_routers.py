@@ -0,0 +1,126 @@
+import logging
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+from .redis_client import redis_client
+
+logger = logging.getLogger(__name__)
+
+REPLICA_ALIAS = 'replica'
+
+# Alias safe reads should use for the current request; None means the primary
+_read_alias = ContextVar('read_alias', default=None)
+
+# Process-local result of the last replica lag check: (checked_at, usable)
+_replica_health = {'checked_at': 0.0, 'usable': False}
+
+REPLICA_LAG_SQL = """
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() THEN 0
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+END
+"""
+
+
+def replica_configured():
+    return REPLICA_ALIAS in settings.DATABASES
+
+
+def replica_lag_seconds():
+    """Replication delay of the replica in seconds; raises if the replica can't be reached."""
+    with connections[REPLICA_ALIAS].cursor() as cursor:
+        cursor.execute(REPLICA_LAG_SQL)
+        return float(cursor.fetchone()[0])
+
+
+def replica_is_usable():
+    """
+    True when the replica is reachable and within REPLICA_MAX_LAG_SECONDS of the primary.
+    The check runs at most once per REPLICA_LAG_CHECK_INTERVAL per worker process.
+    """
+    if not replica_configured():
+        return False
+
+    now = time.monotonic()
+    if now - _replica_health['checked_at'] < settings.REPLICA_LAG_CHECK_INTERVAL:
+        return _replica_health['usable']
+
+    try:
+        lag = replica_lag_seconds()
+        usable = lag <= settings.REPLICA_MAX_LAG_SECONDS
+        if not usable:
+            logger.warning(f"Replica lag is {lag:.1f}s, falling back to the primary")
+    except Exception as e:
+        logger.error(f"Replica health check failed, falling back to the primary: {str(e)}")
+        usable = False
+
+    _replica_health.update(checked_at=now, usable=usable)
+    return usable
+
+
+def pin_to_primary(*user_ids):
+    """Send these users' reads to the primary for the next READ_YOUR_WRITES_SECONDS."""
+    user_ids = [user_id for user_id in user_ids if user_id is not None]
+    if not user_ids:
+        return
+    try:
+        pipe = redis_client.pipeline()
+        for user_id in user_ids:
+            pipe.setex(f"db_pin:{user_id}", settings.READ_YOUR_WRITES_SECONDS, 1)
+        pipe.execute()
+    except Exception as e:
+        logger.error(f"Could not pin {len(user_ids)} users to the primary: {str(e)}")
+
+
+def is_pinned_to_primary(user_id):
+    if user_id is None:
+        return False
+    try:
+        return bool(redis_client.get(f"db_pin:{user_id}"))
+    except Exception:
+        # If we can't tell, assume a recent write so the user never sees stale data
+        return True
+
+
+def use_replica_for_reads():
+    """Route the current request's safe reads to the replica; returns a token for reset_read_routing."""
+    return _read_alias.set(REPLICA_ALIAS)
+
+
+def reset_read_routing(token):
+    _read_alias.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Sends reads to the replica only while a request has opted in through ReadReplicaMiddleware.
+
+    Writes always go to the primary, and once a request writes, the rest of it reads from the
+    primary too. Sessions, auth and users are never read from the replica so a fresh login is
+    always visible.
+    """
+    primary_only_apps = {'sessions', 'auth', 'contenttypes', 'admin'}
+    primary_only_models = {'accounts.customuser'}
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in self.primary_only_apps:
+            return 'default'
+        if model._meta.label_lower in self.primary_only_models:
+            return 'default'
+        return _read_alias.get() or 'default'
+
+    def db_for_write(self, model, **hints):
+        if _read_alias.get():
+            _read_alias.set(None)
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica is a physical copy of the primary, so relations always hold
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
@@ -0,0 +1,101 @@
+import logging
+
+from django.db import transaction
+
+from .models import (
+    AccountDeletion, BackgroundJob, CustomUser, DataExport, Employee, MonthlySearchUsage, Query, QueryArchive,
+    QueryRender, Subscription, Transaction, UserSearchCount,
+)
+from .query_store import invalidate_query_details
+from .tokens import revoke_access_tokens
+
+logger = logging.getLogger(__name__)
+
+# Deleted in this order, each in batches, before the user rows themselves
+DEPENDENT_MODELS = [
+    ('queries', Query),
+    ('archived queries', QueryArchive),
+    ('search counts', UserSearchCount),
+    ('monthly search usage', MonthlySearchUsage),
+    ('transactions', Transaction),
+    ('subscription', Subscription),
+    ('data exports', DataExport),
+]
+
+
+def request_account_deletion(user):
+    """
+    Disable `user` straight away and queue the deletion of their data. For a company the
+    employees are disabled too. Returns the AccountDeletion; asking twice returns the same one.
+    """
+    user_ids = [user.pk]
+    if user.is_company:
+        user_ids += list(Employee.objects.filter(company_id=user.pk).values_list('user_id', flat=True))
+
+    with transaction.atomic():
+        CustomUser.objects.filter(pk__in=user_ids).update(is_active=False)
+        deletion = AccountDeletion.objects.filter(
+            account_id=user.pk
+        ).exclude(status=BackgroundJob.STATUS_DONE).first()
+        if deletion is None:
+            deletion = AccountDeletion.objects.create(account_id=user.pk, email=user.email)
+
+    # Outstanding access tokens would otherwise keep working until they expire
+    for user_id in user_ids:
+        revoke_access_tokens(user_id)
+    return deletion
+
+
+def _account_user_ids(deletion):
+    return [deletion.account_id] + list(
+        Employee.objects.filter(company_id=deletion.account_id).values_list('user_id', flat=True)
+    )
+
+
+def _delete_batch(queryset, batch_size):
+    """Delete up to `batch_size` rows of `queryset` in a short transaction of its own."""
+    with transaction.atomic():
+        pks = list(queryset.values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return 0
+        if queryset.model in (Query, QueryArchive):
+            # QueryRender has no database-level foreign key to the partitioned query table
+            QueryRender.objects.filter(query_id__in=pks).delete()
+            # After commit, so a concurrent read can't cache the rows again before they're gone
+            transaction.on_commit(lambda: invalidate_query_details(pks))
+        if queryset.model is DataExport:
+            # The ZIPs are personal data too, not just the rows pointing at them
+            for export in DataExport.objects.filter(pk__in=pks).exclude(file=''):
+                export.file.delete(save=False)
+        queryset.model.objects.filter(pk__in=pks).delete()
+    return len(pks)
+
+
+def delete_next_batch(deletion, batch_size):
+    """
+    Delete the next batch of the account's data and record progress on `deletion`.
+    Returns the number of rows removed; 0 means the account is gone.
+    """
+    user_ids = _account_user_ids(deletion)
+    deleted = 0
+    stage = ""
+    for stage, model in DEPENDENT_MODELS:
+        deleted = _delete_batch(model.objects.filter(user_id__in=user_ids), batch_size)
+        if deleted:
+            break
+    else:
+        # Only the accounts are left; employees go first so the company row is the last to go
+        stage = 'accounts'
+        employee_ids = [user_id for user_id in user_ids if user_id != deletion.account_id][:batch_size]
+        with transaction.atomic():
+            if employee_ids:
+                CustomUser.objects.filter(pk__in=employee_ids).delete()
+                deleted = len(employee_ids)
+            else:
+                deleted = 1 if CustomUser.objects.filter(pk=deletion.account_id).delete()[0] else 0
+
+    if deleted:
+        deletion.stage = stage
+        deletion.deleted_rows += deleted
+        deletion.save(update_fields=['stage', 'deleted_rows', 'updated_at'])
+    return deleted
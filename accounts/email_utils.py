@@ -1,4 +1,4 @@
-from django.core.mail import send_mail
+from django.core.mail import EmailMultiAlternatives, get_connection, send_mail
 from django.template.loader import render_to_string
 from django.conf import settings
 from django.utils import timezone
@@ -163,6 +163,51 @@ def send_subscription_cancelled_email(user, subscription, plan_name):
         recipient_list=[user.email]
     )
 
+def send_subscription_expired_emails(subscriptions, plan_names):
+    """
+    Tell the owners of expired subscriptions that their plan has ended, sending the whole
+    batch over one SMTP connection. `subscriptions` should be loaded with
+    select_related('user__individualuser', 'user__company') so names need no extra queries.
+    Returns the number of emails sent.
+    """
+    messages = []
+    for subscription in subscriptions:
+        user = subscription.user
+        user_name = user.email.split('@')[0]  # Default fallback
+        individual = getattr(user, 'individualuser', None)
+        company = getattr(user, 'company', None)
+        if individual:
+            user_name = f"{individual.first_name} {individual.last_name}"
+        elif company:
+            user_name = company.name
+
+        plan_name = plan_names.get(subscription.plan_id, subscription.plan_id.replace('_', ' ').title())
+        context = {
+            'user_name': user_name,
+            'plan_name': plan_name,
+            'expired_on': subscription.current_period_end.strftime('%B %d, %Y'),
+            'dashboard_url': f"{settings.FRONTEND_URL}/dashboard",
+            'resubscribe_url': f"{settings.FRONTEND_URL}/plans"
+        }
+        message = EmailMultiAlternatives(
+            subject="Your Recall Subscription Has Expired",
+            body='',
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=[user.email],
+        )
+        message.attach_alternative(render_to_string('email/subscription_expired.html', context), 'text/html')
+        messages.append(message)
+
+    if not messages:
+        return 0
+    try:
+        sent = get_connection(fail_silently=False).send_messages(messages)
+        logger.info(f"Sent {sent} subscription expiry emails")
+        return sent or 0
+    except Exception as e:
+        logger.error(f"Failed to send subscription expiry emails: {str(e)}")
+        return 0
+
 def send_welcome_email(user, user_type='individual'):
     """
     Send welcome email to new users upon registration completion.
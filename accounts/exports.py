@@ -0,0 +1,111 @@
+import csv
+import json
+import zipfile
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from . import query_store
+
+EXPORT_CHUNK_SIZE = 500
+
+EXPORT_FIELDS = ['query_id', 'query', 'corrected_query', 'documents', 'summary', 'created_at', 'updated_at']
+
+EXPORT_FORMATS = {
+    'jsonl': ('application/x-ndjson', 'jsonl'),
+    'csv': ('text/csv', 'csv'),
+    'zip': ('application/zip', 'zip'),
+}
+
+
+def iter_user_queries(user):
+    """
+    Yield a user's queries oldest first as dicts, fetched EXPORT_CHUNK_SIZE rows at a time.
+    On Postgres this reads through a server-side cursor, so only one chunk is held in memory.
+    Archived queries are included.
+    """
+    return query_store.iter_user_queries(user, EXPORT_FIELDS, EXPORT_CHUNK_SIZE)
+
+
+def stream_jsonl(rows):
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder) + "\n"
+
+
+class _Echo:
+    """Pseudo-buffer for csv.writer that returns each formatted line instead of storing it."""
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        row['documents'] = json.dumps(row['documents'])
+        yield writer.writerow([row[field] for field in EXPORT_FIELDS])
+
+
+def query_to_markdown(row):
+    lines = [f"# {row['query']}", ""]
+    if row['corrected_query'] and row['corrected_query'] != row['query']:
+        lines += [f"_Corrected query: {row['corrected_query']}_", ""]
+    lines += [f"_Created: {row['created_at'].isoformat()}_", "", "## Summary", "", row['summary'] or "", ""]
+
+    documents = row['documents'] or []
+    if documents:
+        lines += ["## Documents", ""]
+        for document in documents:
+            if isinstance(document, dict):
+                name = document.get('pdf_name') or document.get('pdf_url') or "Document"
+                page = f", page {document['page_number']}" if document.get('page_number') is not None else ""
+                url = document.get('pdf_url')
+                lines.append(f"- [{name}]({url}){page}" if url else f"- {name}{page}")
+            else:
+                lines.append(f"- {document}")
+        lines.append("")
+    return "\n".join(lines)
+
+
+class _ZipStream:
+    """Write-only, unseekable file object; ZipFile writes into it and the generator drains it."""
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_markdown_zip(rows):
+    """
+    Stream a ZIP with one Markdown file per query. ZipFile falls back to data descriptors
+    on an unseekable output, so each entry is sent as soon as it's compressed.
+    """
+    output = _ZipStream()
+    with zipfile.ZipFile(output, mode='w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for row in rows:
+            name = f"{row['created_at']:%Y-%m-%d}-{row['query_id']}.md"
+            with archive.open(name, mode='w') as entry:
+                entry.write(query_to_markdown(row).encode('utf-8'))
+            yield output.drain()
+    # Closing the archive writes the central directory
+    yield output.drain()
+
+
+STREAMERS = {
+    'jsonl': stream_jsonl,
+    'csv': stream_csv,
+    'zip': stream_markdown_zip,
+}
+
+
+def stream_export(user, export_format):
+    return STREAMERS[export_format](iter_user_queries(user))
@@ -0,0 +1,82 @@
+import time
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import BackgroundJob
+
+MAX_ATTEMPTS = 3
+
+
+def claim_jobs(queryset, batch_size, stale_after=600, max_attempts=MAX_ATTEMPTS):
+    """
+    Atomically take up to `batch_size` jobs from `queryset` and mark them running.
+
+    Pending jobs are claimed oldest first, along with running jobs whose worker has gone
+    quiet for `stale_after` seconds. A stale job that has already used up `max_attempts`
+    is marked failed instead, so a job that keeps killing its worker isn't retried forever.
+    Rows locked by another worker are skipped, so any number of workers can poll the same table.
+    """
+    now = timezone.now()
+    stale = Q(status=BackgroundJob.STATUS_RUNNING, started_at__lt=now - timedelta(seconds=stale_after))
+    claimable = Q(status=BackgroundJob.STATUS_PENDING) | (stale & Q(attempts__lt=max_attempts))
+
+    with transaction.atomic():
+        queryset.model.objects.filter(
+            pk__in=queryset.filter(stale, attempts__gte=max_attempts).values('pk')
+        ).update(
+            status=BackgroundJob.STATUS_FAILED,
+            error="Worker stopped responding on the last attempt",
+            finished_at=now,
+            updated_at=now,
+        )
+
+        jobs = list(
+            queryset.select_for_update(skip_locked=True)
+            .filter(claimable)
+            .order_by('created_at')[:batch_size]
+        )
+        if not jobs:
+            return []
+
+        queryset.model.objects.filter(pk__in=[job.pk for job in jobs]).update(
+            status=BackgroundJob.STATUS_RUNNING,
+            started_at=now,
+            attempts=F('attempts') + 1,
+        )
+
+    for job in jobs:
+        job.status = BackgroundJob.STATUS_RUNNING
+        job.started_at = now
+        job.attempts += 1
+    return jobs
+
+
+def finish_job(job, error=None, max_attempts=MAX_ATTEMPTS, update_fields=()):
+    """
+    Record the outcome of a claimed job. A failed job goes back to pending until it has
+    used up `max_attempts`.
+    """
+    if error is None:
+        job.status = BackgroundJob.STATUS_DONE
+        job.error = ""
+    else:
+        job.status = BackgroundJob.STATUS_FAILED if job.attempts >= max_attempts else BackgroundJob.STATUS_PENDING
+        job.error = str(error)
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'error', 'finished_at', 'updated_at', *update_fields])
+
+
+def run_worker(process_batch, loop=False, sleep=5):
+    """
+    Call `process_batch()` until it reports no work. With `loop`, keep polling every
+    `sleep` seconds instead of returning.
+    """
+    while True:
+        while process_batch():
+            pass
+        if not loop:
+            return
+        time.sleep(sleep)
@@ -0,0 +1,116 @@
+import logging
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+
+import stripe
+
+from .models import SubscriptionPlan, Transaction
+from .versioning import bump_version
+
+logger = logging.getLogger(__name__)
+
+UPSERT_BATCH_SIZE = 100
+
+# Fallback for prices that predate SubscriptionPlan.stripe_price_id being filled in
+LEGACY_PRICE_PLAN_IDS = {
+    'price_1RArESRrRHqE0EfDltTgBLo9': 'daily',           # Daily Plan
+    'price_1RArETRrRHqE0EfD083TWniN': 'monthly',         # Monthly Plan
+    'price_1RArEURrRHqE0EfDtKuOiKXy': 'annual',          # Annual Plan
+    'price_1RArEURrRHqE0EfD1XiSE1DB': 'student_monthly', # Student Monthly Plan
+    'price_1RArEVRrRHqE0EfDUHIz9UUo': 'student_annual'   # Student Annual Plan
+}
+
+
+def plans_by_price():
+    """Map Stripe price ID -> SubscriptionPlan for every plan, in one query."""
+    plans = {plan.plan_id: plan for plan in SubscriptionPlan.objects.all()}
+    by_price = {plan.stripe_price_id: plan for plan in plans.values() if plan.stripe_price_id}
+    for price_id, plan_id in LEGACY_PRICE_PLAN_IDS.items():
+        if price_id not in by_price and plan_id in plans:
+            by_price[price_id] = plans[plan_id]
+    return by_price
+
+
+def resolve_plan_id(price_id, plans=None):
+    """Internal plan ID for a Stripe price, or None if the price isn't one of ours."""
+    plans = plans if plans is not None else plans_by_price()
+    plan = plans.get(price_id)
+    if plan:
+        return plan.plan_id
+    return LEGACY_PRICE_PLAN_IDS.get(price_id)
+
+
+def _invoice_price_id(invoice):
+    lines = (invoice.get('lines') or {}).get('data') or []
+    if not lines:
+        return None
+    price = lines[0].get('price') or lines[0].get('plan') or {}
+    return price.get('id')
+
+
+def invoice_to_transaction(user, invoice, plans):
+    """Build (without saving) the Transaction for a paid Stripe invoice using only the invoice and local plans."""
+    plan = plans.get(_invoice_price_id(invoice))
+    if plan:
+        description = f"Payment for {plan.name}"
+    else:
+        description = invoice.get('description') or 'subscription'
+
+    return Transaction(
+        user=user,
+        stripe_invoice_id=invoice['id'],
+        stripe_payment_intent_id=invoice.get('payment_intent'),
+        amount=Decimal(invoice.get('amount_paid', 0)) / 100,  # Convert from pence to pounds (GBP)
+        status='succeeded',
+        description=description[:255],
+        receipt_url=invoice.get('hosted_invoice_url'),
+        date=datetime.fromtimestamp(invoice['created'], tz=dt_timezone.utc),
+    )
+
+
+def record_invoices(user, invoices, plans=None):
+    """
+    Upsert paid invoices for `user` into the transaction ledger.
+
+    Rows are written with INSERT ... ON CONFLICT (stripe_invoice_id) DO UPDATE in batches,
+    so replays of the same invoice from webhooks and sync jobs never create duplicates.
+    Returns the number of invoices written.
+    """
+    plans = plans if plans is not None else plans_by_price()
+    transactions = [
+        invoice_to_transaction(user, invoice, plans)
+        for invoice in invoices
+        if invoice.get('status', 'paid') == 'paid'
+    ]
+    for start in range(0, len(transactions), UPSERT_BATCH_SIZE):
+        Transaction.objects.bulk_create(
+            transactions[start:start + UPSERT_BATCH_SIZE],
+            update_conflicts=True,
+            unique_fields=['stripe_invoice_id'],
+            update_fields=['stripe_payment_intent_id', 'amount', 'status', 'description', 'receipt_url', 'date'],
+        )
+
+    if transactions:
+        bump_version('billing', user.pk)
+    return len(transactions)
+
+
+def record_invoice(user, invoice):
+    return record_invoices(user, [invoice])
+
+
+def sync_customer_invoices(user, customer_id, plans=None):
+    """Fetch every paid invoice of a Stripe customer and upsert them. Returns the number written."""
+    plans = plans if plans is not None else plans_by_price()
+    invoices = stripe.Invoice.list(customer=customer_id, status='paid', limit=100)
+
+    written = 0
+    batch = []
+    for invoice in invoices.auto_paging_iter():
+        batch.append(invoice)
+        if len(batch) >= UPSERT_BATCH_SIZE:
+            written += record_invoices(user, batch, plans)
+            batch = []
+    if batch:
+        written += record_invoices(user, batch, plans)
+    return written
@@ -0,0 +1,103 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.models import Query, QueryArchive
+from accounts.partitions import drop_empty_partitions_before, is_partitioned
+from accounts.versioning import bump_versions
+
+
+class Command(BaseCommand):
+    help = (
+        'Moves old queries into the compressed QueryArchive table in small batches '
+        'and deletes streaming answers that were never finished'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than-days', type=int, default=settings.QUERY_ARCHIVE_AFTER_DAYS,
+            help='Archive queries created more than this many days ago'
+        )
+        parser.add_argument('--batch-size', type=int, default=500, help='Queries moved per transaction')
+        parser.add_argument('--sleep', type=float, default=0.2, help='Seconds to pause between batches')
+        parser.add_argument('--max-batches', type=int, default=0, help='Stop after this many batches (0 = no limit)')
+
+    def handle(self, *args, **kwargs):
+        abandoned = self.delete_abandoned_streams(
+            timezone.now() - timedelta(hours=settings.QUERY_STREAM_ABANDON_HOURS), kwargs['batch_size']
+        )
+        if abandoned:
+            self.stdout.write(f"Deleted {abandoned} abandoned streaming answers")
+
+        cutoff = timezone.now() - timedelta(days=kwargs['older_than_days'])
+        self.stdout.write(f"Archiving queries created before {cutoff.isoformat()}")
+
+        total = 0
+        batches = 0
+        while True:
+            moved = self.archive_batch(cutoff, kwargs['batch_size'])
+            if not moved:
+                break
+            total += moved
+            batches += 1
+            self.stdout.write(f"Batch {batches}: archived {moved} queries (total {total})")
+
+            if kwargs['max_batches'] and batches >= kwargs['max_batches']:
+                self.stdout.write(self.style.WARNING("Reached --max-batches, stopping early"))
+                break
+            time.sleep(kwargs['sleep'])
+
+        if is_partitioned():
+            for name in drop_empty_partitions_before(cutoff):
+                self.stdout.write(f"Dropped empty partition {name}")
+
+        self.stdout.write(self.style.SUCCESS(f"Archived {total} queries in {batches} batches"))
+
+    def archive_batch(self, cutoff, batch_size):
+        """
+        Copy the oldest batch of finished queries into the archive and delete it from the live table in one
+        transaction, so a query is always in exactly one tier.
+        """
+        with transaction.atomic():
+            queries = list(
+                Query.objects.select_for_update(skip_locked=True)
+                .filter(created_at__lt=cutoff, status=Query.STATUS_COMPLETE)
+                .order_by('created_at')[:batch_size]
+            )
+            if not queries:
+                return 0
+
+            QueryArchive.objects.bulk_create(
+                [QueryArchive.from_query(query) for query in queries],
+                ignore_conflicts=True
+            )
+            # created_at lets Postgres prune the delete to the old partitions
+            Query.objects.filter(
+                query_id__in=[query.query_id for query in queries],
+                created_at__lt=cutoff
+            ).delete()
+        return len(queries)
+
+    def delete_abandoned_streams(self, cutoff, batch_size):
+        """
+        Delete answers still streaming that got no chunk since `cutoff`. They were never
+        finalized, so no search was charged, and they'd otherwise sit in history unfinished.
+        """
+        deleted = 0
+        while True:
+            with transaction.atomic():
+                # Locked, so a late chunk waits and then finds the query gone instead of racing the delete
+                rows = list(
+                    Query.objects.select_for_update(skip_locked=True)
+                    .filter(status=Query.STATUS_STREAMING, created_at__lt=cutoff, updated_at__lt=cutoff)
+                    .values_list('query_id', 'user_id')[:batch_size]
+                )
+                if not rows:
+                    return deleted
+                Query.objects.filter(query_id__in=[query_id for query_id, _ in rows]).delete()
+                bump_versions('queries', {user_id for _, user_id in rows})
+            deleted += len(rows)
@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts.deletion import delete_next_batch
+from accounts.jobs import claim_jobs, finish_job, run_worker
+from accounts.models import AccountDeletion, BackgroundJob
+
+
+class Command(BaseCommand):
+    help = 'Deletes disabled accounts and their data in small batches so hot tables are never locked for long'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows deleted per transaction')
+        parser.add_argument('--sleep', type=float, default=0.1, help='Seconds to pause between batches')
+        parser.add_argument(
+            '--max-batches', type=int, default=200,
+            help='Batches per claim; keep a claim well under the 10 minute stale-job timeout'
+        )
+        parser.add_argument('--loop', action='store_true', help='Keep polling for new deletions')
+
+    def handle(self, *args, **kwargs):
+        self.options = kwargs
+        run_worker(self.process_batch, loop=kwargs['loop'], sleep=5)
+
+    def process_batch(self):
+        deletions = claim_jobs(AccountDeletion.objects.all(), 1)
+        for deletion in deletions:
+            self.process(deletion)
+        return len(deletions)
+
+    def process(self, deletion):
+        try:
+            for _ in range(self.options['max_batches']):
+                if not delete_next_batch(deletion, self.options['batch_size']):
+                    finish_job(deletion)
+                    self.stdout.write(self.style.SUCCESS(f"Deleted {deletion.email} ({deletion.deleted_rows} rows)"))
+                    return
+                time.sleep(self.options['sleep'])
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f"Failed deleting {deletion.email}: {str(e)}"))
+            finish_job(deletion, error=e)
+            return
+
+        # Still going: put it back in the queue. Progress so far is committed, so nothing is lost.
+        deletion.status = BackgroundJob.STATUS_PENDING
+        deletion.attempts = 0
+        deletion.save(update_fields=['status', 'attempts', 'updated_at'])
+        self.stdout.write(f"{deletion.email}: {deletion.deleted_rows} rows deleted so far ({deletion.stage})")
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from accounts.partitions import add_months, ensure_month_partition, is_partitioned, month_start, partition_name
+
+
+class Command(BaseCommand):
+    help = 'Creates upcoming monthly partitions of accounts_query so inserts never land in the default partition'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months-ahead', type=int, default=3, help='Months after the current one to prepare')
+
+    def handle(self, *args, **kwargs):
+        if not is_partitioned():
+            self.stdout.write(self.style.WARNING("accounts_query is not partitioned on this database, nothing to do"))
+            return
+
+        current = month_start(timezone.now())
+        created = 0
+        for offset in range(kwargs['months_ahead'] + 1):
+            month = add_months(current, offset)
+            try:
+                if ensure_month_partition(month):
+                    created += 1
+                    self.stdout.write(f"Created {partition_name(month)}")
+            except Exception as e:
+                # Usually rows for this month already sit in the default partition
+                self.stdout.write(self.style.ERROR(f"Could not create {partition_name(month)}: {str(e)}"))
+
+        self.stdout.write(self.style.SUCCESS(f"Created {created} query partitions"))
@@ -0,0 +1,74 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from accounts.email_utils import send_subscription_expired_emails
+from accounts.models import Employee, Subscription, SubscriptionPlan
+from accounts.versioning import bump_versions
+
+
+class Command(BaseCommand):
+    help = 'Moves active subscriptions past their period end to expired, in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace-hours', type=int, default=settings.SUBSCRIPTION_EXPIRY_GRACE_HOURS,
+            help='Extra time Stripe-billed subscriptions get for their renewal webhook'
+        )
+        parser.add_argument('--batch-size', type=int, default=500, help='Subscriptions expired per transaction')
+        parser.add_argument('--sleep', type=float, default=0.2, help='Seconds to pause between batches')
+        parser.add_argument('--no-email', action='store_true', help="Don't notify owners")
+
+    def handle(self, *args, **kwargs):
+        now = timezone.now()
+        # Subscriptions activated without Stripe have no renewal to wait for
+        overdue = Q(stripe_subscription_id__isnull=True, current_period_end__lt=now) | Q(
+            stripe_subscription_id__isnull=False,
+            current_period_end__lt=now - timedelta(hours=kwargs['grace_hours']),
+        )
+        plan_names = dict(SubscriptionPlan.objects.values_list('plan_id', 'name'))
+
+        total = 0
+        emailed = 0
+        while True:
+            expired = self.expire_batch(overdue, kwargs['batch_size'])
+            if not expired:
+                break
+            total += len(expired)
+            if not kwargs['no_email']:
+                emailed += send_subscription_expired_emails(expired, plan_names)
+            self.stdout.write(f"Expired {len(expired)} subscriptions (total {total})")
+            time.sleep(kwargs['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f"Expired {total} subscriptions, sent {emailed} emails"))
+
+    def expire_batch(self, overdue, batch_size):
+        """Expire one batch and invalidate the entitlements of everyone it covered."""
+        with transaction.atomic():
+            subscriptions = list(
+                Subscription.objects.select_for_update(skip_locked=True, of=('self',))
+                .select_related('user__individualuser', 'user__company')
+                .filter(overdue, status='active')
+                .order_by('current_period_end')[:batch_size]
+            )
+            if not subscriptions:
+                return []
+
+            Subscription.objects.filter(pk__in=[s.pk for s in subscriptions]).update(
+                status='expired', updated_at=timezone.now()
+            )
+            # A company's subscription also covers its employees
+            owner_ids = [s.user_id for s in subscriptions]
+            user_ids = owner_ids + list(
+                Employee.objects.filter(company_id__in=owner_ids).values_list('user_id', flat=True)
+            )
+
+        for subscription in subscriptions:
+            subscription.status = 'expired'
+        bump_versions('subscription', user_ids)
+        return subscriptions
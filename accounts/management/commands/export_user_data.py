@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from accounts.data_exports import build_export
+from accounts.jobs import claim_jobs, finish_job, run_worker
+from accounts.models import DataExport
+
+
+class Command(BaseCommand):
+    help = 'Builds requested personal-data exports and deletes expired ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2, help='Exports claimed per batch')
+        parser.add_argument('--loop', action='store_true', help='Keep polling for new export requests')
+        parser.add_argument('--sleep', type=float, default=5, help='Seconds to wait between polls with --loop')
+
+    def handle(self, *args, **kwargs):
+        batch_size = kwargs['batch_size']
+        run_worker(lambda: self.process_batch(batch_size), loop=kwargs['loop'], sleep=kwargs['sleep'])
+
+    def process_batch(self, batch_size):
+        # Every poll, so a worker left running with --loop keeps purging expired files
+        self.delete_expired()
+        exports = claim_jobs(DataExport.objects.select_related('user'), batch_size)
+        for export in exports:
+            self.build(export)
+        return len(exports)
+
+    def build(self, export):
+        try:
+            build_export(export)
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f"Failed to export data for user {export.user_id}: {str(e)}"))
+            finish_job(export, error=e)
+            return
+
+        finish_job(export, update_fields=['file', 'size', 'expires_at'])
+        self.stdout.write(self.style.SUCCESS(f"Exported data for user {export.user_id} ({export.size} bytes)"))
+
+    def delete_expired(self):
+        expired = DataExport.objects.filter(expires_at__lt=timezone.now())
+        deleted = 0
+        for export in expired.iterator():
+            if export.file:
+                export.file.delete(save=False)
+            export.delete()
+            deleted += 1
+        if deleted:
+            self.stdout.write(f"Deleted {deleted} expired exports")
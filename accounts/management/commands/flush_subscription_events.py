@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from accounts.jobs import run_worker
+from accounts.stripe_webhooks import apply_queued_subscription_update
+from accounts.subscription_events import claim_due_subscription_updates
+
+
+class Command(BaseCommand):
+    help = 'Applies coalesced customer.subscription.updated events once their window has closed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help='Subscriptions flushed per batch')
+        parser.add_argument('--loop', action='store_true', help='Keep polling for due events')
+        parser.add_argument('--sleep', type=float, default=1, help='Seconds to wait between polls with --loop')
+
+    def handle(self, *args, **kwargs):
+        batch_size = kwargs['batch_size']
+        run_worker(lambda: self.process_batch(batch_size), loop=kwargs['loop'], sleep=kwargs['sleep'])
+
+    def process_batch(self, batch_size):
+        flushed = 0
+        for stripe_sub, created in claim_due_subscription_updates(batch_size):
+            flushed += 1
+            applied = apply_queued_subscription_update(stripe_sub, created)
+            if applied:
+                self.stdout.write(self.style.SUCCESS(f"Applied update for subscription {stripe_sub['id']}"))
+            elif applied is None:
+                self.stdout.write(self.style.ERROR(f"Could not apply update for subscription {stripe_sub['id']}"))
+            else:
+                self.stdout.write(f"Skipped stale or unknown subscription {stripe_sub['id']}")
+        return flushed
@@ -0,0 +1,163 @@
+import re
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from accounts.partitions import QUERY_TABLE, add_months, is_partitioned, month_start, partition_name
+
+STAGING_TABLE = f"{QUERY_TABLE}_partitioned"
+
+# Rows changed this long before the copy started are copied again under the lock, which
+# covers clock skew between web servers and transactions still open when the copy began
+CATCH_UP_MARGIN = timedelta(minutes=10)
+
+_INDEX_DEFINITION = re.compile(r'^(CREATE (?:UNIQUE )?INDEX )(\S+)( ON (?:ONLY )?)\S+( .*)$')
+
+
+class Command(BaseCommand):
+    help = (
+        'Converts accounts_query into a table range-partitioned by month on created_at. '
+        'Rows are copied in batches while the site stays up; writes to saved queries are '
+        'blocked only for the final catch-up and table swap'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows copied per transaction')
+        parser.add_argument('--sleep', type=float, default=0.1, help='Seconds to pause between batches')
+        parser.add_argument('--months-ahead', type=int, default=3, help='Empty monthly partitions to create past the current month')
+
+    def handle(self, *args, **kwargs):
+        if connection.vendor != 'postgresql':
+            raise CommandError("Partitioning needs PostgreSQL")
+        if is_partitioned():
+            self.stdout.write(self.style.WARNING("accounts_query is already partitioned, nothing to do"))
+            return
+
+        copy_started = timezone.now()
+        index_renames = self.create_staging_table(kwargs['months_ahead'])
+        copied = self.copy_rows(kwargs['batch_size'], kwargs['sleep'])
+        self.stdout.write(f"Copied {copied} rows, blocking writes to catch up and swap tables")
+
+        lock_started = time.monotonic()
+        self.swap_tables(copy_started - CATCH_UP_MARGIN, index_renames)
+        self.stdout.write(f"Writes were blocked for {time.monotonic() - lock_started:.1f}s")
+        self.stdout.write(self.style.SUCCESS("accounts_query is now partitioned by month"))
+
+    def create_staging_table(self, months_ahead):
+        """
+        Create an empty partitioned copy of accounts_query, with a partition for every month
+        from the oldest row on. Its indexes are built up front under temporary names, so
+        none have to be built while writes are blocked. Returns the renames to apply after the swap.
+        """
+        with connection.cursor() as cursor:
+            # Left over from an interrupted run; its partitions go with it
+            cursor.execute(f'DROP TABLE IF EXISTS "{STAGING_TABLE}"')
+
+            cursor.execute(
+                "SELECT indexname, indexdef FROM pg_indexes WHERE tablename = %s AND indexname NOT IN ("
+                "SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype IN ('p', 'u'))",
+                [QUERY_TABLE, QUERY_TABLE]
+            )
+            indexes = cursor.fetchall()
+
+            cursor.execute(f'SELECT MIN(created_at) FROM "{QUERY_TABLE}"')
+            oldest = cursor.fetchone()[0] or timezone.now()
+
+            cursor.execute(
+                f'CREATE TABLE "{STAGING_TABLE}" (LIKE "{QUERY_TABLE}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+                "PARTITION BY RANGE (created_at)"
+            )
+            # Postgres requires the partition key in every unique constraint
+            cursor.execute(f'ALTER TABLE "{STAGING_TABLE}" ADD PRIMARY KEY (query_id, created_at)')
+
+            month = month_start(oldest)
+            last = add_months(month_start(timezone.now()), months_ahead)
+            while month <= last:
+                cursor.execute(
+                    f'CREATE TABLE "{partition_name(month)}" PARTITION OF "{STAGING_TABLE}" '
+                    f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+                )
+                month = add_months(month, 1)
+            cursor.execute(f'CREATE TABLE "{QUERY_TABLE}_default" PARTITION OF "{STAGING_TABLE}" DEFAULT')
+
+            index_renames = []
+            for name, definition in indexes:
+                match = _INDEX_DEFINITION.match(definition)
+                if not match:
+                    raise CommandError(f"Don't know how to copy index {name}: {definition}")
+                temporary_name = f"{name[:59]}_new"
+                cursor.execute(
+                    f'{match.group(1)}"{temporary_name}"{match.group(3)}"{STAGING_TABLE}"{match.group(4)}'
+                )
+                index_renames.append((temporary_name, name))
+        return index_renames
+
+    def copy_rows(self, batch_size, sleep):
+        """Copy every row in primary key order, one batch per transaction, without blocking writers."""
+        copied = 0
+        last_id = None
+        while True:
+            with connection.cursor() as cursor:
+                if last_id is None:
+                    cursor.execute(f'SELECT query_id FROM "{QUERY_TABLE}" ORDER BY query_id LIMIT %s', [batch_size])
+                else:
+                    cursor.execute(
+                        f'SELECT query_id FROM "{QUERY_TABLE}" WHERE query_id > %s ORDER BY query_id LIMIT %s',
+                        [last_id, batch_size]
+                    )
+                ids = [row[0] for row in cursor.fetchall()]
+                if not ids:
+                    return copied
+                cursor.execute(
+                    f'INSERT INTO "{STAGING_TABLE}" SELECT * FROM "{QUERY_TABLE}" WHERE query_id = ANY(%s)',
+                    [ids]
+                )
+            copied += len(ids)
+            last_id = ids[-1]
+            self.stdout.write(f"Copied {copied} rows")
+            time.sleep(sleep)
+
+    def swap_tables(self, changed_since, index_renames):
+        """
+        Under a lock that blocks writes but not reads, copy again every row changed or added
+        since the batches started, drop rows deleted meanwhile, and swap the staging table in.
+        Foreign keys are only added here: on the staging table they would block deleting a
+        user whose queries had already been copied, and Postgres can't add them NOT VALID
+        to a partitioned table.
+        """
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'LOCK TABLE "{QUERY_TABLE}" IN EXCLUSIVE MODE')
+
+            cursor.execute(
+                f'DELETE FROM "{STAGING_TABLE}" staged USING "{QUERY_TABLE}" live '
+                "WHERE staged.query_id = live.query_id AND live.updated_at >= %s",
+                [changed_since]
+            )
+            cursor.execute(
+                f'INSERT INTO "{STAGING_TABLE}" SELECT * FROM "{QUERY_TABLE}" WHERE updated_at >= %s',
+                [changed_since]
+            )
+            cursor.execute(
+                f'DELETE FROM "{STAGING_TABLE}" staged WHERE NOT EXISTS ('
+                f'SELECT 1 FROM "{QUERY_TABLE}" live WHERE live.query_id = staged.query_id)'
+            )
+
+            cursor.execute(
+                "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+                "WHERE conrelid = %s::regclass AND contype = 'f'",
+                [QUERY_TABLE]
+            )
+            foreign_keys = cursor.fetchall()
+
+            cursor.execute(f'DROP TABLE "{QUERY_TABLE}"')
+            cursor.execute(f'ALTER TABLE "{STAGING_TABLE}" RENAME TO "{QUERY_TABLE}"')
+            cursor.execute(
+                f'ALTER TABLE "{QUERY_TABLE}" RENAME CONSTRAINT "{STAGING_TABLE}_pkey" TO "{QUERY_TABLE}_pkey"'
+            )
+            for temporary_name, name in index_renames:
+                cursor.execute(f'ALTER INDEX "{temporary_name}" RENAME TO "{name}"')
+            for name, definition in foreign_keys:
+                cursor.execute(f'ALTER TABLE "{QUERY_TABLE}" ADD CONSTRAINT "{name}" {definition}')
@@ -0,0 +1,55 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from accounts.jobs import claim_jobs, finish_job, run_worker
+from accounts.models import StudentIdUpload
+from accounts.student_ids import assemble_upload, attach_to_student, discard_chunks, make_preview
+
+
+class Command(BaseCommand):
+    help = 'Assembles chunked student ID uploads and makes the previews shown on the approval screen'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10, help='Uploads claimed per batch')
+        parser.add_argument('--abandoned-hours', type=int, default=24, help='Delete unfinished uploads older than this')
+        parser.add_argument('--loop', action='store_true', help='Keep polling for completed uploads')
+        parser.add_argument('--sleep', type=float, default=2, help='Seconds to wait between polls with --loop')
+
+    def handle(self, *args, **kwargs):
+        self.discard_abandoned(kwargs['abandoned_hours'])
+        batch_size = kwargs['batch_size']
+        run_worker(lambda: self.process_batch(batch_size), loop=kwargs['loop'], sleep=kwargs['sleep'])
+
+    def process_batch(self, batch_size):
+        uploads = claim_jobs(StudentIdUpload.objects.filter(completed_at__isnull=False), batch_size)
+        for upload in uploads:
+            self.process(upload)
+        return len(uploads)
+
+    def process(self, upload):
+        try:
+            if not upload.file:
+                assemble_upload(upload)
+            preview = make_preview(upload)
+            if preview is not None:
+                upload.preview.save(preview.name, preview, save=False)
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f"Failed to process {upload}: {str(e)}"))
+            finish_job(upload, error=e)
+            return
+
+        finish_job(upload, update_fields=['file', 'preview'])
+        # Registration may have linked the student while this upload was being processed
+        upload.student = StudentIdUpload.objects.get(pk=upload.pk).student
+        attach_to_student(upload)
+        self.stdout.write(self.style.SUCCESS(f"Processed {upload}"))
+
+    def discard_abandoned(self, hours):
+        abandoned = StudentIdUpload.objects.filter(
+            completed_at__isnull=True, created_at__lt=timezone.now() - timedelta(hours=hours)
+        )
+        for upload in abandoned.iterator():
+            discard_chunks(upload)
+            upload.delete()
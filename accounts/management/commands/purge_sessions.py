@@ -0,0 +1,73 @@
+import time
+
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = 'Deletes expired sessions in small batches so it can run alongside live traffic'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Sessions deleted per batch')
+        parser.add_argument('--sleep', type=float, default=0.5, help='Seconds to pause between batches')
+        parser.add_argument('--max-batches', type=int, default=0, help='Stop after this many batches (0 = no limit)')
+        parser.add_argument('--loop', action='store_true', help='Keep running, starting a new pass after each one')
+        parser.add_argument('--idle-sleep', type=float, default=300, help='Seconds to wait between passes with --loop')
+
+    def handle(self, *args, **kwargs):
+        while True:
+            self.purge(kwargs['batch_size'], kwargs['sleep'], kwargs['max_batches'])
+            if not kwargs['loop']:
+                break
+            time.sleep(kwargs['idle_sleep'])
+
+    def purge(self, batch_size, sleep, max_batches):
+        """
+        Walk the expire_date index from the oldest session forward, deleting one batch per
+        transaction. Each batch commits on its own, so the job can be stopped at any point
+        and simply started again to resume where it left off.
+        """
+        cutoff = timezone.now()
+        cursor = None
+        total_deleted = 0
+        batches = 0
+
+        self.stdout.write(f"Purging sessions that expired before {cutoff.isoformat()}")
+
+        while True:
+            expired = Session.objects.filter(expire_date__lt=cutoff)
+            if cursor is not None:
+                # Skip past the rows already deleted instead of rescanning their dead index entries
+                expired = expired.filter(expire_date__gte=cursor)
+
+            batch = list(
+                expired.order_by('expire_date').values_list('session_key', 'expire_date')[:batch_size]
+            )
+            if not batch:
+                break
+
+            deleted, _ = Session.objects.filter(
+                session_key__in=[session_key for session_key, _ in batch],
+                expire_date__lt=cutoff,
+            ).delete()
+
+            cursor = batch[-1][1]
+            total_deleted += deleted
+            batches += 1
+            self.stdout.write(
+                f"Batch {batches}: deleted {deleted} sessions "
+                f"(total {total_deleted}, reached {cursor.isoformat()})"
+            )
+
+            if max_batches and batches >= max_batches:
+                self.stdout.write(self.style.WARNING("Reached --max-batches, stopping early"))
+                break
+
+            if len(batch) < batch_size:
+                break
+
+            time.sleep(sleep)
+
+        self.stdout.write(self.style.SUCCESS(f"Purged {total_deleted} expired sessions in {batches} batches"))
+        return total_deleted
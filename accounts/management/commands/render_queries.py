@@ -0,0 +1,51 @@
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand
+
+from accounts.jobs import claim_jobs, finish_job, run_worker
+from accounts.models import QueryRender
+from accounts.rendering import render_query
+
+
+class Command(BaseCommand):
+    help = 'Renders requested query summaries to PDF/DOCX so request workers never have to'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10, help='Renders claimed per batch')
+        parser.add_argument('--loop', action='store_true', help='Keep polling for new render requests')
+        parser.add_argument('--sleep', type=float, default=2, help='Seconds to wait between polls with --loop')
+
+    def handle(self, *args, **kwargs):
+        batch_size = kwargs['batch_size']
+        run_worker(lambda: self.process_batch(batch_size), loop=kwargs['loop'], sleep=kwargs['sleep'])
+
+    def process_batch(self, batch_size):
+        renders = claim_jobs(QueryRender.objects.select_related('query'), batch_size)
+        for render in renders:
+            self.render(render)
+        return len(renders)
+
+    def render(self, render):
+        try:
+            content = render_query(render.query, render.format)
+            render.file.save(f"{render.cache_key}.{render.format}", ContentFile(content), save=False)
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f"Failed to render {render}: {str(e)}"))
+            finish_job(render, error=e)
+            return
+
+        finish_job(render, update_fields=['file'])
+        self.stdout.write(self.style.SUCCESS(f"Rendered {render} ({render.file.size} bytes)"))
+        self.discard_superseded(render)
+
+    def discard_superseded(self, render):
+        """
+        Drop earlier renders of the same query and format; their content is out of date.
+        Renders requested after this one may be of a newer edit, so they're never touched.
+        """
+        superseded = QueryRender.objects.filter(
+            query_id=render.query_id, format=render.format, created_at__lt=render.created_at
+        ).exclude(status=QueryRender.STATUS_RUNNING)
+        for old in superseded:
+            if old.file:
+                old.file.delete(save=False)
+            old.delete()
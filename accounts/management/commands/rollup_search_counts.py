@@ -0,0 +1,75 @@
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from accounts.models import MonthlySearchUsage, UserSearchCount
+
+
+class Command(BaseCommand):
+    help = 'Rolls old daily search counts into monthly totals and deletes the daily rows in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--retention-days', type=int, default=settings.SEARCH_COUNT_RETENTION_DAYS,
+            help='Keep daily rows for this many days'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000, help='Daily rows rolled up per transaction')
+        parser.add_argument('--sleep', type=float, default=0.2, help='Seconds to pause between batches')
+
+    def handle(self, *args, **kwargs):
+        cutoff = timezone.now().date() - timedelta(days=kwargs['retention_days'])
+        self.stdout.write(f"Rolling up daily search counts before {cutoff.isoformat()}")
+
+        total = 0
+        batches = 0
+        while True:
+            rolled = self.rollup_batch(cutoff, kwargs['batch_size'])
+            if not rolled:
+                break
+            total += rolled
+            batches += 1
+            self.stdout.write(f"Batch {batches}: rolled up {rolled} daily rows (total {total})")
+            time.sleep(kwargs['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f"Rolled up {total} daily rows in {batches} batches"))
+
+    def rollup_batch(self, cutoff, batch_size):
+        """
+        Add one batch of daily rows to the monthly totals and delete them in the same
+        transaction, so every search is counted exactly once even if the job is interrupted.
+        """
+        with transaction.atomic():
+            rows = list(
+                UserSearchCount.objects.select_for_update(skip_locked=True)
+                .filter(date__lt=cutoff)
+                .order_by('date', 'id')
+                .values('id', 'user_id', 'date', 'count')[:batch_size]
+            )
+            if not rows:
+                return 0
+
+            totals = defaultdict(lambda: [0, 0])
+            for row in rows:
+                month_totals = totals[(row['user_id'], row['date'].replace(day=1))]
+                month_totals[0] += row['count']
+                month_totals[1] += 1
+
+            for (user_id, month), (searches, active_days) in totals.items():
+                updated = MonthlySearchUsage.objects.filter(user_id=user_id, month=month).update(
+                    searches=F('searches') + searches,
+                    active_days=F('active_days') + active_days,
+                    updated_at=timezone.now(),
+                )
+                if not updated:
+                    MonthlySearchUsage.objects.create(
+                        user_id=user_id, month=month, searches=searches, active_days=active_days
+                    )
+
+            UserSearchCount.objects.filter(id__in=[row['id'] for row in rows]).delete()
+        return len(rows)
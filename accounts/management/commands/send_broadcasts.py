@@ -0,0 +1,146 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from accounts.broadcasts import queue_recipients, render_campaign, send_to_recipients
+from accounts.jobs import run_worker
+from accounts.models import BroadcastCampaign, BroadcastRecipient
+
+# A claimed recipient left in 'sending' this long means its worker died mid-batch
+SENDING_STALE_SECONDS = 15 * 60
+
+
+class Command(BaseCommand):
+    help = 'Sends queued broadcast campaigns in rate-limited batches over a reused SMTP connection'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200, help='Recipients claimed per batch')
+        parser.add_argument(
+            '--rate', type=float, default=settings.BROADCAST_MAX_PER_SECOND,
+            help='Maximum messages per second for this worker (0 for no limit)'
+        )
+        parser.add_argument('--loop', action='store_true', help='Keep polling for queued campaigns')
+        parser.add_argument('--sleep', type=float, default=10, help='Seconds to wait between polls with --loop')
+
+    def handle(self, *args, **kwargs):
+        self.rate = kwargs['rate']
+        self.rendered = {}
+        self.connection = get_connection(fail_silently=False)
+        self.connection.open()
+        try:
+            batch_size = kwargs['batch_size']
+            run_worker(lambda: self.process_batch(batch_size), loop=kwargs['loop'], sleep=kwargs['sleep'])
+        finally:
+            self.connection.close()
+
+    def process_batch(self, batch_size):
+        self.start_queued_campaigns()
+
+        campaign = BroadcastCampaign.objects.filter(
+            status=BroadcastCampaign.STATUS_SENDING
+        ).order_by('started_at').first()
+        if campaign is None:
+            return 0
+
+        started = time.monotonic()
+        recipients = self.claim_recipients(campaign, batch_size)
+        if not recipients:
+            # Carry on with the next campaign if this one just completed
+            return int(self.finish_campaign(campaign))
+
+        if campaign.pk not in self.rendered:
+            self.rendered[campaign.pk] = render_campaign(campaign)
+        sent, failed = send_to_recipients(campaign, self.rendered[campaign.pk], recipients, self.connection)
+        BroadcastCampaign.objects.filter(pk=campaign.pk).update(
+            sent_count=F('sent_count') + sent, failed_count=F('failed_count') + failed
+        )
+
+        self.stdout.write(f"{campaign.name}: sent {sent}, failed {failed}")
+        self.throttle(len(recipients), started)
+        return len(recipients)
+
+    def claim_recipients(self, campaign, batch_size):
+        """
+        Move the next batch of pending recipients to 'sending' in a short transaction of its
+        own, so parallel workers never pick the same rows and a retry never sends to them again.
+        """
+        self.abandon_stale_recipients(campaign)
+        with transaction.atomic():
+            recipients = list(
+                BroadcastRecipient.objects.select_for_update(skip_locked=True)
+                .filter(campaign=campaign, status=BroadcastRecipient.STATUS_PENDING)
+                .order_by('id')[:batch_size]
+            )
+            now = timezone.now()
+            BroadcastRecipient.objects.filter(pk__in=[recipient.pk for recipient in recipients]).update(
+                status=BroadcastRecipient.STATUS_SENDING, claimed_at=now
+            )
+        for recipient in recipients:
+            recipient.status = BroadcastRecipient.STATUS_SENDING
+            recipient.claimed_at = now
+        return recipients
+
+    def abandon_stale_recipients(self, campaign):
+        """
+        Recipients still 'sending' long after they were claimed belong to a worker that died.
+        Their message may or may not have gone out, so they're marked failed rather than sent again.
+        """
+        abandoned = BroadcastRecipient.objects.filter(
+            campaign=campaign,
+            status=BroadcastRecipient.STATUS_SENDING,
+            claimed_at__lt=timezone.now() - timedelta(seconds=SENDING_STALE_SECONDS),
+        ).update(
+            status=BroadcastRecipient.STATUS_FAILED,
+            error="The worker stopped before this message's outcome was recorded; it may have been delivered",
+        )
+        if abandoned:
+            BroadcastCampaign.objects.filter(pk=campaign.pk).update(failed_count=F('failed_count') + abandoned)
+            self.stdout.write(self.style.WARNING(f"{campaign.name}: {abandoned} recipients abandoned by a stopped worker"))
+
+    def start_queued_campaigns(self):
+        """Snapshot the audience of each newly queued campaign and move it to sending."""
+        while True:
+            with transaction.atomic():
+                campaign = BroadcastCampaign.objects.select_for_update(skip_locked=True).filter(
+                    status=BroadcastCampaign.STATUS_QUEUED
+                ).order_by('created_at').first()
+                if campaign is None:
+                    return
+                campaign.recipient_count = queue_recipients(campaign)
+                campaign.status = BroadcastCampaign.STATUS_SENDING
+                campaign.started_at = timezone.now()
+                campaign.save(update_fields=['recipient_count', 'status', 'started_at'])
+            self.stdout.write(f"Queued {campaign.recipient_count} recipients for {campaign.name}")
+
+    def finish_campaign(self, campaign):
+        # Batches still being sent by other workers are in 'sending' and keep the campaign open
+        if BroadcastRecipient.objects.filter(
+            campaign=campaign,
+            status__in=[BroadcastRecipient.STATUS_PENDING, BroadcastRecipient.STATUS_SENDING],
+        ).exists():
+            return False
+        # Recount from the recipients: a worker that died mid-batch never added its batch's counts
+        counts = campaign.recipients.aggregate(
+            sent=Count('pk', filter=Q(status=BroadcastRecipient.STATUS_SENT)),
+            failed=Count('pk', filter=Q(status=BroadcastRecipient.STATUS_FAILED)),
+        )
+        BroadcastCampaign.objects.filter(pk=campaign.pk, status=BroadcastCampaign.STATUS_SENDING).update(
+            status=BroadcastCampaign.STATUS_SENT, finished_at=timezone.now(),
+            sent_count=counts['sent'], failed_count=counts['failed'],
+        )
+        self.rendered.pop(campaign.pk, None)
+        self.stdout.write(self.style.SUCCESS(f"Finished campaign {campaign.name}"))
+        return True
+
+    def throttle(self, sent, started):
+        if self.rate <= 0:
+            return
+        remaining = sent / self.rate - (time.monotonic() - started)
+        if remaining > 0:
+            time.sleep(remaining)
@@ -1,8 +1,8 @@
 from django.core.management.base import BaseCommand, CommandError
 import stripe
 from django.conf import settings
-from accounts.models import CustomUser, Subscription, Transaction
-from accounts.stripe_webhooks import create_transaction_from_invoice
+from accounts.ledger import sync_customer_invoices
+from accounts.models import CustomUser, Subscription
 
 class Command(BaseCommand):
     help = 'Syncs transactions for a specific customer from Stripe'
@@ -39,44 +39,20 @@ class Command(BaseCommand):
         
         # Fetch and sync invoices
         try:
-            self.stdout.write(f"Fetching invoices for Stripe customer: {customer_id}")
-            
-            invoices = stripe.Invoice.list(
-                customer=customer_id,
-                limit=100
-            )
-            
-            self.stdout.write(f"Found {len(invoices.data)} invoices")
-            synced_count = 0
-            
             # Find the user for this customer ID if email wasn't provided
             if not email:
-                subscription = Subscription.objects.filter(stripe_customer_id=customer_id).first()
+                subscription = Subscription.objects.filter(stripe_customer_id=customer_id).select_related('user').first()
                 if not subscription:
                     raise CommandError(f"No subscription found for Stripe customer: {customer_id}")
                 user = subscription.user
             
-            # Process each invoice
-            for invoice in invoices.data:
-                # Skip if not paid
-                if invoice.status != 'paid':
-                    self.stdout.write(f"Skipping invoice {invoice.id} (status: {invoice.status})")
-                    continue
-                
-                # Check if transaction already exists
-                existing = Transaction.objects.filter(stripe_invoice_id=invoice.id).exists()
-                if existing:
-                    self.stdout.write(f"Transaction for invoice {invoice.id} already exists, skipping")
-                    continue
-                
-                # Create transaction
-                try:
-                    create_transaction_from_invoice(user, invoice)
-                    synced_count += 1
-                    self.stdout.write(self.style.SUCCESS(f"Created transaction for invoice {invoice.id}"))
-                except Exception as e:
-                    self.stdout.write(self.style.ERROR(f"Error creating transaction for invoice {invoice.id}: {str(e)}"))
+            self.stdout.write(f"Fetching paid invoices for Stripe customer: {customer_id}")
+            
+            # Paid invoices are upserted in batches; ones already recorded are refreshed in place
+            synced_count = sync_customer_invoices(user, customer_id)
             
             self.stdout.write(self.style.SUCCESS(f"Successfully synced {synced_count} transactions for customer {customer_id}"))
+        except CommandError:
+            raise
         except Exception as e:
-            self.stdout.write(self.style.ERROR(f"Error syncing transactions: {str(e)}")) 
\ No newline at end of file
+            self.stdout.write(self.style.ERROR(f"Error syncing transactions: {str(e)}"))
@@ -1,6 +1,18 @@
 from django.contrib.sessions.backends.db import SessionStore
 from django.contrib.sessions.middleware import SessionMiddleware
+from django.conf import settings
 from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+from .compression import choose_encoding, compress, compress_stream, compressed_cache, is_compressible
+
+from .db_routers import (
+    replica_is_usable, is_pinned_to_primary, pin_to_primary, use_replica_for_reads, reset_read_routing
+)
+from .tokens import get_request_user_id
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
 
 class CustomSessionMiddleware(SessionMiddleware):
     """
@@ -19,4 +31,87 @@ class CustomAuthMiddleware(AuthenticationMiddleware):
     """
     Standard authentication middleware to be used after the custom session middleware
     """
-    pass 
\ No newline at end of file
+    pass
+
+
+class ReadReplicaMiddleware(MiddlewareMixin):
+    """
+    Lets views marked with `use_read_replica = True` serve safe requests from the read replica.
+
+    After any successful write the user is pinned to the primary for READ_YOUR_WRITES_SECONDS,
+    so they always see their own changes. Requires ReplicaRouter in DATABASE_ROUTERS.
+    """
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'view_class', None)
+        if request.method not in SAFE_METHODS or not getattr(view_class, 'use_read_replica', False):
+            return None
+
+        if not replica_is_usable() or is_pinned_to_primary(get_request_user_id(request)):
+            return None
+
+        request._replica_routing_token = use_replica_for_reads()
+        return None
+
+    def process_response(self, request, response):
+        token = getattr(request, '_replica_routing_token', None)
+        if token is not None:
+            reset_read_routing(token)
+
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            user = getattr(request, 'user', None)
+            if user is not None and user.is_authenticated:
+                pin_to_primary(user.pk)
+        return response
+
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Brotli or gzip compression of GET responses, negotiated from Accept-Encoding.
+
+    Bodies under COMPRESSION_MIN_BYTES and types that are already compressed (PDFs, ZIPs,
+    images) are sent as they are. Views marked with `cache_compressed_responses = True` serve
+    immutable payloads, so their large bodies are compressed once at the best quality and
+    reused from CompressedCache. Only safe methods are compressed, which keeps responses
+    that carry new tokens out of reach of BREACH-style attacks.
+    """
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'view_class', None)
+        request._cache_compressed = getattr(view_class, 'cache_compressed_responses', False)
+        return None
+
+    def process_response(self, request, response):
+        if request.method not in SAFE_METHODS or response.has_header('Content-Encoding'):
+            return response
+        if not is_compressible(response.get('Content-Type', '')):
+            return response
+        if not response.streaming and len(response.content) < settings.COMPRESSION_MIN_BYTES:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            if response.is_async:
+                return response
+            response.streaming_content = compress_stream(response.streaming_content, encoding)
+            del response['Content-Length']
+        else:
+            content = response.content
+            if getattr(request, '_cache_compressed', False) and len(content) >= settings.COMPRESSION_CACHE_MIN_BYTES:
+                compressed = compressed_cache.get_or_compress(content, encoding)
+            else:
+                compressed = compress(content, encoding)
+            if len(compressed) >= len(content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+
+        # The encoded bytes differ, so a strong validator no longer applies to them
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = encoding
+        return response
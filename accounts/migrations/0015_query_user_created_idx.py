@@ -0,0 +1,17 @@
+# Generated by Django 5.1.7 on 2026-10-19 18:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0014_remove_studentuser_student_id_text'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='query',
+            index=models.Index(fields=['user', '-created_at'], name='query_user_created_idx'),
+        ),
+    ]
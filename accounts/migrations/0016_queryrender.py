@@ -0,0 +1,34 @@
+# Generated by Django 5.1.7 on 2026-10-19 18:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0015_query_user_created_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QueryRender',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], db_index=True, default='pending', max_length=20)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('error', models.TextField(blank=True, default='')),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('format', models.CharField(choices=[('pdf', 'PDF'), ('docx', 'Word document')], max_length=10)),
+                ('cache_key', models.CharField(max_length=64, unique=True)),
+                ('file', models.FileField(blank=True, null=True, upload_to='renders/')),
+                ('query', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='renders', to='accounts.query')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.1.7 on 2026-10-19 19:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0016_queryrender'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='queryrender',
+            name='query',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='renders', to='accounts.query'),
+        ),
+        migrations.CreateModel(
+            name='QueryArchive',
+            fields=[
+                ('query_id', models.UUIDField(editable=False, primary_key=True, serialize=False)),
+                ('query', models.TextField()),
+                ('payload', models.BinaryField()),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_queries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', '-created_at'], name='query_archive_user_created_idx')],
+            },
+        ),
+        # accounts_query itself is partitioned by the partition_query_table command, not here,
+        # since the copy must not run unattended against live traffic on every deploy
+    ]
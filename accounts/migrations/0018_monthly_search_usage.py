@@ -0,0 +1,38 @@
+# Generated by Django 5.1.7 on 2026-10-19 19:04
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0017_query_partitions_and_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlySearchUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('searches', models.PositiveIntegerField(default=0)),
+                ('active_days', models.PositiveSmallIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='usersearchcount',
+            index=models.Index(fields=['date'], name='search_count_date_idx'),
+        ),
+        migrations.AddField(
+            model_name='monthlysearchusage',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_search_usage', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterUniqueTogether(
+            name='monthlysearchusage',
+            unique_together={('user', 'month')},
+        ),
+    ]
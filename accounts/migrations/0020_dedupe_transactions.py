@@ -0,0 +1,27 @@
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def remove_duplicate_invoices(apps, schema_editor):
+    """Keep the earliest transaction for each Stripe invoice so the column can become unique."""
+    Transaction = apps.get_model('accounts', 'Transaction')
+    duplicates = (
+        Transaction.objects.values('stripe_invoice_id')
+        .annotate(copies=Count('id'), keep_id=Min('id'))
+        .filter(copies__gt=1)
+    )
+    for duplicate in duplicates.iterator():
+        Transaction.objects.filter(
+            stripe_invoice_id=duplicate['stripe_invoice_id']
+        ).exclude(id=duplicate['keep_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0019_transaction_user_date_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_invoices, migrations.RunPython.noop),
+    ]
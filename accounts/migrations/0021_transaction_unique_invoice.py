@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-19 19:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0020_dedupe_transactions'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='transaction',
+            name='stripe_invoice_id',
+            field=models.CharField(max_length=100, unique=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-19 19:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0021_transaction_unique_invoice'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='subscription',
+            name='stripe_event_created',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
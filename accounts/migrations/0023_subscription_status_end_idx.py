@@ -0,0 +1,17 @@
+# Generated by Django 5.1.7 on 2026-10-19 19:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0022_subscription_stripe_event_created'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(fields=['status', 'current_period_end'], name='subscription_status_end_idx'),
+        ),
+    ]
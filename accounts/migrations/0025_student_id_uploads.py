@@ -0,0 +1,46 @@
+# Generated by Django 5.1.7 on 2026-10-19 19:15
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0024_broadcasts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studentuser',
+            name='student_id_preview',
+            field=models.FileField(blank=True, null=True, upload_to='student_id_previews/'),
+        ),
+        migrations.CreateModel(
+            name='StudentIdUpload',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], db_index=True, default='pending', max_length=20)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('error', models.TextField(blank=True, default='')),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('upload_id', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('email', models.EmailField(db_index=True, max_length=254)),
+                ('filename', models.CharField(max_length=255)),
+                ('content_type', models.CharField(max_length=100)),
+                ('size', models.PositiveIntegerField()),
+                ('received', models.PositiveIntegerField(default=0)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('file', models.FileField(blank=True, null=True, upload_to='student_ids/')),
+                ('preview', models.FileField(blank=True, null=True, upload_to='student_id_previews/')),
+                ('student', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='id_upload', to='accounts.studentuser')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.1.7 on 2026-10-19 19:18
+
+from django.db import migrations, models
+
+
+def create_text_search_index(apps, schema_editor):
+    """
+    GIN index over the English tsvector of the query text. The expression must match what
+    SearchVector('query', config='english') compiles to, or QueryAdmin's search can't use it.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS query_text_search_idx ON accounts_query "
+        "USING gin (to_tsvector('english'::regconfig, COALESCE(query, '')))"
+    )
+
+
+def drop_text_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS query_text_search_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0025_student_id_uploads'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='query',
+            index=models.Index(fields=['-created_at'], name='query_created_idx'),
+        ),
+        migrations.RunPython(create_text_search_index, drop_text_search_index),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.7 on 2026-10-19 19:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0028_data_export'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='query',
+            name='last_chunk_seq',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='query',
+            name='status',
+            field=models.CharField(choices=[('streaming', 'Streaming'), ('complete', 'Complete')], default='complete', max_length=20),
+        ),
+    ]
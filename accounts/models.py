@@ -1,9 +1,13 @@
+import json
 import os
 import uuid
+import zlib
 from datetime import timedelta
 
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 from django.db import models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
 from django.utils import timezone
 from dotenv import load_dotenv
 
@@ -63,6 +67,8 @@ class StudentUser(models.Model):
     phone_number = models.CharField(max_length=15)
     date_of_birth = models.DateField()
     student_id = models.FileField(upload_to='student_ids/', null=True, blank=True)
+    # Downscaled JPEG of student_id for the approval screen, made by process_student_ids
+    student_id_preview = models.FileField(upload_to='student_id_previews/', null=True, blank=True)
     student_organisation_name = models.CharField(max_length=255)
     terms_and_conditions = models.BooleanField(default=False)
     date_joined = models.DateTimeField(auto_now_add=True)
@@ -100,18 +106,93 @@ class Employee(models.Model):
 
 
 class Query(models.Model):
+    STATUS_STREAMING = 'streaming'
+    STATUS_COMPLETE = 'complete'
+    STATUS_CHOICES = [
+        (STATUS_STREAMING, 'Streaming'),
+        (STATUS_COMPLETE, 'Complete'),
+    ]
+
     query_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='queries')
     query = models.TextField()
     corrected_query = models.TextField(null=True, blank=True)
     documents = models.JSONField(default=list)  # Store list of document references
     summary = models.TextField(default="")
+    # Answers saved while they stream stay 'streaming' until finalized
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_COMPLETE)
+    # Sequence number of the last chunk appended, so a retried chunk isn't applied twice
+    last_chunk_seq = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Serves a user's history newest-first (and oldest-first, scanned backwards)
+            models.Index(fields=['user', '-created_at'], name='query_user_created_idx'),
+            # Newest-first listing in the admin
+            models.Index(fields=['-created_at'], name='query_created_idx'),
+        ]
+        # accounts_query also has query_text_search_idx, a Postgres-only GIN full-text index
+        # on `query` created by migration 0026 for admin search
+
     def __str__(self):
         return f"{self.user.email} - {self.query[:50]}..."
 
+class QueryArchive(models.Model):
+    """
+    Cold storage for queries older than QUERY_ARCHIVE_AFTER_DAYS, moved here by the
+    archive_queries command. The question stays readable for history listings; everything
+    else is kept as zlib-compressed JSON. Read through accounts.query_store, which makes
+    archived and live queries look the same.
+    """
+    query_id = models.UUIDField(primary_key=True, editable=False)
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='archived_queries')
+    query = models.TextField()
+    payload = models.BinaryField()
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='query_archive_user_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.query[:50]}... (archived)"
+
+    @classmethod
+    def from_query(cls, query):
+        payload = {
+            'corrected_query': query.corrected_query,
+            'documents': query.documents,
+            'summary': query.summary,
+        }
+        return cls(
+            query_id=query.query_id,
+            user_id=query.user_id,
+            query=query.query,
+            payload=zlib.compress(json.dumps(payload).encode('utf-8')),
+            created_at=query.created_at,
+            updated_at=query.updated_at,
+        )
+
+    def to_query(self):
+        """Rebuild the original Query as an unsaved instance."""
+        payload = json.loads(zlib.decompress(bytes(self.payload)).decode('utf-8'))
+        return Query(
+            query_id=self.query_id,
+            user_id=self.user_id,
+            query=self.query,
+            corrected_query=payload.get('corrected_query'),
+            documents=payload.get('documents', []),
+            summary=payload.get('summary', ""),
+            created_at=self.created_at,
+            updated_at=self.updated_at,
+        )
+
+
 class SubscriptionPlan(models.Model):
     plan_id = models.CharField(max_length=50, primary_key=True)
     name = models.CharField(max_length=255)
@@ -138,12 +219,20 @@ class Subscription(models.Model):
     stripe_customer_id = models.CharField(max_length=100, blank=True, null=True)
     stripe_subscription_id = models.CharField(max_length=100, blank=True, null=True)
     plan_id = models.CharField(max_length=50)  # 'free', 'pro', 'premium' or the actual plan ID
-    status = models.CharField(max_length=50, default='inactive')  # 'active', 'canceled', 'past_due'
+    status = models.CharField(max_length=50, default='inactive')  # 'active', 'canceled', 'past_due', 'expired'
     current_period_start = models.DateTimeField(null=True, blank=True)
     current_period_end = models.DateTimeField(null=True, blank=True)
+    # `created` of the newest Stripe event applied; older events arriving late are ignored
+    stripe_event_created = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # expire_subscriptions scans active subscriptions by period end
+            models.Index(fields=['status', 'current_period_end'], name='subscription_status_end_idx'),
+        ]
+
     def __str__(self):
         return f"{self.user.email} - {self.plan_id} - {self.status}"
     
@@ -151,6 +240,16 @@ class Subscription(models.Model):
     def is_active(self):
         return self.status == 'active'
 
+    @classmethod
+    def for_user(cls, user):
+        """
+        Return the subscription that governs `user`'s features, or None if there isn't one.
+        Employees are covered by their company's subscription.
+        """
+        # A company's primary key is its owner's user id
+        company_id = Employee.objects.filter(user=user).values_list('company_id', flat=True).first()
+        return cls.objects.filter(user_id=company_id or user.pk).first()
+
     def can_perform_search(self):
         """Check if user can perform a search based on their subscription plan"""
         # Paid plans can always search
@@ -180,7 +279,7 @@ class Subscription(models.Model):
 
 class Transaction(models.Model):
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='transactions')
-    stripe_invoice_id = models.CharField(max_length=100)
+    stripe_invoice_id = models.CharField(max_length=100, unique=True)
     stripe_payment_intent_id = models.CharField(max_length=100, blank=True, null=True)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     status = models.CharField(max_length=50)  # 'succeeded', 'pending', 'failed'
@@ -189,6 +288,12 @@ class Transaction(models.Model):
     date = models.DateTimeField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Billing history pages walk this index newest first
+            models.Index(fields=['user', '-date', '-id'], name='transaction_user_date_idx'),
+        ]
+
     def __str__(self):
         return f"{self.user.email} - ${self.amount} - {self.status}"
 
@@ -201,6 +306,10 @@ class UserSearchCount(models.Model):
 
     class Meta:
         unique_together = ('user', 'date')
+        indexes = [
+            # Lets the rollup job walk old days without scanning every user's rows
+            models.Index(fields=['date'], name='search_count_date_idx'),
+        ]
 
     @classmethod
     def increment_search_count(cls, user):
@@ -228,3 +337,237 @@ class UserSearchCount(models.Model):
         except cls.DoesNotExist:
             return 0
 
+
+
+class MonthlySearchUsage(models.Model):
+    """
+    Per-user monthly search totals. The rollup_search_counts command folds UserSearchCount
+    rows older than SEARCH_COUNT_RETENTION_DAYS into this table and deletes them.
+    """
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='monthly_search_usage')
+    month = models.DateField()  # First day of the month
+    searches = models.PositiveIntegerField(default=0)
+    active_days = models.PositiveSmallIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('user', 'month')
+
+    def __str__(self):
+        return f"{self.user_id} - {self.month:%Y-%m} - {self.searches}"
+
+    @classmethod
+    def usage_for(cls, user, since):
+        """
+        Monthly usage for `user` from the month containing `since` onwards, newest first.
+        Combines the rollups with daily rows that haven't been rolled up yet.
+        """
+        since = since.replace(day=1)
+        months = {}
+        for row in cls.objects.filter(user=user, month__gte=since).values('month', 'searches', 'active_days'):
+            months[row['month']] = {'searches': row['searches'], 'active_days': row['active_days']}
+
+        recent = (
+            UserSearchCount.objects.filter(user=user, date__gte=since)
+            .annotate(month=TruncMonth('date'))
+            .values('month')
+            .annotate(searches=Sum('count'), active_days=Count('id'))
+        )
+        for row in recent:
+            totals = months.setdefault(row['month'], {'searches': 0, 'active_days': 0})
+            totals['searches'] += row['searches']
+            totals['active_days'] += row['active_days']
+
+        return [{'month': month, **totals} for month, totals in sorted(months.items(), reverse=True)]
+
+
+class BackgroundJob(models.Model):
+    """
+    Common state for work handed to a management-command worker.
+    Workers claim jobs with accounts.jobs.claim_jobs and record the outcome with finish_job.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING, db_index=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True, default="")
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        abstract = True
+
+
+class QueryRender(BackgroundJob):
+    """
+    A PDF or DOCX rendering of a query's summary and cited documents.
+
+    `cache_key` addresses the content: it's derived from the query id, the query's
+    updated_at and the format, so an unchanged query is only ever rendered once.
+    """
+    FORMAT_PDF = 'pdf'
+    FORMAT_DOCX = 'docx'
+    FORMAT_CHOICES = [
+        (FORMAT_PDF, 'PDF'),
+        (FORMAT_DOCX, 'Word document'),
+    ]
+
+    # Once partition_query_table has partitioned accounts_query by created_at, query_id alone
+    # can't carry a unique constraint, so the relation is enforced by Django rather than the database
+    query = models.ForeignKey(Query, on_delete=models.CASCADE, related_name='renders', db_constraint=False)
+    format = models.CharField(max_length=10, choices=FORMAT_CHOICES)
+    cache_key = models.CharField(max_length=64, unique=True)
+    file = models.FileField(upload_to='renders/', null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.query_id} - {self.format} - {self.status}"
+
+
+class BroadcastCampaign(models.Model):
+    """
+    An announcement emailed to every user in an audience by the send_broadcasts command.
+
+    `body` is an HTML fragment placed inside email/broadcast.html. It may use the
+    placeholders in accounts.broadcasts.PLACEHOLDERS, which are filled in per recipient.
+    """
+    STATUS_DRAFT = 'draft'
+    STATUS_QUEUED = 'queued'
+    STATUS_SENDING = 'sending'
+    STATUS_SENT = 'sent'
+    STATUS_CHOICES = [
+        (STATUS_DRAFT, 'Draft'),
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_SENDING, 'Sending'),
+        (STATUS_SENT, 'Sent'),
+    ]
+
+    AUDIENCE_ALL = 'all'
+    AUDIENCE_INDIVIDUALS = 'individuals'
+    AUDIENCE_STUDENTS = 'students'
+    AUDIENCE_COMPANIES = 'companies'
+    AUDIENCE_CHOICES = [
+        (AUDIENCE_ALL, 'All active users'),
+        (AUDIENCE_INDIVIDUALS, 'Individual users'),
+        (AUDIENCE_STUDENTS, 'Students'),
+        (AUDIENCE_COMPANIES, 'Companies'),
+    ]
+
+    name = models.CharField(max_length=255)
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    audience = models.CharField(max_length=20, choices=AUDIENCE_CHOICES, default=AUDIENCE_ALL)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_DRAFT, db_index=True)
+    recipient_count = models.PositiveIntegerField(default=0)
+    sent_count = models.PositiveIntegerField(default=0)
+    failed_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.name} - {self.status}"
+
+
+class BroadcastRecipient(models.Model):
+    """
+    Delivery state of one campaign email; the name and address are captured when the campaign is queued.
+    A worker moves recipients to 'sending' before it sends to them, so an address is never emailed twice.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_SENDING = 'sending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_SENDING, 'Sending'),
+        (STATUS_SENT, 'Sent'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    campaign = models.ForeignKey(BroadcastCampaign, on_delete=models.CASCADE, related_name='recipients')
+    user = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, related_name='broadcasts')
+    email = models.EmailField()
+    name = models.CharField(max_length=255, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    error = models.TextField(blank=True, default="")
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['campaign', 'email'], name='unique_broadcast_recipient'),
+        ]
+        indexes = [
+            # send_broadcasts walks a campaign's pending recipients in id order
+            models.Index(fields=['campaign', 'status', 'id'], name='broadcast_recipient_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.email} - {self.status}"
+
+
+class StudentIdUpload(BackgroundJob):
+    """
+    A student ID document uploaded in chunks before registration completes.
+
+    Chunks are written to storage as they arrive. Once `received` reaches `size` the upload
+    is marked complete and process_student_ids assembles the file, makes a preview and copies
+    both onto the student. Documents posted the old way, in one multipart request, get an
+    upload with `file` already set so they only need the preview.
+    """
+    upload_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    email = models.EmailField(db_index=True)
+    filename = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100)
+    size = models.PositiveIntegerField()
+    received = models.PositiveIntegerField(default=0)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    file = models.FileField(upload_to='student_ids/', null=True, blank=True)
+    preview = models.FileField(upload_to='student_id_previews/', null=True, blank=True)
+    student = models.OneToOneField(
+        StudentUser, on_delete=models.CASCADE, null=True, blank=True, related_name='id_upload'
+    )
+
+    def __str__(self):
+        return f"{self.email} - {self.filename} - {self.status}"
+
+
+class AccountDeletion(BackgroundJob):
+    """
+    Removal of a disabled account and everything it owns, carried out in small batches by the
+    delete_accounts command. A company's deletion covers its employees' accounts as well.
+    `account_id` is a plain integer because the user row itself is the last thing deleted.
+    """
+    account_id = models.BigIntegerField(db_index=True)
+    email = models.EmailField()
+    stage = models.CharField(max_length=50, blank=True, default="")
+    deleted_rows = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.email} - {self.stage or self.status}"
+
+
+class DataExport(BackgroundJob):
+    """
+    A ZIP of everything stored about a user, one JSONL file per section, built by the
+    export_user_data command. The file is downloaded through a signed link until `expires_at`.
+    """
+    export_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='data_exports')
+    file = models.FileField(upload_to='data_exports/', null=True, blank=True)
+    size = models.PositiveBigIntegerField(default=0)
+    expires_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.user_id} - {self.status}"
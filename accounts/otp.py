@@ -0,0 +1,134 @@
+import hashlib
+import hmac
+
+from django.conf import settings
+from django.utils.crypto import get_random_string
+
+from .redis_client import redis_client, redis_available
+
+# Verifies a code against the stored hash and counts the attempt in one round trip.
+# Returns {1, user_type} on success (the code is consumed) or {0, reason}.
+VERIFY_OTP_SCRIPT = """
+local stored = redis.call('HGET', KEYS[1], 'hash')
+if not stored then
+    return {0, 'missing'}
+end
+local attempts = redis.call('HINCRBY', KEYS[1], 'attempts', 1)
+if attempts > tonumber(ARGV[2]) then
+    redis.call('DEL', KEYS[1])
+    return {0, 'locked'}
+end
+if stored ~= ARGV[1] then
+    return {0, 'invalid'}
+end
+local user_type = redis.call('HGET', KEYS[1], 'user_type') or ''
+redis.call('DEL', KEYS[1])
+return {1, user_type}
+"""
+
+VERIFY_ERRORS = {
+    'missing': "OTP expired or not found",
+    'invalid': "Invalid OTP",
+    'locked': "Too many incorrect attempts. Please request a new OTP",
+}
+
+_verify_script = None
+
+
+class OTPError(Exception):
+    """Raised when an OTP can't be issued or verified; carries the HTTP status to answer with."""
+    def __init__(self, message, status_code=400, retry_after=None):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+def _normalize(email):
+    return email.strip().lower()
+
+
+def _otp_key(email, purpose):
+    return f"otp:{purpose}:{_normalize(email)}"
+
+
+def _hash_code(email, purpose, code):
+    message = f"{purpose}:{_normalize(email)}:{code}".encode()
+    return hmac.new(settings.SECRET_KEY.encode(), message, hashlib.sha256).hexdigest()
+
+
+def _ensure_available():
+    if not redis_available():
+        raise OTPError("Verification service is temporarily unavailable. Please try again later", 503)
+
+
+def otp_expiry_minutes():
+    return max(1, settings.OTP_TTL_SECONDS // 60)
+
+
+def issue_otp(email, purpose, user_type=None):
+    """
+    Generate a 6-digit OTP for `email` and store only its hash in Redis.
+
+    Issuing a new code replaces any outstanding one for the same purpose and resets the
+    attempt counter. Raises OTPError while the resend cooldown for this email is running.
+    """
+    _ensure_available()
+
+    cooldown_key = f"otp_cooldown:{purpose}:{_normalize(email)}"
+    if not redis_client.set(cooldown_key, 1, nx=True, ex=settings.OTP_RESEND_COOLDOWN_SECONDS):
+        retry_after = max(1, redis_client.ttl(cooldown_key))
+        raise OTPError(
+            f"Please wait {retry_after} seconds before requesting a new OTP",
+            status_code=429,
+            retry_after=retry_after,
+        )
+
+    otp = get_random_string(length=6, allowed_chars="0123456789")
+    key = _otp_key(email, purpose)
+    pipe = redis_client.pipeline()
+    pipe.delete(key)
+    pipe.hset(key, mapping={
+        'hash': _hash_code(email, purpose, otp),
+        'attempts': 0,
+        'user_type': user_type or '',
+    })
+    pipe.expire(key, settings.OTP_TTL_SECONDS)
+    pipe.execute()
+    return otp
+
+
+def verify_otp(email, purpose, otp):
+    """
+    Check `otp` for `email`, consuming it on success.
+
+    Returns the user type stored when the code was issued (may be empty).
+    Raises OTPError when the code is missing, wrong or has run out of attempts.
+    """
+    global _verify_script
+    _ensure_available()
+
+    if _verify_script is None:
+        _verify_script = redis_client.register_script(VERIFY_OTP_SCRIPT)
+
+    ok, detail = _verify_script(
+        keys=[_otp_key(email, purpose)],
+        args=[_hash_code(email, purpose, otp), settings.OTP_MAX_ATTEMPTS],
+    )
+    if int(ok) != 1:
+        raise OTPError(VERIFY_ERRORS.get(detail, "Invalid OTP"))
+    return detail
+
+
+def mark_email_verified(email, user_type):
+    """Remember that `email` passed signup verification (valid for 30 minutes)."""
+    redis_client.setex(f"verified:{_normalize(email)}", 1800, user_type or "individual")
+
+
+def get_verified_user_type(email):
+    """Return the user type `email` was verified for, or None if it isn't verified."""
+    return redis_client.get(f"verified:{_normalize(email)}")
+
+
+def clear_email_verified(email):
+    redis_client.delete(f"verified:{_normalize(email)}")
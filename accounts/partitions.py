@@ -0,0 +1,88 @@
+import logging
+import re
+from datetime import date
+
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+QUERY_TABLE = 'accounts_query'
+
+_PARTITION_NAME = re.compile(rf"^{QUERY_TABLE}_p(\d{{4}})(\d{{2}})$")
+
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f"{QUERY_TABLE}_p{month:%Y%m}"
+
+
+def is_partitioned():
+    """True when accounts_query is a range-partitioned Postgres table."""
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE relname = %s", [QUERY_TABLE])
+        row = cursor.fetchone()
+    return bool(row) and row[0] == 'p'
+
+
+def ensure_month_partition(month):
+    """Create the partition holding `month` if it doesn't exist yet. Returns True if created."""
+    name = partition_name(month)
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT to_regclass(%s)", [name])
+        if cursor.fetchone()[0]:
+            return False
+        cursor.execute(
+            f'CREATE TABLE "{name}" PARTITION OF "{QUERY_TABLE}" '
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+        )
+    return True
+
+
+def month_partitions():
+    """List (month, partition name) for every monthly partition, oldest first."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE parent.relname = %s",
+            [QUERY_TABLE]
+        )
+        names = [row[0] for row in cursor.fetchall()]
+
+    partitions = []
+    for name in names:
+        match = _PARTITION_NAME.match(name)
+        if match:
+            partitions.append((date(int(match.group(1)), int(match.group(2)), 1), name))
+    return sorted(partitions)
+
+
+def drop_empty_partitions_before(cutoff):
+    """
+    Detach and drop monthly partitions that end on or before `cutoff` and hold no rows,
+    i.e. months the archive job has fully emptied. Returns the names dropped.
+    """
+    dropped = []
+    for month, name in month_partitions():
+        if add_months(month, 1) > cutoff.date():
+            break
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT EXISTS (SELECT 1 FROM "{name}")')
+            if cursor.fetchone()[0]:
+                continue
+            cursor.execute(f'ALTER TABLE "{QUERY_TABLE}" DETACH PARTITION "{name}"')
+            cursor.execute(f'DROP TABLE "{name}"')
+        logger.info(f"Dropped empty query partition {name}")
+        dropped.append(name)
+    return dropped
@@ -0,0 +1,151 @@
+"""
+Reads over both storage tiers of saved queries: the live (partitioned) Query table and
+QueryArchive. Archived rows come back as unsaved Query instances, so callers and
+serializers don't need to know which tier a query lives in.
+"""
+import heapq
+import logging
+
+import orjson
+from django.conf import settings
+from django.db.models import CharField, Value
+from redis.exceptions import RedisError, WatchError
+
+from .models import Query, QueryArchive
+from .redis_client import redis_client, redis_available
+from .renderers import ORJSONRenderer
+from .serializers import QuerySerializer
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_CHUNK_SIZE = 200
+
+# How long an invalidated query detail stays uncacheable; comfortably longer than replica lag
+INVALIDATION_TOMBSTONE_SECONDS = 60
+
+
+def find_query(query_id):
+    """Return the query with `query_id` from either tier, or None."""
+    query = Query.objects.filter(query_id=query_id).first()
+    if query is not None:
+        return query
+    archived = QueryArchive.objects.filter(query_id=query_id).first()
+    return archived.to_query() if archived else None
+
+
+def _detail_key(query_id):
+    return f"query_detail:{query_id}"
+
+
+def get_query_detail(query_id):
+    """
+    (owner id, QuerySerializer data) for a query from either tier, or None if it doesn't exist.
+
+    Read through a Redis hash that keeps the owner id next to the serialized query, so a hit
+    answers both the ownership check and the response without touching the database. Finished
+    queries don't change, so entries only go away through invalidate_query_details or their TTL.
+    A miss WATCHes the key while it reads the database, so an invalidation landing meanwhile
+    stops the row it read from being cached.
+    """
+    if not redis_available():
+        return _load_query_detail(query_id)
+
+    key = _detail_key(query_id)
+    try:
+        with redis_client.pipeline() as pipe:
+            pipe.watch(key)
+            owner_id, data, invalidated = pipe.hmget(key, 'owner_id', 'data', 'invalidated')
+            if owner_id is not None and data is not None:
+                return int(owner_id), orjson.loads(data)
+
+            query, detail = _load_query_detail(query_id, with_query=True)
+            # Answers still streaming change with every chunk, so only finished ones are cached,
+            # and nothing is cached while a recent invalidation's tombstone is there
+            if query is not None and query.status == Query.STATUS_COMPLETE and not invalidated:
+                try:
+                    pipe.multi()
+                    pipe.hset(key, mapping={'owner_id': query.user_id, 'data': ORJSONRenderer().render(detail[1]).decode()})
+                    pipe.expire(key, settings.QUERY_DETAIL_CACHE_SECONDS)
+                    pipe.execute()
+                except WatchError:
+                    pass  # Invalidated while we read it; the next request reads it again
+            return detail
+    except RedisError as e:
+        logger.error(f"Could not use cached query {query_id}: {str(e)}")
+        return _load_query_detail(query_id)
+
+
+def _load_query_detail(query_id, with_query=False):
+    query = find_query(query_id)
+    detail = (query.user_id, QuerySerializer(query).data) if query is not None else None
+    return (query, detail) if with_query else detail
+
+
+def invalidate_query_details(query_ids):
+    """
+    Drop cached details of queries that were changed or deleted. Each entry is replaced by a
+    short-lived tombstone rather than just deleted: writing it aborts any fill that read the
+    old row before this ran, and while it lasts no fill is stored, which also covers reads of
+    a replica that hasn't caught up or of a transaction that hasn't committed yet.
+    """
+    keys = [_detail_key(query_id) for query_id in query_ids]
+    if not keys or not redis_available():
+        return
+    try:
+        pipe = redis_client.pipeline()
+        for key in keys:
+            pipe.delete(key)
+            pipe.hset(key, 'invalidated', 1)
+            pipe.expire(key, INVALIDATION_TOMBSTONE_SECONDS)
+        pipe.execute()
+    except Exception as e:
+        logger.error(f"Could not invalidate {len(keys)} cached queries: {str(e)}")
+
+
+def get_user_queries(user, query_ids):
+    """Map query_id -> Query for those of `query_ids` owned by `user`, live or archived."""
+    found = {query.query_id: query for query in Query.objects.filter(query_id__in=query_ids, user=user)}
+    missing = set(query_ids) - found.keys()
+    if missing:
+        for archived in QueryArchive.objects.filter(query_id__in=missing, user=user):
+            found[archived.query_id] = archived.to_query()
+    return found
+
+
+def existing_query_ids(query_ids):
+    """The subset of `query_ids` that exist in either tier, whoever owns them."""
+    existing = set(Query.objects.filter(query_id__in=query_ids).values_list('query_id', flat=True))
+    missing = set(query_ids) - existing
+    if missing:
+        existing |= set(QueryArchive.objects.filter(query_id__in=missing).values_list('query_id', flat=True))
+    return existing
+
+
+def user_history(user):
+    """
+    Yield {query_id, query, created_at, status} for all of a user's queries, newest first.
+    Archived questions are stored uncompressed, so this never decompresses a payload.
+    """
+    fields = ('query_id', 'query', 'created_at')
+    live = Query.objects.filter(user=user).order_by('-created_at').values(*fields, 'status')
+    # archive_queries only moves finished answers, and abandoned streams are deleted
+    archived = (
+        QueryArchive.objects.filter(user=user).order_by('-created_at')
+        .annotate(status=Value(Query.STATUS_COMPLETE, output_field=CharField()))
+        .values(*fields, 'status')
+    )
+    return heapq.merge(live, archived, key=lambda row: row['created_at'], reverse=True)
+
+
+def iter_user_queries(user, fields, chunk_size):
+    """
+    Yield dicts of `fields` for every query a user owns, oldest first, streaming both tiers
+    in chunks. Archived queries are always older than live ones, so they come first.
+    """
+    archived = QueryArchive.objects.filter(user=user).order_by('created_at', 'query_id')
+    for row in archived.iterator(chunk_size=min(chunk_size, ARCHIVE_CHUNK_SIZE)):
+        query = row.to_query()
+        yield {field: getattr(query, field) for field in fields}
+
+    live = Query.objects.filter(user=user).order_by('created_at', 'query_id').values(*fields)
+    yield from live.iterator(chunk_size=chunk_size)
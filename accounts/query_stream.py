@@ -0,0 +1,67 @@
+"""
+Saving an answer while it streams. The Query is created at the first token in the
+'streaming' state, summary text and document citations are appended chunk by chunk, and
+finalizing marks it complete. Appends are single UPDATE statements that concatenate in the
+database, so a chunk costs the size of the chunk rather than of the whole answer so far.
+"""
+import json
+
+from django.db import connections
+from django.db.models import F, Func, JSONField, Value
+from django.db.models.functions import Concat
+from django.utils import timezone
+
+from .models import Query
+
+
+def _append_to_json_array(field, items, vendor):
+    """Expression appending `items` to the JSON array in `field`."""
+    if vendor == 'postgresql':
+        return Func(
+            F(field), Value(items, output_field=JSONField()),
+            template='(%(expressions)s)', arg_joiner=' || ', output_field=JSONField()
+        )
+    # SQLite keeps JSON as text; json_insert with '$[#]' appends one element
+    expression = F(field)
+    for item in items:
+        expression = Func(
+            expression, Value('$[#]'), Func(Value(json.dumps(item)), function='json'),
+            function='json_insert', output_field=JSONField()
+        )
+    return expression
+
+
+def append_chunk(query_id, user_id, seq, summary='', documents=()):
+    """
+    Append chunk `seq` to a streaming query. The UPDATE only matches while the query is
+    streaming and `seq` directly follows the last chunk applied, so retried or concurrent
+    requests can never apply a chunk twice or out of order. Returns True if it was applied.
+    """
+    changes = {'last_chunk_seq': seq, 'updated_at': timezone.now()}
+    if summary:
+        changes['summary'] = Concat(F('summary'), Value(summary))
+    if documents:
+        vendor = connections[Query.objects.db].vendor
+        changes['documents'] = _append_to_json_array('documents', list(documents), vendor)
+
+    return Query.objects.filter(
+        query_id=query_id, user_id=user_id, status=Query.STATUS_STREAMING, last_chunk_seq=seq - 1,
+    ).update(**changes) == 1
+
+
+def finalize(query_id, user_id, last_chunk_seq=None, **fields):
+    """
+    Mark a streaming query complete, optionally setting `fields` such as corrected_query.
+    With `last_chunk_seq`, only finalizes if that was the last chunk applied. Returns True
+    for the one call that completed it, so quota is charged exactly once.
+    """
+    queryset = Query.objects.filter(query_id=query_id, user_id=user_id, status=Query.STATUS_STREAMING)
+    if last_chunk_seq is not None:
+        queryset = queryset.filter(last_chunk_seq=last_chunk_seq)
+    return queryset.update(status=Query.STATUS_COMPLETE, updated_at=timezone.now(), **fields) == 1
+
+
+def open_streams_today(user):
+    """Answers the user started today and hasn't finalized; they hold a free-plan search slot."""
+    start_of_day = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    return Query.objects.filter(user=user, status=Query.STATUS_STREAMING, created_at__gte=start_of_day).count()
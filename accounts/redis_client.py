@@ -0,0 +1,69 @@
+import os
+
+import redis
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+class DummyRedis:
+    """
+    Stand-in used when Redis is unreachable so callers don't fail when methods are called.
+    Reads behave like an empty cache and writes are discarded.
+    """
+    def setex(self, *args, **kwargs):
+        print("DummyRedis: setex called")
+        return True
+
+    def get(self, *args, **kwargs):
+        print("DummyRedis: get called")
+        return None
+
+    def delete(self, *args, **kwargs):
+        print("DummyRedis: delete called")
+        return True
+
+    def ping(self, *args, **kwargs):
+        print("DummyRedis: ping called")
+        return True
+
+
+# Initialize Redis with better error handling
+try:
+    # Use environment variables for Redis connection
+    redis_host = os.getenv("REDIS_HOST", "localhost")
+    redis_port = int(os.getenv("REDIS_PORT", 6379))
+    redis_username = os.getenv("REDIS_USERNAME", "")
+    redis_password = os.getenv("REDIS_PASSWORD", "")
+
+    # Create connection with credentials if provided
+    if redis_username and redis_password:
+        redis_client = redis.StrictRedis(
+            host=redis_host,
+            port=redis_port,
+            username=redis_username,
+            password=redis_password,
+            db=0,
+            decode_responses=True,
+            ssl=True  # Digital Ocean Redis requires SSL
+        )
+    else:
+        redis_client = redis.StrictRedis(
+            host=redis_host,
+            port=redis_port,
+            db=0,
+            decode_responses=True
+        )
+
+    # Test the connection
+    redis_client.ping()
+    print(f"Redis connected successfully to {redis_host}:{redis_port}")
+except Exception as e:
+    print(f"Redis connection error: {str(e)}")
+    redis_client = DummyRedis()
+    print("Using DummyRedis as fallback")
+
+
+def redis_available():
+    """Return True when a real Redis server backs redis_client."""
+    return not isinstance(redis_client, DummyRedis)
@@ -0,0 +1,131 @@
+import hashlib
+import io
+import re
+from xml.sax.saxutils import escape
+
+# Bump when the document layout changes so existing renders are regenerated
+RENDER_VERSION = 1
+
+RENDER_CONTENT_TYPES = {
+    'pdf': 'application/pdf',
+    'docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+}
+
+_BOLD = re.compile(r"\*\*(.+?)\*\*")
+_ATTRIBUTE_ENTITIES = {'"': '&quot;'}
+
+
+def render_cache_key(query, render_format):
+    """Content address of a render: changes whenever the query is edited."""
+    source = f"{query.query_id}:{query.updated_at.isoformat()}:{render_format}:{RENDER_VERSION}"
+    return hashlib.sha256(source.encode()).hexdigest()
+
+
+def _blocks(summary):
+    """Split a Markdown-ish summary into ('heading' | 'bullet' | 'paragraph', text) blocks."""
+    for block in re.split(r"\n\s*\n", summary or ""):
+        block = block.strip()
+        if not block:
+            continue
+        if block.startswith('#'):
+            yield 'heading', block.lstrip('#').strip()
+        elif all(line.lstrip().startswith(('- ', '* ')) for line in block.splitlines()):
+            for line in block.splitlines():
+                yield 'bullet', line.lstrip()[2:].strip()
+        else:
+            yield 'paragraph', " ".join(line.strip() for line in block.splitlines())
+
+
+def _document_label(document):
+    if not isinstance(document, dict):
+        return str(document), None
+    label = document.get('pdf_name') or document.get('pdf_url') or "Document"
+    if document.get('page_number') is not None:
+        label = f"{label}, page {document['page_number']}"
+    return label, document.get('pdf_url')
+
+
+def render_pdf(query):
+    # Imported here so web workers never load the rendering libraries
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib.units import cm
+    from reportlab.platypus import ListFlowable, Paragraph, SimpleDocTemplate, Spacer
+
+    def markup(text):
+        return _BOLD.sub(r"<b>\1</b>", escape(text))
+
+    styles = getSampleStyleSheet()
+    story = [Paragraph(escape(query.query), styles['Title'])]
+    if query.corrected_query and query.corrected_query != query.query:
+        story.append(Paragraph(f"<i>Corrected query: {escape(query.corrected_query)}</i>", styles['Normal']))
+    story.append(Paragraph(f"Created {query.created_at:%d %B %Y}", styles['Normal']))
+    story.append(Spacer(1, 0.5 * cm))
+
+    bullets = []
+    for kind, text in list(_blocks(query.summary)) + [(None, None)]:
+        if kind != 'bullet' and bullets:
+            story.append(ListFlowable(bullets, bulletType='bullet'))
+            bullets = []
+        if kind == 'heading':
+            story.append(Paragraph(markup(text), styles['Heading2']))
+        elif kind == 'bullet':
+            bullets.append(Paragraph(markup(text), styles['BodyText']))
+        elif kind == 'paragraph':
+            story.append(Paragraph(markup(text), styles['BodyText']))
+
+    if query.documents:
+        story.append(Paragraph("Sources", styles['Heading2']))
+        sources = []
+        for document in query.documents:
+            label, url = _document_label(document)
+            # The URL sits inside a quoted attribute, so quotes need escaping too
+            text = f'<link href="{escape(url, _ATTRIBUTE_ENTITIES)}">{escape(label)}</link>' if url else escape(label)
+            sources.append(Paragraph(text, styles['BodyText']))
+        story.append(ListFlowable(sources, bulletType='1'))
+
+    output = io.BytesIO()
+    SimpleDocTemplate(output, pagesize=A4, title=query.query[:100]).build(story)
+    return output.getvalue()
+
+
+def render_docx(query):
+    from docx import Document
+
+    document = Document()
+    document.core_properties.title = query.query[:100]
+    document.add_heading(query.query, level=1)
+    if query.corrected_query and query.corrected_query != query.query:
+        document.add_paragraph().add_run(f"Corrected query: {query.corrected_query}").italic = True
+    document.add_paragraph(f"Created {query.created_at:%d %B %Y}")
+
+    for kind, text in _blocks(query.summary):
+        if kind == 'heading':
+            document.add_heading(text, level=2)
+            continue
+        paragraph = document.add_paragraph(style='List Bullet' if kind == 'bullet' else None)
+        # Alternate plain and **bold** runs
+        for i, part in enumerate(_BOLD.split(text)):
+            if part:
+                paragraph.add_run(part).bold = i % 2 == 1
+
+    if query.documents:
+        document.add_heading("Sources", level=2)
+        for source in query.documents:
+            label, url = _document_label(source)
+            document.add_paragraph(f"{label} - {url}" if url else label, style='List Number')
+
+    output = io.BytesIO()
+    document.save(output)
+    return output.getvalue()
+
+
+RENDERERS = {
+    'pdf': render_pdf,
+    'docx': render_docx,
+}
+
+
+def render_query(query, render_format):
+    """Render `query` to bytes in the given format ('pdf' or 'docx')."""
+    return RENDERERS[render_format](query)
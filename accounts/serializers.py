@@ -38,10 +38,25 @@ class StudentSignupDataSerializer(serializers.Serializer):
     last_name = serializers.CharField()
     phone_number = serializers.CharField()
     date_of_birth = serializers.DateField()
-    student_id = serializers.FileField()
+    # Either the document itself or the upload_id of a finished chunked upload
+    student_id = serializers.FileField(required=False)
+    student_id_upload = serializers.UUIDField(required=False)
     student_organisation_name = serializers.CharField()
     terms_and_conditions = serializers.BooleanField()
 
+    def validate(self, attrs):
+        if not attrs.get('student_id') and not attrs.get('student_id_upload'):
+            raise serializers.ValidationError({"student_id": ["Upload a student ID document."]})
+        return attrs
+
+
+class StudentIdUploadSerializer(serializers.Serializer):
+    """Serializer for starting a chunked student ID upload"""
+    email = serializers.EmailField()
+    filename = serializers.CharField(max_length=255)
+    content_type = serializers.CharField(max_length=100)
+    size = serializers.IntegerField(min_value=1)
+
 
 class CompanySignupDataSerializer(serializers.Serializer):
     """Serializer for company registration data"""
@@ -64,8 +79,9 @@ class AddEmployeeSerializer(serializers.Serializer):
 class QuerySerializer(serializers.ModelSerializer):
     class Meta:
         model = Query
-        fields = ['query_id', 'query', 'corrected_query', 'documents', 'summary', 'created_at', 'updated_at']
-        read_only_fields = ['query_id', 'created_at', 'updated_at']
+        fields = ['query_id', 'query', 'corrected_query', 'documents', 'summary', 'status', 'last_chunk_seq',
+                  'created_at', 'updated_at']
+        read_only_fields = ['query_id', 'status', 'last_chunk_seq', 'created_at', 'updated_at']
 
 
 class LoginSerializer(serializers.Serializer):
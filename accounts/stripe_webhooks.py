@@ -1,19 +1,25 @@
 import stripe
 import json
 from django.conf import settings
+from django.db import transaction
 from django.http import HttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 from django.utils import timezone
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone as dt_timezone
 import os
 
-from .models import CustomUser, Subscription, Transaction, SubscriptionPlan
+from .models import CustomUser, Subscription, SubscriptionPlan
+from .bootstrap import subscription_changed
 from .email_utils import (
     send_subscription_invoice_email,
     send_subscription_renewed_email,
     send_subscription_cancelled_email
 )
+from .ledger import plans_by_price, record_invoice, resolve_plan_id, sync_customer_invoices
+from .subscription_events import (
+    claim_due_subscription_updates, finish_subscription_update, queue_subscription_update, retry_subscription_update,
+)
 
 stripe.api_key = settings.STRIPE_SECRET_KEY
 TESTING_MODE = os.getenv('TESTING_MODE', 'false').lower() == 'true'
@@ -80,6 +86,12 @@ def stripe_webhook(request):
         print(f"Error details: {type(e).__name__}: {str(e)}")
         import traceback
         traceback.print_exc()
+
+    # Apply any coalesced subscription updates whose window has closed
+    try:
+        flush_subscription_updates()
+    except Exception as e:
+        print(f"Error flushing subscription updates: {e}")
     
     return HttpResponse(status=200)
 
@@ -115,14 +127,15 @@ def handle_checkout_session_completed(event):
         # Update the subscription with Stripe customer ID
         subscription.stripe_customer_id = session.get('customer')
         subscription.save()
+        subscription_changed(subscription.user_id)
         
         # If a subscription ID is available in the session, update it
         if 'subscription' in session:
             # Get subscription details from Stripe
             stripe_sub = stripe.Subscription.retrieve(session['subscription'])
             
-            # Update our subscription record
-            update_subscription_from_stripe(subscription, stripe_sub)
+            # Update our subscription record, unless a newer event already has
+            apply_subscription_update(stripe_sub, event['created'], pk=subscription.pk)
         
     except CustomUser.DoesNotExist:
         # User not found
@@ -152,11 +165,16 @@ def handle_invoice_payment_succeeded(event):
         # Get subscription details from Stripe
         stripe_sub = stripe.Subscription.retrieve(subscription_id)
         
-        # Update our subscription record
-        update_subscription_from_stripe(subscription, stripe_sub)
+        # Update our subscription record through the same locked, ordered path as
+        # customer.subscription.updated; the payment is recorded even if this fails
+        try:
+            apply_subscription_update(stripe_sub, event['created'], pk=subscription.pk)
+            subscription.refresh_from_db()
+        except Exception as e:
+            print(f"Error updating subscription {subscription.id} from invoice: {e}")
         
         # Record the transaction
-        create_transaction_from_invoice(subscription.user, invoice)
+        record_invoice(subscription.user, invoice)
         
         # Determine if this is a renewal or new subscription
         is_renewal = False
@@ -200,7 +218,13 @@ def handle_subscription_deleted(event):
         
         # Update the subscription status
         subscription.status = 'canceled'
+        if 'created' in event:
+            # Updates sent before the cancellation but delivered after it must not reactivate it
+            event_created = datetime.fromtimestamp(event['created'], tz=dt_timezone.utc)
+            if not subscription.stripe_event_created or event_created > subscription.stripe_event_created:
+                subscription.stripe_event_created = event_created
         subscription.save()
+        subscription_changed(subscription.user_id)
         
         # Get plan name
         plan_name = subscription.plan_id.replace('_', ' ').title()  # Default fallback
@@ -224,182 +248,128 @@ def handle_subscription_deleted(event):
 def handle_subscription_updated(event):
     """
     Handle the customer.subscription.updated event
-    This is triggered when a subscription is updated (e.g., plan change, renewal)
+    This is triggered when a subscription is updated (e.g., plan change, renewal).
+    Stripe often sends several in a row, so events are queued and only the newest is applied.
     """
-    stripe_sub = event['data']['object']
-    
     try:
-        # Find the subscription in our database
-        subscription = Subscription.objects.get(stripe_subscription_id=stripe_sub['id'])
-        
-        # Update our subscription record
-        update_subscription_from_stripe(subscription, stripe_sub)
+        if queue_subscription_update(event):
+            print(f"Queued update for subscription {event['data']['object']['id']}")
+            return
+
+        # Redis is unavailable: apply now, still ignoring events older than the last one applied
+        apply_subscription_update(event['data']['object'], event['created'])
         
-    except Subscription.DoesNotExist:
-        # Subscription not found in our database
-        return
     except Exception as e:
         # Log the error
         print(f"Error handling subscription updated: {e}")
         return
 
-def update_subscription_from_stripe(subscription, stripe_sub):
+def apply_subscription_update(stripe_sub, created, **lookup):
     """
-    Update our subscription model with data from the Stripe subscription
+    Apply a Stripe subscription state taken from an event created at `created` (Unix time).
+    The subscription is found by `lookup`, by default its Stripe subscription ID.
+    Returns False without writing when the subscription is unknown or a newer event was already applied.
     """
-    try:
-        # Get the subscription period
-        if 'current_period_start' in stripe_sub:
-            subscription.current_period_start = datetime.fromtimestamp(stripe_sub['current_period_start'])
-        
-        if 'current_period_end' in stripe_sub:
-            subscription.current_period_end = datetime.fromtimestamp(stripe_sub['current_period_end'])
-        
-        # Get plan information
-        if 'items' in stripe_sub and 'data' in stripe_sub['items'] and stripe_sub['items']['data']:
-            item = stripe_sub['items']['data'][0]
-            price_id = item.get('price', {}).get('id')
-            
-            if price_id:
-                # Map Stripe price IDs to internal plan IDs
-                price_mapping = {
-                    'price_1RArESRrRHqE0EfDltTgBLo9': 'daily',           # Daily Plan
-                    'price_1RArETRrRHqE0EfD083TWniN': 'monthly',         # Monthly Plan
-                    'price_1RArEURrRHqE0EfDtKuOiKXy': 'annual',          # Annual Plan
-                    'price_1RArEURrRHqE0EfD1XiSE1DB': 'student_monthly', # Student Monthly Plan
-                    'price_1RArEVRrRHqE0EfDUHIz9UUo': 'student_annual'   # Student Annual Plan
-                }
-                
-                internal_plan_id = price_mapping.get(price_id)
-                if internal_plan_id:
-                    subscription.plan_id = internal_plan_id
-                    print(f"Mapped Stripe price ID {price_id} to internal plan ID {internal_plan_id}")
-                else:
-                    print(f"Unknown Stripe price ID: {price_id}")
-                    # Fallback to using the product ID if no mapping exists
-                    product_id = item.get('price', {}).get('product')
-                    subscription.plan_id = product_id
-        
-        # Update subscription status
-        subscription.status = stripe_sub['status']
-        subscription.stripe_subscription_id = stripe_sub['id']
-        subscription.save()
-        
-        print(f"Updated subscription {subscription.id} with status {subscription.status} and plan {subscription.plan_id}")
-        
-    except Exception as e:
-        print(f"Error in update_subscription_from_stripe: {str(e)}")
-        import traceback
-        traceback.print_exc()
+    event_created = datetime.fromtimestamp(created, tz=dt_timezone.utc)
 
-def create_transaction_from_invoice(user, invoice):
+    with transaction.atomic():
+        # Lock the row so concurrent flushers and webhooks apply events one at a time
+        subscription = Subscription.objects.select_for_update().filter(
+            **(lookup or {'stripe_subscription_id': stripe_sub['id']})
+        ).first()
+        if subscription is None:
+            return False
+        if subscription.stripe_event_created and subscription.stripe_event_created > event_created:
+            print(f"Ignoring stale event for subscription {subscription.id} created at {event_created.isoformat()}")
+            return False
+
+        subscription.stripe_event_created = event_created
+        update_subscription_from_stripe(subscription, stripe_sub)
+    return True
+
+def apply_queued_subscription_update(stripe_sub, created):
     """
-    Create a transaction record from an invoice
+    Apply an update claimed from the queue. Its events are only dropped once it has been
+    applied (or found stale); if applying fails they stay queued and are retried later,
+    up to subscription_events.MAX_ATTEMPTS times.
+    Returns what apply_subscription_update did, or None if it failed.
     """
     try:
-        # Get the payment intent
-        payment_intent_id = invoice.get('payment_intent')
-        
-        # Get the amount
-        amount = invoice.get('amount_paid', 0) / 100.0  # Convert from cents to pounds (GBP)
-        
-        # Get invoice URL or receipt URL if available
-        receipt_url = None
-        if payment_intent_id:
-            try:
-                payment_intent = stripe.PaymentIntent.retrieve(payment_intent_id)
-                charges = payment_intent.get('charges', {}).get('data', [])
-                if charges:
-                    receipt_url = charges[0].get('receipt_url')
-            except Exception as e:
-                print(f"Error getting receipt URL: {str(e)}")
-        
-        # Get better description with plan name if possible
-        description = invoice.get('description', 'subscription')
-        
-        # If there's a subscription ID, try to get more detailed info
-        subscription_id = invoice.get('subscription')
-        if subscription_id:
-            try:
-                subscription = stripe.Subscription.retrieve(subscription_id)
-                if 'items' in subscription and 'data' in subscription['items'] and subscription['items']['data']:
-                    plan = subscription['items']['data'][0].get('plan', {})
-                    product_id = plan.get('product')
-                    
-                    if product_id:
-                        try:
-                            product = stripe.Product.retrieve(product_id)
-                            plan_name = product.get('name', 'subscription')
-                            description = f"Payment for {plan_name}"
-                        except Exception:
-                            pass
-            except Exception as e:
-                print(f"Error getting subscription details for invoice: {str(e)}")
-        
-        # Check if transaction already exists
-        existing_transaction = Transaction.objects.filter(stripe_invoice_id=invoice['id']).first()
-        
-        if existing_transaction:
-            print(f"Transaction for invoice {invoice['id']} already exists, skipping")
-            return
-        
-        # Create transaction record
-        Transaction.objects.create(
-            user=user,
-            stripe_invoice_id=invoice['id'],
-            stripe_payment_intent_id=payment_intent_id,
-            amount=amount,
-            status='succeeded',
-            description=description,
-            receipt_url=receipt_url,
-            date=datetime.fromtimestamp(invoice['created'])
-        )
-        
-        print(f"Created transaction record for invoice {invoice['id']} ({description})")
+        applied = apply_subscription_update(stripe_sub, created)
     except Exception as e:
-        print(f"Error creating transaction from invoice: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        if retry_subscription_update(stripe_sub['id']):
+            print(f"Error applying queued update for subscription {stripe_sub['id']}, will retry: {e}")
+        else:
+            print(f"Error applying queued update for subscription {stripe_sub['id']}, giving up: {e}")
+        return None
+    finish_subscription_update(stripe_sub['id'], created)
+    return applied
+
+def flush_subscription_updates(limit=100):
+    """Apply the newest queued update of every subscription whose coalescing window has closed."""
+    applied = 0
+    for stripe_sub, created in claim_due_subscription_updates(limit):
+        if apply_queued_subscription_update(stripe_sub, created):
+            applied += 1
+    return applied
+
+def update_subscription_from_stripe(subscription, stripe_sub):
+    """
+    Update our subscription model with data from the Stripe subscription.
+    Errors propagate, so callers know when nothing was saved.
+    """
+    # Get the subscription period
+    if 'current_period_start' in stripe_sub:
+        subscription.current_period_start = datetime.fromtimestamp(stripe_sub['current_period_start'])
+
+    if 'current_period_end' in stripe_sub:
+        subscription.current_period_end = datetime.fromtimestamp(stripe_sub['current_period_end'])
+
+    # Get plan information
+    if 'items' in stripe_sub and 'data' in stripe_sub['items'] and stripe_sub['items']['data']:
+        item = stripe_sub['items']['data'][0]
+        price_id = item.get('price', {}).get('id')
+
+        if price_id:
+            # Map Stripe price IDs to internal plan IDs
+            internal_plan_id = resolve_plan_id(price_id)
+            if internal_plan_id:
+                subscription.plan_id = internal_plan_id
+                print(f"Mapped Stripe price ID {price_id} to internal plan ID {internal_plan_id}")
+            else:
+                print(f"Unknown Stripe price ID: {price_id}")
+                # Fallback to using the product ID if no mapping exists
+                product_id = item.get('price', {}).get('product')
+                subscription.plan_id = product_id
+
+    # Update subscription status
+    subscription.status = stripe_sub['status']
+    subscription.stripe_subscription_id = stripe_sub['id']
+    subscription.save()
+    subscription_changed(subscription.user_id)
+
+    print(f"Updated subscription {subscription.id} with status {subscription.status} and plan {subscription.plan_id}")
 
 def sync_missing_transactions():
     """
     Utility function to sync missing transactions from Stripe.
     This can be run manually to ensure all transactions are recorded in the database.
     """
-    from .models import CustomUser, Subscription, Transaction
-    
     print("Starting to sync missing transactions from Stripe...")
     
     # Get all users with stripe_customer_id
     subscriptions = Subscription.objects.filter(
         stripe_customer_id__isnull=False
-    ).exclude(stripe_customer_id='')
+    ).exclude(stripe_customer_id='').select_related('user')
     
+    plans = plans_by_price()
     transaction_count = 0
     
     for subscription in subscriptions:
         try:
-            # Get all invoices for this customer
-            invoices = stripe.Invoice.list(
-                customer=subscription.stripe_customer_id,
-                limit=100
-            )
-            
-            for invoice in invoices.data:
-                # Skip if not paid
-                if invoice.status != 'paid':
-                    continue
-                
-                # Check if transaction already exists
-                existing = Transaction.objects.filter(stripe_invoice_id=invoice.id).exists()
-                if existing:
-                    continue
-                
-                # Create transaction
-                create_transaction_from_invoice(subscription.user, invoice)
-                transaction_count += 1
-                
+            # Upsert every paid invoice for this customer; ones already recorded are refreshed in place
+            transaction_count += sync_customer_invoices(subscription.user, subscription.stripe_customer_id, plans)
         except Exception as e:
             print(f"Error syncing transactions for user {subscription.user.email}: {str(e)}")
     
-    print(f"Synced {transaction_count} missing transactions from Stripe.")
+    print(f"Synced {transaction_count} transactions from Stripe.")
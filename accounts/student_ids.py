@@ -0,0 +1,121 @@
+import io
+import logging
+import os
+import uuid
+
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+logger = logging.getLogger(__name__)
+
+ALLOWED_CONTENT_TYPES = {
+    'image/jpeg': '.jpg',
+    'image/png': '.png',
+    'image/webp': '.webp',
+    'application/pdf': '.pdf',
+}
+
+# Longest edge of the approval-screen preview, in pixels
+PREVIEW_SIZE = 1024
+
+
+def _chunk_name(upload, offset):
+    return f"student_id_uploads/{upload.upload_id}/{offset:012d}"
+
+
+def store_chunk(upload, offset, data):
+    """Write one chunk straight to storage. A chunk re-sent after a lost response replaces the old copy."""
+    name = _chunk_name(upload, offset)
+    if default_storage.exists(name):
+        default_storage.delete(name)
+    default_storage.save(name, ContentFile(data))
+
+
+class _ChunkReader(io.RawIOBase):
+    """Read an upload's chunks back to back, holding one chunk file open at a time."""
+
+    def __init__(self, upload):
+        self.upload = upload
+        self.offset = 0
+        self.current = None
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while True:
+            if self.current is None:
+                if self.offset >= self.upload.size:
+                    return 0
+                self.current = default_storage.open(_chunk_name(self.upload, self.offset), 'rb')
+            data = self.current.read(len(buffer))
+            if data:
+                buffer[:len(data)] = data
+                self.offset += len(data)
+                return len(data)
+            self.current.close()
+            self.current = None
+
+    def close(self):
+        if self.current is not None:
+            self.current.close()
+        super().close()
+
+
+def assemble_upload(upload):
+    """Stream the chunks into the upload's file and delete them. Memory use is one read buffer."""
+    extension = ALLOWED_CONTENT_TYPES.get(upload.content_type, os.path.splitext(upload.filename)[1])
+    with io.BufferedReader(_ChunkReader(upload)) as stream:
+        content = File(stream, name=f"{uuid.uuid4().hex}{extension}")
+        content.size = upload.size
+        upload.file.save(content.name, content, save=False)
+    discard_chunks(upload)
+
+
+def discard_chunks(upload):
+    offset = 0
+    while offset < upload.received:
+        name = _chunk_name(upload, offset)
+        if not default_storage.exists(name):
+            break
+        offset += default_storage.size(name)
+        default_storage.delete(name)
+
+
+def make_preview(upload):
+    """
+    JPEG preview of an image upload, or None for PDFs, unreadable images or when Pillow
+    isn't installed; the admin then links to the original instead.
+    """
+    if not upload.content_type.startswith('image/'):
+        return None
+    try:
+        # Imported here so web workers never load the imaging library
+        from PIL import Image, ImageOps
+    except ImportError:
+        logger.warning("Pillow is not installed; skipping student ID preview")
+        return None
+
+    try:
+        with upload.file.open('rb') as source, Image.open(source) as image:
+            # For JPEGs, decode at a reduced scale so large phone photos never fill memory
+            image.draft('RGB', (PREVIEW_SIZE, PREVIEW_SIZE))
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((PREVIEW_SIZE, PREVIEW_SIZE))
+            output = io.BytesIO()
+            image.convert('RGB').save(output, format='JPEG', quality=80, optimize=True)
+    except Exception as e:
+        logger.warning(f"Could not make a preview of student ID upload {upload.upload_id}: {str(e)}")
+        return None
+    return ContentFile(output.getvalue(), name=f"{uuid.uuid4().hex}.jpg")
+
+
+def attach_to_student(upload):
+    """Copy a processed upload's document and preview onto its student, once both exist."""
+    student = upload.student
+    if student is None or not upload.file:
+        return
+    student.student_id = upload.file.name
+    student.student_id_preview = upload.preview.name if upload.preview else None
+    student.save(update_fields=['student_id', 'student_id_preview'])
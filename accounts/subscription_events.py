@@ -0,0 +1,137 @@
+import json
+import logging
+import time
+
+from django.conf import settings
+
+from .redis_client import redis_client, redis_available
+
+logger = logging.getLogger(__name__)
+
+# Sorted set of subscription IDs with pending events, scored by when they become due
+DUE_KEY = "subscription_events:due"
+
+# How long a flusher holds a subscription's events before another may take them over
+CLAIM_SECONDS = 60
+
+# Delay before an update that failed to apply is tried again, and how many tries it gets
+RETRY_SECONDS = 60
+MAX_ATTEMPTS = 5
+
+
+def _events_key(subscription_id):
+    return f"subscription_events:{subscription_id}"
+
+
+def _claim_key(subscription_id):
+    return f"subscription_events:claim:{subscription_id}"
+
+
+def _attempts_key(subscription_id):
+    return f"subscription_events:attempts:{subscription_id}"
+
+
+def queue_subscription_update(event):
+    """
+    Hold a customer.subscription.updated event so a burst for the same subscription is
+    applied once. Events are kept in a per-subscription sorted set scored by the event's
+    `created`, so only the newest survives the flush regardless of delivery order.
+    Returns False when Redis is unavailable and the caller should apply the event now.
+    """
+    if not redis_available():
+        return False
+    stripe_sub = event['data']['object']
+    member = json.dumps({'created': event['created'], 'object': stripe_sub}, sort_keys=True)
+    try:
+        pipe = redis_client.pipeline()
+        pipe.zadd(_events_key(stripe_sub['id']), {member: event['created']})
+        # NX keeps the first deadline, so a steady stream of events can't postpone the flush forever
+        pipe.zadd(DUE_KEY, {stripe_sub['id']: time.time() + settings.SUBSCRIPTION_EVENT_COALESCE_SECONDS}, nx=True)
+        pipe.execute()
+        return True
+    except Exception as e:
+        logger.error(f"Could not queue subscription event {event.get('id')}: {str(e)}")
+        return False
+
+
+def claim_due_subscription_updates(limit=100):
+    """
+    Claim the subscriptions whose window has closed and return the newest pending event
+    of each as (stripe subscription object, event created timestamp). A claim is a short
+    lease, so concurrent flushers never apply the same events at once, and a flusher that
+    dies leaves them to be picked up again. Every claim must be ended with
+    finish_subscription_update or retry_subscription_update.
+    """
+    if not redis_available():
+        return []
+    try:
+        due = redis_client.zrangebyscore(DUE_KEY, '-inf', time.time(), start=0, num=limit)
+    except Exception as e:
+        logger.error(f"Could not read due subscription events: {str(e)}")
+        return []
+
+    claimed = []
+    for subscription_id in due:
+        try:
+            if not redis_client.set(_claim_key(subscription_id), 1, nx=True, ex=CLAIM_SECONDS):
+                continue  # Another flusher has it
+            newest = redis_client.zrevrange(_events_key(subscription_id), 0, 0)
+        except Exception as e:
+            logger.error(f"Could not claim events for subscription {subscription_id}: {str(e)}")
+            continue
+        if not newest:
+            finish_subscription_update(subscription_id)
+            continue
+        pending = json.loads(newest[0])
+        claimed.append((pending['object'], pending['created']))
+    return claimed
+
+
+def finish_subscription_update(subscription_id, created=None):
+    """
+    Drop the events up to `created` once the newest of them has been applied, and release
+    the claim. Events that arrived meanwhile stay queued and the subscription is due again.
+    """
+    events_key = _events_key(subscription_id)
+    try:
+        pipe = redis_client.pipeline(transaction=True)
+        pipe.zrem(DUE_KEY, subscription_id)
+        if created is not None:
+            pipe.zremrangebyscore(events_key, '-inf', created)
+        pipe.zcard(events_key)
+        remaining = pipe.execute()[-1]
+        if remaining:
+            # NX: if a new event re-added it first, its deadline stands
+            redis_client.zadd(DUE_KEY, {subscription_id: time.time()}, nx=True)
+        redis_client.delete(_claim_key(subscription_id), _attempts_key(subscription_id))
+    except Exception as e:
+        # The claim expires and the events are applied again, which is harmless
+        logger.error(f"Could not finish events for subscription {subscription_id}: {str(e)}")
+
+
+def retry_subscription_update(subscription_id):
+    """
+    Keep the events of a claimed subscription whose update failed and try again later.
+    After MAX_ATTEMPTS failures in a row they're dropped, so an update that can never be
+    applied doesn't stay queued forever. Returns True if it will be retried.
+    """
+    try:
+        attempts = redis_client.incr(_attempts_key(subscription_id))
+        if attempts >= MAX_ATTEMPTS:
+            logger.error(f"Dropping events for subscription {subscription_id} after {attempts} failed attempts")
+            pipe = redis_client.pipeline(transaction=True)
+            pipe.zrem(DUE_KEY, subscription_id)
+            pipe.delete(_events_key(subscription_id), _attempts_key(subscription_id), _claim_key(subscription_id))
+            pipe.execute()
+            return False
+
+        pipe = redis_client.pipeline(transaction=True)
+        pipe.expire(_attempts_key(subscription_id), RETRY_SECONDS * MAX_ATTEMPTS * 2)
+        pipe.zadd(DUE_KEY, {subscription_id: time.time() + RETRY_SECONDS})
+        pipe.delete(_claim_key(subscription_id))
+        pipe.execute()
+        return True
+    except Exception as e:
+        # The events stay queued and the claim expires, so they're retried anyway
+        logger.error(f"Could not reschedule events for subscription {subscription_id}: {str(e)}")
+        return True
@@ -0,0 +1,139 @@
+import hashlib
+import logging
+
+from django.conf import settings
+from rest_framework.throttling import BaseThrottle
+
+from .redis_client import redis_client, redis_available
+
+logger = logging.getLogger(__name__)
+
+# Checks every bucket in KEYS and only takes a token from each of them when all of
+# them have one, so a request rejected by the email bucket doesn't drain the IP bucket.
+# ARGV holds a (capacity, refill per second) pair for each key followed by the cost.
+# Returns {allowed, seconds until the slowest empty bucket can serve the request}.
+TOKEN_BUCKET_SCRIPT = """
+if redis.replicate_commands then redis.replicate_commands() end
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local cost = tonumber(ARGV[#ARGV])
+local buckets = {}
+local retry_after = 0
+
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 2 - 1])
+    local rate = tonumber(ARGV[i * 2])
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or capacity
+    local ts = tonumber(state[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+    if tokens < cost then
+        retry_after = math.max(retry_after, (cost - tokens) / rate)
+    end
+    buckets[i] = {key, tokens, capacity, rate}
+end
+
+local allowed = 1
+if retry_after > 0 then
+    allowed = 0
+end
+
+for _, bucket in ipairs(buckets) do
+    local tokens = bucket[2]
+    if allowed == 1 then
+        tokens = tokens - cost
+    end
+    redis.call('HSET', bucket[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+    redis.call('EXPIRE', bucket[1], math.ceil(bucket[3] / bucket[4]) + 1)
+end
+
+return {allowed, tostring(retry_after)}
+"""
+
+_token_bucket = None
+
+
+def _get_token_bucket_script():
+    global _token_bucket
+    if _token_bucket is None:
+        _token_bucket = redis_client.register_script(TOKEN_BUCKET_SCRIPT)
+    return _token_bucket
+
+
+def parse_rate(rate):
+    """
+    Parse a "burst/refill_per_minute" rate such as "5/1" into (capacity, tokens per second).
+    """
+    burst, refill_per_minute = rate.split('/')
+    return int(burst), float(refill_per_minute) / 60.0
+
+
+def consume(buckets, cost=1):
+    """
+    Atomically take `cost` tokens from every bucket in `buckets`.
+
+    `buckets` is a list of (redis_key, rate) pairs. Returns (allowed, retry_after_seconds).
+    The limiter fails open when Redis is unavailable so an outage doesn't lock everyone out.
+    """
+    if not buckets or not redis_available():
+        return True, None
+
+    keys = []
+    args = []
+    for key, rate in buckets:
+        capacity, refill_per_second = parse_rate(rate)
+        keys.append(key)
+        args.extend([capacity, refill_per_second])
+    args.append(cost)
+
+    try:
+        allowed, retry_after = _get_token_bucket_script()(keys=keys, args=args)
+    except Exception as e:
+        logger.error(f"Rate limiter unavailable, allowing request: {str(e)}")
+        return True, None
+
+    if int(allowed) == 1:
+        return True, None
+    return False, float(retry_after)
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Redis token-bucket throttle keyed by endpoint scope, client IP and submitted email.
+
+    Views opt in with `throttle_classes = [TokenBucketThrottle]` and a `throttle_scope`
+    naming an entry in settings.RATE_LIMITS, e.g.
+    {'otp': {'ip': '20/10', 'email': '3/1'}} where each rate is "burst/refill_per_minute".
+    DRF turns a rejection into a 429 response carrying a Retry-After header.
+    """
+    cache_prefix = 'ratelimit'
+
+    def __init__(self):
+        self.retry_after = None
+
+    def get_buckets(self, request, view):
+        scope = getattr(view, 'throttle_scope', None)
+        limits = getattr(settings, 'RATE_LIMITS', {}).get(scope)
+        if not limits:
+            return []
+
+        buckets = []
+        if limits.get('ip'):
+            buckets.append((f"{self.cache_prefix}:{scope}:ip:{self.get_ident(request)}", limits['ip']))
+
+        email = None
+        try:
+            email = request.data.get('email')
+        except Exception:
+            pass
+        if email and limits.get('email'):
+            email_hash = hashlib.sha256(str(email).strip().lower().encode()).hexdigest()
+            buckets.append((f"{self.cache_prefix}:{scope}:email:{email_hash}", limits['email']))
+        return buckets
+
+    def allow_request(self, request, view):
+        allowed, self.retry_after = consume(self.get_buckets(request, view))
+        return allowed
+
+    def wait(self):
+        return self.retry_after
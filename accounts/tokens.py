@@ -0,0 +1,157 @@
+import logging
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from rest_framework.authentication import BaseAuthentication
+
+from .redis_client import redis_client, redis_available
+
+logger = logging.getLogger(__name__)
+
+ACCESS_TOKEN_SALT = 'accounts.access_token'
+
+
+def _version_key(user_id):
+    return f"token_version:{user_id}"
+
+
+def _seed():
+    # Millisecond clock, so a counter recreated after Redis loses it never matches a revoked token's version
+    return int(time.time() * 1000)
+
+
+def get_token_version(user_id):
+    """
+    Current revocation version for a user; tokens carrying any other version are rejected.
+    None when it can't be read, in which case no token is accepted or issued.
+    """
+    if user_id is None or not redis_available():
+        return None
+    key = _version_key(user_id)
+    try:
+        pipe = redis_client.pipeline()
+        pipe.set(key, _seed(), nx=True)
+        pipe.get(key)
+        return int(pipe.execute()[-1])
+    except Exception as e:
+        logger.error(f"Could not read token version for user {user_id}: {str(e)}")
+        return None
+
+
+def revoke_access_tokens(user_id):
+    """Invalidate every access token issued to a user so far."""
+    if not redis_available():
+        # Without Redis no token verifies, and the counter is reseeded when it's back
+        return
+    key = _version_key(user_id)
+    try:
+        pipe = redis_client.pipeline()
+        pipe.set(key, _seed(), nx=True)
+        pipe.incr(key)
+        pipe.execute()
+    except Exception as e:
+        logger.error(f"Could not revoke access tokens for user {user_id}: {str(e)}")
+        # Drop the counter if we still can; it's reseeded past every version handed out
+        try:
+            redis_client.delete(key)
+        except Exception:
+            pass
+
+
+def issue_access_token(user):
+    """
+    Create a signed, short-lived access token for `user`, or None if the revocation
+    version can't be read.
+
+    The token carries the user id and current revocation version, so it can be checked
+    with the signing key alone plus a single Redis read - no session or user lookup.
+    """
+    version = get_token_version(user.pk)
+    if version is None:
+        return None
+    payload = {'uid': user.pk, 'ver': version}
+    return signing.dumps(payload, salt=ACCESS_TOKEN_SALT)
+
+
+def verify_access_token(token):
+    """Return the user id a valid token was issued to, or None if it's invalid, expired or revoked."""
+    try:
+        payload = signing.loads(token, salt=ACCESS_TOKEN_SALT, max_age=settings.ACCESS_TOKEN_TTL_SECONDS)
+    except signing.BadSignature:
+        return None
+
+    # Fails closed: a version that can't be read never matches
+    version = get_token_version(payload.get('uid'))
+    if version is None or payload.get('ver') != version:
+        return None
+    return payload.get('uid')
+
+
+def get_request_access_token(request):
+    """Read a bearer token from the Authorization header, if one was sent."""
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    scheme, _, token = header.partition(' ')
+    if scheme.lower() != 'bearer' or not token.strip():
+        return None
+    return token.strip()
+
+
+def get_request_user_id(request):
+    """
+    Identify the requesting user as cheaply as possible, before authentication runs.
+
+    A bearer token is checked without any database access; otherwise the user id is read
+    from the session, which authentication is about to load anyway.
+    """
+    token = get_request_access_token(request)
+    if token:
+        user_id = verify_access_token(token)
+        if user_id is not None:
+            return user_id
+
+    session = getattr(request, 'session', None)
+    if session is None:
+        return None
+    return session.get('_auth_user_id')
+
+
+def access_token_response_data(user):
+    """
+    Fields added to login/registration/refresh responses alongside session_id. Empty when
+    no token can be issued; clients keep using the session ID until their next refresh.
+    """
+    access_token = issue_access_token(user)
+    if access_token is None:
+        return {}
+    return {
+        "access_token": access_token,
+        "access_token_expires_in": settings.ACCESS_TOKEN_TTL_SECONDS,
+    }
+
+
+class AccessTokenAuthentication(BaseAuthentication):
+    """
+    Authenticates `Authorization: Bearer <access_token>` requests without touching the session table.
+
+    Invalid or expired tokens fall through to the next authentication class, so clients that
+    still send a session ID keep working while they refresh their token.
+    """
+    def authenticate(self, request):
+        token = get_request_access_token(request)
+        if not token:
+            return None
+
+        user_id = verify_access_token(token)
+        if user_id is None:
+            return None
+
+        try:
+            user = get_user_model().objects.get(pk=user_id, is_active=True)
+        except get_user_model().DoesNotExist:
+            return None
+        return (user, token)
+
+    def authenticate_header(self, request):
+        return 'Bearer'
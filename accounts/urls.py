@@ -7,8 +7,11 @@ from .views import (
     CreateCheckoutSessionView, CompanyEmployeeDetailView, StudentSignupView, VerifyStudentOTPView, 
     CompleteStudentRegistrationView, CheckUserFeaturesView, CheckExportPermissionView,
     SendOTPView, VerifyOTPView, StudentApprovalStatusView,
-    SyncStripeTransactionsView,
-    SessionStatusView, SubscriptionPlansView, BillingHistoryView, ActivateSubscriptionView, CancelSubscriptionView
+    SyncStripeTransactionsView, DatabasePoolStatsView, ExportQueriesView,
+    QueryRenderView, QueryRenderDownloadView, GetQueriesBatchView, SearchUsageView,
+    QueryStreamView, QueryStreamChunkView, QueryStreamFinalizeView,
+    StudentIdUploadView, StudentIdUploadChunkView, DataExportView, DataExportDownloadView,
+    SessionStatusView, BootstrapView, SubscriptionPlansView, BillingHistoryView, ActivateSubscriptionView, CancelSubscriptionView
 )
 from .stripe_webhooks import stripe_webhook
 
@@ -30,6 +33,8 @@ urlpatterns = [
     path("student/signup/", StudentSignupView.as_view(), name="student_signup"),
     path("student/verify-otp/", VerifyStudentOTPView.as_view(), name="verify_student_otp"),
     path("student/complete-registration/", CompleteStudentRegistrationView.as_view(), name="complete_student_registration"),
+    path("student/id-uploads/", StudentIdUploadView.as_view(), name="student_id_upload"),
+    path("student/id-uploads/<uuid:upload_id>/", StudentIdUploadChunkView.as_view(), name="student_id_upload_chunk"),
     path("student/approval-status/", StudentApprovalStatusView.as_view(), name="student_approval_status"),
 
     # Companies
@@ -40,6 +45,7 @@ urlpatterns = [
     # Session Management
     path("refresh-session/", RefreshSessionView.as_view(), name="refresh_session"),
     path("session/status/", SessionStatusView.as_view(), name="session_status"),
+    path("users/me/", BootstrapView.as_view(), name="bootstrap"),
 
     # Password Management
     path("password/forgot/", ForgotPasswordView.as_view(), name="forgot_password"),
@@ -56,7 +62,16 @@ urlpatterns = [
     path("save-query/", SaveQueryView.as_view(), name="save_query"),
     path("query/<uuid:query_id>/", QueryDetailView.as_view(), name="query-detail"),
     path('users/queries/', GetQueriesByUserView.as_view(), name="get_queries_by_user"),
+    path('queries/batch/', GetQueriesBatchView.as_view(), name="get_queries_batch"),
+    path('queries/stream/', QueryStreamView.as_view(), name="query_stream"),
+    path('queries/<uuid:query_id>/stream/', QueryStreamChunkView.as_view(), name="query_stream_chunk"),
+    path('queries/<uuid:query_id>/stream/finalize/', QueryStreamFinalizeView.as_view(), name="query_stream_finalize"),
+    path('users/queries/export/<str:export_format>/', ExportQueriesView.as_view(), name="export_queries"),
+    path('users/data-export/', DataExportView.as_view(), name="data_export"),
+    path('data-exports/<str:token>/', DataExportDownloadView.as_view(), name="data_export_download"),
     path('queries/<uuid:query_id>/response/', GetQueryResponseByIdView.as_view(), name="get_query_response_by_id"),
+    path('queries/<uuid:query_id>/render/<str:render_format>/', QueryRenderView.as_view(), name="query_render"),
+    path('renders/<str:cache_key>/', QueryRenderDownloadView.as_view(), name="query_render_download"),
 
     # Subscription Management
     path('subscription/plans/', SubscriptionPlansView.as_view(), name="subscription_plans"),
@@ -69,8 +84,10 @@ urlpatterns = [
     # User Features
     path("check-user-features/", CheckUserFeaturesView.as_view(), name="check-user-features"),
     path("check-export-permission/<uuid:query_id>/", CheckExportPermissionView.as_view(), name="check-export-permission"),
+    path("usage/searches/", SearchUsageView.as_view(), name="search-usage"),
     
     # Stripe Webhook
     path('webhook/stripe/', stripe_webhook, name="stripe_webhook"),
     path('admin/sync-stripe-transactions/', SyncStripeTransactionsView.as_view(), name="admin-sync-stripe-transactions"),
+    path('admin/db-pool-stats/', DatabasePoolStatsView.as_view(), name="admin-db-pool-stats"),
 ]
@@ -0,0 +1,105 @@
+import hashlib
+import logging
+import time
+
+from django.db import transaction
+
+from .db_routers import pin_to_primary
+from .redis_client import redis_client, redis_available
+
+logger = logging.getLogger(__name__)
+
+
+def _version_key(resource, user_id):
+    return f"version:{resource}:{user_id}"
+
+
+def _seed():
+    # Millisecond clock, so a counter recreated after Redis loses it never repeats an old value
+    return int(time.time() * 1000)
+
+
+def get_version(resource, user_id):
+    """
+    Current version of `resource` for a user, or None when it can't be determined.
+    The counter is created on first read; callers must not cache responses without one.
+    """
+    if user_id is None or not redis_available():
+        return None
+    key = _version_key(resource, user_id)
+    try:
+        pipe = redis_client.pipeline()
+        pipe.set(key, _seed(), nx=True)
+        pipe.get(key)
+        return pipe.execute()[-1]
+    except Exception as e:
+        logger.error(f"Could not read {resource} version for user {user_id}: {str(e)}")
+        return None
+
+
+def get_versions(resources, user_id):
+    """get_version for several resources of one user in a single round trip; None if any is unknown."""
+    if user_id is None or not redis_available():
+        return None
+    try:
+        pipe = redis_client.pipeline()
+        for resource in resources:
+            pipe.set(_version_key(resource, user_id), _seed(), nx=True)
+            pipe.get(_version_key(resource, user_id))
+        return tuple(pipe.execute()[1::2])
+    except Exception as e:
+        logger.error(f"Could not read {', '.join(resources)} versions for user {user_id}: {str(e)}")
+        return None
+
+
+def _bump(resource, user_ids):
+    try:
+        pipe = redis_client.pipeline()
+        for user_id in user_ids:
+            key = _version_key(resource, user_id)
+            pipe.set(key, _seed(), nx=True)
+            pipe.incr(key)
+        pipe.execute()
+    except Exception as e:
+        logger.error(f"Could not bump {resource} versions for {len(user_ids)} users: {str(e)}")
+
+
+def bump_version(resource, user_id):
+    """Mark `resource` as changed for a user, invalidating every ETag built from the old version."""
+    bump_versions(resource, [user_id])
+
+
+def bump_versions(resource, user_ids):
+    """
+    bump_version for many users in a single round trip.
+
+    The users are pinned to the primary straight away, whoever made the change, so the
+    response built under the new version can't come from a replica that hasn't caught up.
+    The bump itself waits for the surrounding transaction to commit, for the same reason.
+    """
+    user_ids = [user_id for user_id in user_ids if user_id is not None]
+    if not user_ids or not redis_available():
+        return
+    pin_to_primary(*user_ids)
+    transaction.on_commit(lambda: _bump(resource, user_ids))
+
+
+def make_etag(resource, user_id, version, *variant):
+    """Weak ETag for one rendering of a versioned resource; `variant` covers query parameters."""
+    source = ":".join(str(part) for part in (resource, user_id, version, *variant))
+    return f'W/"{hashlib.sha256(source.encode()).hexdigest()[:32]}"'
+
+
+def _opaque(etag):
+    etag = etag.strip()
+    return etag[2:] if etag.startswith('W/') else etag
+
+
+def etag_matches(request, etag):
+    """If-None-Match check using weak comparison, as RFC 9110 requires for GET."""
+    header = request.META.get('HTTP_IF_NONE_MATCH', '')
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    return _opaque(etag) in [_opaque(candidate) for candidate in header.split(',')]
@@ -11,18 +11,20 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, permissions
 from rest_framework.parsers import MultiPartParser, FormParser
-import redis
 import stripe
 import os
 import json
 import random
+import time
 import uuid
 from dotenv import load_dotenv
 from django.contrib.auth import get_user_model
 from uuid import uuid4
 from django.urls import reverse
 from django.db import transaction
-from django.http import Http404
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.http import FileResponse, Http404, HttpResponseNotModified, StreamingHttpResponse
 from django.template.loader import render_to_string
 from django.conf import settings
 from django.utils import timezone
@@ -32,7 +34,7 @@ from django.contrib.sessions.backends.db import SessionStore
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 
-from .models import IndividualUser, Company, Employee, Query, CustomUser, SubscriptionPlan, Subscription, Transaction, UserSearchCount, StudentUser
+from .models import IndividualUser, Company, Employee, Query, CustomUser, SubscriptionPlan, Subscription, Transaction, UserSearchCount, StudentUser, QueryRender, MonthlySearchUsage, StudentIdUpload, DataExport
 from .serializers import (
     EmailOnlySerializer, 
     VerifyOTPSerializer,
@@ -43,7 +45,7 @@ from .serializers import (
     CustomUserSerializer, IndividualUserSerializer, CompanySerializer, EmployeeSerializer, StudentUserSerializer,
     ForgotPasswordSerializer, ResetPasswordSerializer, ChangePasswordSerializer,
     EmployeeInviteSerializer, CompleteEmployeeRegistrationSerializer, EmployeeListSerializer,
-    SendOTPSerializer, QuerySerializer
+    SendOTPSerializer, QuerySerializer, StudentIdUploadSerializer
 )
 
 # Import email utils at the top of the file
@@ -56,59 +58,38 @@ from .email_utils import (
     send_otp_email,
     send_employee_invitation_email
 )
+from .redis_client import redis_client
+from .db_pool import get_pool_stats
+from .exports import EXPORT_FORMATS, stream_export
+from .rendering import RENDER_CONTENT_TYPES, render_cache_key
+from .data_exports import download_token, export_from_token
+from .conditional import ConditionalGetMixin
+from .bootstrap import FREE_SEARCH_LIMIT, account_changed, get_bootstrap, subscription_changed
+from .deletion import request_account_deletion
+from .student_ids import ALLOWED_CONTENT_TYPES, attach_to_student, store_chunk
+from .query_store import existing_query_ids, find_query, get_query_detail, get_user_queries, invalidate_query_details, user_history
+from .query_stream import append_chunk, finalize, open_streams_today
+from .pagination import decode_cursor, encode_cursor, get_page_size
+from .versioning import bump_version
+from .throttling import TokenBucketThrottle
+from .tokens import AccessTokenAuthentication, access_token_response_data, revoke_access_tokens, verify_access_token, get_request_access_token
+from .otp import (
+    OTPError,
+    issue_otp,
+    verify_otp,
+    otp_expiry_minutes,
+    mark_email_verified,
+    get_verified_user_type,
+    clear_email_verified
+)
 
 load_dotenv()
 EMPLOYEE_LIMIT = int(os.getenv("EMPLOYEE_LIMIT", 10))
 stripe.api_key = settings.STRIPE_SECRET_KEY
 
-# Initialize Redis with better error handling
-try:
-    # Use environment variables for Redis connection
-    redis_host = os.getenv("REDIS_HOST", "localhost")
-    redis_port = int(os.getenv("REDIS_PORT", 6379))
-    redis_username = os.getenv("REDIS_USERNAME", "")
-    redis_password = os.getenv("REDIS_PASSWORD", "")
-    
-    # Create connection with credentials if provided
-    if redis_username and redis_password:
-        redis_client = redis.StrictRedis(
-            host=redis_host, 
-            port=redis_port, 
-            username=redis_username,
-            password=redis_password,
-            db=0, 
-            decode_responses=True,
-            ssl=True  # Digital Ocean Redis requires SSL
-        )
-    else:
-        redis_client = redis.StrictRedis(
-            host=redis_host, 
-            port=redis_port, 
-            db=0, 
-            decode_responses=True
-        )
-    
-    # Test the connection
-    redis_client.ping()
-    print(f"Redis connected successfully to {redis_host}:{redis_port}")
-except Exception as e:
-    print(f"Redis connection error: {str(e)}")
-    # Use a dummy Redis client that doesn't fail when methods are called
-    class DummyRedis:
-        def setex(self, *args, **kwargs): 
-            print("DummyRedis: setex called")
-            return True
-        def get(self, *args, **kwargs): 
-            print("DummyRedis: get called")
-            return None
-        def delete(self, *args, **kwargs): 
-            print("DummyRedis: delete called")
-            return True
-        def ping(self, *args, **kwargs): 
-            print("DummyRedis: ping called")
-            return True
-    redis_client = DummyRedis()
-    print("Using DummyRedis as fallback")
+# How long subscription/status/ may hand out the same Stripe customer portal link
+PORTAL_URL_REUSE_SECONDS = 300
+
 
 User = get_user_model()
 
@@ -118,10 +99,20 @@ class CsrfExemptSessionAuthentication(SessionAuthentication):
     def enforce_csrf(self, request):
         return
 
+
+def otp_error_response(error):
+    """Build the API response for an OTPError raised by the OTP service."""
+    response = Response({"error": error.message}, status=error.status_code)
+    if error.retry_after:
+        response["Retry-After"] = str(error.retry_after)
+    return response
+
 @method_decorator(csrf_exempt, name='dispatch')
 class LoginView(APIView):
     authentication_classes = [CsrfExemptSessionAuthentication]
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [TokenBucketThrottle]
+    throttle_scope = 'login'
 
     @swagger_auto_schema(
         request_body=LoginSerializer,
@@ -140,17 +131,6 @@ class LoginView(APIView):
             email = serializer.validated_data["email"]
             password = serializer.validated_data["password"]
 
-            # Try to check if the email exists first to give a better error message
-            try:
-                from django.db import connections
-                connection = connections['default']
-                connection.ensure_connection()
-            except Exception as db_err:
-                return Response({
-                    "error": "Database connection error", 
-                    "details": f"The system is currently unable to connect to the database. Please try again later. Technical details: {str(db_err)}"
-                }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
-
             # Try to find the user
             try:
                 user_exists = CustomUser.objects.filter(email=email).exists()
@@ -222,6 +202,7 @@ class LoginView(APIView):
             
             # Include session ID in response so frontend can store it
             user_data["session_id"] = request.session.session_key
+            user_data.update(access_token_response_data(user))
             
             return Response(user_data, status=status.HTTP_200_OK)
         except AuthenticationFailed as e:
@@ -251,6 +232,7 @@ class LogoutView(APIView):
         }
     )
     def post(self, request):
+        revoke_access_tokens(request.user.id)
         logout(request)
         return Response({"message": "Logout successful"}, status=status.HTTP_200_OK)
 
@@ -262,6 +244,8 @@ class IndividualSignupView(APIView):
     """
     authentication_classes = [CsrfExemptSessionAuthentication]
     permission_classes = [permissions.AllowAny]  # Allow anyone to call this endpoint
+    throttle_classes = [TokenBucketThrottle]
+    throttle_scope = 'otp'
 
 
     @swagger_auto_schema(
@@ -284,8 +268,10 @@ class IndividualSignupView(APIView):
                 return Response({"error": "Email already exists"}, status=status.HTTP_400_BAD_REQUEST)
 
             # Generate and store 6-digit OTP
-            otp = get_random_string(length=6, allowed_chars="0123456789")
-            redis_client.setex(f"otp:{email}", 300, otp)  # Expires in 5 minutes
+            try:
+                otp = issue_otp(email, "signup", user_type="individual")
+            except OTPError as e:
+                return otp_error_response(e)
             
             # Send OTP to email
             try:
@@ -293,7 +279,7 @@ class IndividualSignupView(APIView):
                     email=email,
                     otp_code=otp,
                     action_type="individual registration",
-                    expiry_minutes=5
+                    expiry_minutes=otp_expiry_minutes()
                 )
                 return Response({"message": "OTP sent to email"}, status=status.HTTP_200_OK)
             except Exception as e:
@@ -332,15 +318,13 @@ class VerifyIndividualOTPView(APIView):
             email = data["email"]
             otp = data["otp"]
 
-            stored_otp = redis_client.get(f"otp:{email}")
-            if not stored_otp:
-                return Response({"error": "OTP expired or not found"}, status=status.HTTP_400_BAD_REQUEST)
-            
-            if stored_otp != otp:
-                return Response({"error": "Invalid OTP"}, status=status.HTTP_400_BAD_REQUEST)
+            try:
+                verify_otp(email, "signup", otp)
+            except OTPError as e:
+                return otp_error_response(e)
             
             # Save verification status in Redis
-            redis_client.setex(f"verified:{email}", 1800, "true")  # verification valid for 30 minutes
+            mark_email_verified(email, "individual")
             
             return Response({"message": "OTP verified, proceed with registration"}, status=status.HTTP_200_OK)
         except Exception as e:
@@ -374,8 +358,7 @@ class CompleteIndividualRegistrationView(APIView):
             email = data["email"]
             
             # Check if email was verified
-            verified = redis_client.get(f"verified:{email}")
-            if not verified:
+            if not get_verified_user_type(email):
                 return Response({"error": "Email not verified"}, status=status.HTTP_400_BAD_REQUEST)
             
             # Create CustomUser
@@ -396,7 +379,7 @@ class CompleteIndividualRegistrationView(APIView):
             )
             
             # Clean up Redis
-            redis_client.delete(f"verified:{email}")
+            clear_email_verified(email)
             
             # Automatically log the user in
             user = authenticate(request, email=email, password=data["password"])
@@ -413,6 +396,7 @@ class CompleteIndividualRegistrationView(APIView):
             
             # Include session ID in response so frontend can store it
             user_data["session_id"] = request.session.session_key
+            user_data.update(access_token_response_data(custom_user))
             
             # Send welcome email
             try:
@@ -433,6 +417,8 @@ class CompanySignupView(APIView):
     """
     authentication_classes = [CsrfExemptSessionAuthentication]
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [TokenBucketThrottle]
+    throttle_scope = 'otp'
 
     @swagger_auto_schema(
         request_body=EmailOnlySerializer,
@@ -454,8 +440,10 @@ class CompanySignupView(APIView):
                 return Response({"error": "Email already exists"}, status=status.HTTP_400_BAD_REQUEST)
 
             # Generate and store 6-digit OTP
-            otp = get_random_string(length=6, allowed_chars="0123456789")
-            redis_client.setex(f"otp:{email}", 300, otp)  # Expires in 5 minutes
+            try:
+                otp = issue_otp(email, "signup", user_type="company")
+            except OTPError as e:
+                return otp_error_response(e)
             
             # Send OTP to email
             try:
@@ -463,7 +451,7 @@ class CompanySignupView(APIView):
                     email=email,
                     otp_code=otp,
                     action_type="company registration",
-                    expiry_minutes=5
+                    expiry_minutes=otp_expiry_minutes()
                 )
                 return Response({"message": "OTP sent to email"}, status=status.HTTP_200_OK)
             except Exception as e:
@@ -502,15 +490,13 @@ class VerifyCompanyOTPView(APIView):
             email = data["email"]
             otp = data["otp"]
 
-            stored_otp = redis_client.get(f"otp:{email}")
-            if not stored_otp:
-                return Response({"error": "OTP expired or not found"}, status=status.HTTP_400_BAD_REQUEST)
-            
-            if stored_otp != otp:
-                return Response({"error": "Invalid OTP"}, status=status.HTTP_400_BAD_REQUEST)
+            try:
+                verify_otp(email, "signup", otp)
+            except OTPError as e:
+                return otp_error_response(e)
             
             # Save verification status in Redis
-            redis_client.setex(f"verified:{email}", 1800, "true")  # verification valid for 30 minutes
+            mark_email_verified(email, "company")
             
             return Response({"message": "OTP verified, proceed with registration"}, status=status.HTTP_200_OK)
         except Exception as e:
@@ -544,8 +530,7 @@ class CompleteCompanyRegistrationView(APIView):
             email = data["email"]
             
             # Check if email was verified
-            verified = redis_client.get(f"verified:{email}")
-            if not verified:
+            if not get_verified_user_type(email):
                 return Response({"error": "Email not verified"}, status=status.HTTP_400_BAD_REQUEST)
             
             # Create CustomUser with is_company=True
@@ -565,7 +550,7 @@ class CompleteCompanyRegistrationView(APIView):
             )
             
             # Clean up Redis
-            redis_client.delete(f"verified:{email}")
+            clear_email_verified(email)
             
             # Automatically log the user in
             user = authenticate(request, email=email, password=data["password"])
@@ -582,6 +567,7 @@ class CompleteCompanyRegistrationView(APIView):
             
             # Include session ID in response so frontend can store it
             company_data["session_id"] = request.session.session_key
+            company_data.update(access_token_response_data(custom_user))
             
             # Send welcome email
             try:
@@ -681,6 +667,34 @@ class AddEmployeeView(APIView):
         except Exception as e:
             return Response({"error": "Failed to add employee", "details": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+def search_subscription(user):
+    """
+    (subscription, is_employee) for the subscription a search is charged to. Employees use
+    their company's; other users get a free subscription created if they have none.
+    """
+    # Check if user is an employee
+    try:
+        employee = Employee.objects.get(user=user)
+        # If user is an employee, use their company's subscription
+        company_user = employee.company.user
+        return Subscription.objects.get(user=company_user), True
+    except Employee.DoesNotExist:
+        pass
+
+    # If not an employee, use user's own subscription
+    try:
+        return Subscription.objects.get(user=user), False
+    except Subscription.DoesNotExist:
+        # Create a free subscription for the user if none exists
+        subscription = Subscription.objects.create(
+            user=user,
+            plan_id='free',
+            status='active'
+        )
+        subscription_changed(user.pk)
+        return subscription, False
+
+
 @method_decorator(csrf_exempt, name='dispatch')
 class SaveQueryView(APIView):
     authentication_classes = [CsrfExemptSessionAuthentication]
@@ -725,26 +739,7 @@ class SaveQueryView(APIView):
                 )
 
             user = request.user
-            
-            # Check if user is an employee
-            is_employee = False
-            try:
-                employee = Employee.objects.get(user=user)
-                is_employee = True
-                # If user is an employee, use their company's subscription
-                company_user = employee.company.user
-                subscription = Subscription.objects.get(user=company_user)
-            except Employee.DoesNotExist:
-                # If not an employee, use user's own subscription
-                try:
-                    subscription = Subscription.objects.get(user=user)
-                except Subscription.DoesNotExist:
-                    # Create a free subscription for the user if none exists
-                    subscription = Subscription.objects.create(
-                        user=user,
-                        plan_id='free',
-                        status='active'
-                    )
+            subscription, is_employee = search_subscription(user)
             
             # Check if user can perform search
             can_search, error_message = subscription.can_perform_search()
@@ -757,6 +752,7 @@ class SaveQueryView(APIView):
             # Increment search count for the user (skip for employees as they use company's subscription)
             if not is_employee:
                 UserSearchCount.increment_search_count(user)
+                account_changed(user.pk)
 
             # Create the query
             query = Query.objects.create(
@@ -766,6 +762,7 @@ class SaveQueryView(APIView):
                 documents=request.data['documents'],
                 summary=request.data['summary']
             )
+            bump_version('queries', user.pk)
 
             return Response(QuerySerializer(query).data, status=status.HTTP_201_CREATED)
 
@@ -775,10 +772,197 @@ class SaveQueryView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+def query_stream_data(query_id, last_chunk_seq, query_status):
+    return {"query_id": str(query_id), "last_chunk_seq": last_chunk_seq, "status": query_status}
+
+
 @method_decorator(csrf_exempt, name='dispatch')
-class GetQueriesByUserView(APIView):
-    authentication_classes = [CsrfExemptSessionAuthentication]
+class QueryStreamView(APIView):
+    """
+    Start saving an answer as soon as it begins streaming. The query appears in history
+    straight away with status 'streaming'; the search is charged when it's finalized.
+    """
+    authentication_classes = [AccessTokenAuthentication, CsrfExemptSessionAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description="Create a streaming query at the first token. Append chunks with PATCH "
+                              "queries/<query_id>/stream/ and finish with POST queries/<query_id>/stream/finalize/.",
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            properties={
+                'query': openapi.Schema(type=openapi.TYPE_STRING),
+                'corrected_query': openapi.Schema(type=openapi.TYPE_STRING, nullable=True),
+            },
+            required=['query']
+        ),
+        responses={
+            201: openapi.Response("Streaming query created"),
+            400: "Invalid request data",
+            402: "Payment required"
+        }
+    )
+    def post(self, request):
+        query_text = request.data.get('query')
+        if not isinstance(query_text, str) or not query_text:
+            return Response({"error": "query is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+        user = request.user
+        try:
+            subscription, is_employee = search_subscription(user)
+        except Subscription.DoesNotExist:
+            return Response({"error": "Your company has no subscription"}, status=status.HTTP_402_PAYMENT_REQUIRED)
+
+        can_search, error_message = subscription.can_perform_search()
+        if can_search and subscription.plan_id == 'free' and not is_employee:
+            # Unfinished answers aren't counted until finalized, but each one holds a search
+            if UserSearchCount.get_search_count(user) + open_streams_today(user) >= FREE_SEARCH_LIMIT:
+                can_search = False
+                error_message = "You've reached your daily search limit of 3 searches. Please upgrade your plan."
+        if not can_search:
+            return Response({"error": error_message, "upgrade_required": True}, status=status.HTTP_402_PAYMENT_REQUIRED)
+
+        query = Query.objects.create(
+            user=user,
+            query=query_text,
+            corrected_query=request.data.get('corrected_query'),
+            documents=[],
+            summary="",
+            status=Query.STATUS_STREAMING
+        )
+        bump_version('queries', user.pk)
+        return Response(
+            query_stream_data(query.query_id, query.last_chunk_seq, query.status),
+            status=status.HTTP_201_CREATED
+        )
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class QueryStreamChunkView(APIView):
+    """
+    Append the next piece of a streaming answer. Chunks are numbered from 1; a chunk that
+    was already applied is acknowledged again without being appended twice.
+    """
+    authentication_classes = [AccessTokenAuthentication, CsrfExemptSessionAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description="Append summary text and/or document citations as chunk `seq`, which must be "
+                              "last_chunk_seq + 1",
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            properties={
+                'seq': openapi.Schema(type=openapi.TYPE_INTEGER),
+                'summary': openapi.Schema(type=openapi.TYPE_STRING, description="Text to append to the summary"),
+                'documents': openapi.Schema(
+                    type=openapi.TYPE_ARRAY,
+                    items=openapi.Schema(type=openapi.TYPE_OBJECT),
+                    description="Document references to append"
+                ),
+            },
+            required=['seq']
+        ),
+        responses={
+            200: openapi.Response("Chunk appended, or already appended"),
+            400: "Invalid request data",
+            403: "Access denied",
+            404: "Query not found",
+            409: "Query already finalized, or chunk out of order; resume from last_chunk_seq + 1"
+        }
+    )
+    def patch(self, request, query_id):
+        seq = request.data.get('seq')
+        summary = request.data.get('summary', '')
+        documents = request.data.get('documents', [])
+        if not isinstance(seq, int) or isinstance(seq, bool) or seq < 1:
+            return Response({"error": "seq must be a positive integer"}, status=status.HTTP_400_BAD_REQUEST)
+        if not isinstance(summary, str) or not isinstance(documents, list):
+            return Response({"error": "summary must be a string and documents a list"}, status=status.HTTP_400_BAD_REQUEST)
+
+        if append_chunk(query_id, request.user.pk, seq, summary, documents):
+            bump_version('queries', request.user.pk)
+            return Response(query_stream_data(query_id, seq, Query.STATUS_STREAMING))
+
+        # Not applied: work out why from the row as it is now
+        query = Query.objects.filter(query_id=query_id).values('user_id', 'status', 'last_chunk_seq').first()
+        if query is None:
+            return Response({"error": "Query not found"}, status=status.HTTP_404_NOT_FOUND)
+        if query['user_id'] != request.user.pk:
+            return Response(
+                {"error": "You don't have permission to access this query"},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        data = query_stream_data(query_id, query['last_chunk_seq'], query['status'])
+        if query['status'] == Query.STATUS_STREAMING and seq <= query['last_chunk_seq']:
+            # A retry of a chunk that already landed
+            return Response(data)
+        return Response(data, status=status.HTTP_409_CONFLICT)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class QueryStreamFinalizeView(APIView):
+    """
+    Mark a streaming answer complete and charge the search to the user's quota. Finalizing
+    twice is harmless; the search is only counted once.
+    """
+    authentication_classes = [AccessTokenAuthentication, CsrfExemptSessionAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description="Finish a streaming query. Pass `last_chunk_seq` to make sure every chunk has arrived.",
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            properties={
+                'last_chunk_seq': openapi.Schema(type=openapi.TYPE_INTEGER, nullable=True),
+                'corrected_query': openapi.Schema(type=openapi.TYPE_STRING, nullable=True),
+            }
+        ),
+        responses={
+            200: openapi.Response("Query complete", QuerySerializer),
+            400: "Invalid request data",
+            403: "Access denied",
+            404: "Query not found",
+            409: "Chunks are missing; resume from last_chunk_seq + 1"
+        }
+    )
+    def post(self, request, query_id):
+        last_chunk_seq = request.data.get('last_chunk_seq')
+        if last_chunk_seq is not None and (not isinstance(last_chunk_seq, int) or isinstance(last_chunk_seq, bool)):
+            return Response({"error": "last_chunk_seq must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+        fields = {}
+        if 'corrected_query' in request.data:
+            fields['corrected_query'] = request.data['corrected_query']
+
+        user = request.user
+        if finalize(query_id, user.pk, last_chunk_seq, **fields):
+            # Same accounting as SaveQueryView: employees' searches aren't counted
+            if not Employee.objects.filter(user=user).exists():
+                UserSearchCount.increment_search_count(user)
+                account_changed(user.pk)
+            bump_version('queries', user.pk)
+            invalidate_query_details([query_id])
+
+        query = Query.objects.filter(query_id=query_id).first()
+        if query is None:
+            return Response({"error": "Query not found"}, status=status.HTTP_404_NOT_FOUND)
+        if query.user_id != user.pk:
+            return Response(
+                {"error": "You don't have permission to access this query"},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        if query.status != Query.STATUS_COMPLETE:
+            return Response(
+                query_stream_data(query_id, query.last_chunk_seq, query.status),
+                status=status.HTTP_409_CONFLICT
+            )
+        return Response(QuerySerializer(query).data)
+
+@method_decorator(csrf_exempt, name='dispatch')
+class GetQueriesByUserView(ConditionalGetMixin, APIView):
+    authentication_classes = [AccessTokenAuthentication, CsrfExemptSessionAuthentication]
     permission_classes = [permissions.IsAuthenticated]
+    etag_resources = ('queries',)
+    use_read_replica = True
 
     @swagger_auto_schema(
         operation_description="Gets all queries for the current user",
@@ -795,7 +979,8 @@ class GetQueriesByUserView(APIView):
                                 properties={
                                     "query_id": openapi.Schema(type=openapi.TYPE_STRING, format=openapi.FORMAT_UUID),
                                     "query": openapi.Schema(type=openapi.TYPE_STRING),
-                                    "created_at": openapi.Schema(type=openapi.TYPE_STRING, format="date-time")
+                                    "created_at": openapi.Schema(type=openapi.TYPE_STRING, format="date-time"),
+                                    "status": openapi.Schema(type=openapi.TYPE_STRING, enum=["streaming", "complete"])
                                 }
                             )
                         )
@@ -807,15 +992,16 @@ class GetQueriesByUserView(APIView):
     )
     def get(self, request):
         try:
-            # Get all queries for the user
-            queries = Query.objects.filter(user=request.user).order_by('-created_at')
+            # Get all queries for the user, including archived ones
+            queries = user_history(request.user)
             
             # Format the response
             query_list = [
                 {
-                    "query_id": str(query.query_id),
-                    "query": query.query,
-                    "created_at": query.created_at.isoformat()
+                    "query_id": str(query["query_id"]),
+                    "query": query["query"],
+                    "created_at": query["created_at"].isoformat(),
+                    "status": query["status"]
                 }
                 for query in queries
             ]
@@ -828,10 +1014,31 @@ class GetQueriesByUserView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+def query_detail_response(request, query_id):
+    """Shared by both query detail endpoints; served from the query detail cache."""
+    detail = get_query_detail(query_id)
+    if detail is None:
+        return Response(
+            {"error": "Query not found"},
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    # Check if the query belongs to the user
+    owner_id, data = detail
+    if owner_id != request.user.pk:
+        return Response(
+            {"error": "You don't have permission to access this query"},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    return Response(data)
+
 @method_decorator(csrf_exempt, name='dispatch')
-class GetQueryResponseByIdView(APIView):
-    authentication_classes = [CsrfExemptSessionAuthentication]
+class GetQueryResponseByIdView(ConditionalGetMixin, APIView):
+    authentication_classes = [AccessTokenAuthentication, CsrfExemptSessionAuthentication]
     permission_classes = [permissions.IsAuthenticated]
+    etag_resources = ('queries',)
+    use_read_replica = True
+    cache_compressed_responses = True
     
     @swagger_auto_schema(
         operation_description="Gets a specific query by ID",
@@ -851,25 +1058,76 @@ class GetQueryResponseByIdView(APIView):
         }
     )
     def get(self, request, query_id):
-        try:
-            query = Query.objects.get(query_id=query_id)
-            
-            # Check if the query belongs to the user
-            if query.user != request.user:
-                return Response(
-                    {"error": "You don't have permission to access this query"},
-                    status=status.HTTP_403_FORBIDDEN
-                )
-            
-            # Use the serializer to format the response
-            return Response(QuerySerializer(query).data)
-            
-        except Query.DoesNotExist:
+        return query_detail_response(request, query_id)
+
+@method_decorator(csrf_exempt, name='dispatch')
+class GetQueriesBatchView(ConditionalGetMixin, APIView):
+    """
+    Fetch several saved queries in one request, e.g. when the history UI opens many at once.
+    """
+    authentication_classes = [AccessTokenAuthentication, CsrfExemptSessionAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+    etag_resources = ('queries',)
+    use_read_replica = True
+    max_ids = 50
+
+    @swagger_auto_schema(
+        operation_description=(
+            "Gets up to 50 queries by ID in a single round trip. Results follow the order of `ids`; "
+            "each entry has status ok, not_found, forbidden or invalid_id."
+        ),
+        manual_parameters=[
+            openapi.Parameter(
+                'ids',
+                openapi.IN_QUERY,
+                description="Comma-separated query IDs",
+                type=openapi.TYPE_STRING,
+                required=True
+            )
+        ],
+        responses={
+            200: "Queries in request order with a status per ID",
+            400: "No IDs or too many IDs"
+        }
+    )
+    def get(self, request):
+        raw_ids = [value.strip() for value in request.query_params.get('ids', '').split(',') if value.strip()]
+        if not raw_ids:
+            return Response({"error": "Provide query IDs as ?ids=<id>,<id>"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(raw_ids) > self.max_ids:
             return Response(
-                {"error": "Query not found"},
-                status=status.HTTP_404_NOT_FOUND
+                {"error": f"At most {self.max_ids} query IDs can be fetched at once"},
+                status=status.HTTP_400_BAD_REQUEST
             )
 
+        parsed = {}
+        for raw_id in raw_ids:
+            try:
+                parsed[raw_id] = uuid.UUID(raw_id)
+            except ValueError:
+                parsed[raw_id] = None
+        wanted = {query_id for query_id in parsed.values() if query_id}
+
+        found = get_user_queries(request.user, wanted)
+        # Only when something is missing: a primary key lookup to tell other users' queries apart
+        forbidden = set()
+        if len(found) < len(wanted):
+            forbidden = existing_query_ids(wanted - found.keys())
+
+        results = []
+        for raw_id in raw_ids:
+            query_id = parsed[raw_id]
+            if query_id is None:
+                results.append({"query_id": raw_id, "status": "invalid_id"})
+            elif query_id in found:
+                results.append({"query_id": str(query_id), "status": "ok", "query": QuerySerializer(found[query_id]).data})
+            elif query_id in forbidden:
+                results.append({"query_id": str(query_id), "status": "forbidden"})
+            else:
+                results.append({"query_id": str(query_id), "status": "not_found"})
+
+        return Response({"results": results}, status=status.HTTP_200_OK)
+
 @method_decorator(csrf_exempt, name='dispatch')
 class CreateCheckoutSessionView(APIView):
     authentication_classes = [CsrfExemptSessionAuthentication]
@@ -993,9 +1251,14 @@ class CreateCheckoutSessionView(APIView):
 
 
 @method_decorator(csrf_exempt, name='dispatch')
-class CheckSubscriptionView(APIView):
-    authentication_classes = [CsrfExemptSessionAuthentication]
+class CheckSubscriptionView(ConditionalGetMixin, APIView):
+    authentication_classes = [AccessTokenAuthentication, CsrfExemptSessionAuthentication]
     permission_classes = [permissions.IsAuthenticated]
+    etag_resources = ('subscription',)
+
+    def etag_variant(self, request, *args, **kwargs):
+        # customer_portal_url is a short-lived Stripe link, so let clients refetch a fresh one
+        return (*super().etag_variant(request, *args, **kwargs), int(time.time() // PORTAL_URL_REUSE_SECONDS))
 
     @swagger_auto_schema(
         operation_description="Gets the current user's subscription status and details",
@@ -1133,6 +1396,8 @@ class ForgotPasswordView(APIView):
     """
     authentication_classes = [CsrfExemptSessionAuthentication]
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [TokenBucketThrottle]
+    throttle_scope = 'password_reset'
 
     @swagger_auto_schema(
         request_body=ForgotPasswordSerializer,
@@ -1165,8 +1430,11 @@ class ForgotPasswordView(APIView):
                 return Response({"error": "Email not registered"}, status=status.HTTP_404_NOT_FOUND)
 
             # Generate and send OTP
-            otp = get_random_string(length=6, allowed_chars="0123456789")
-            redis_client.setex(f"reset_otp:{email}", 300, otp)
+            try:
+                otp = issue_otp(email, "password_reset")
+            except OTPError as e:
+                ssl._create_default_https_context = original_context
+                return otp_error_response(e)
 
             try:
                 print(f"Sending OTP email to {email}")
@@ -1193,7 +1461,7 @@ class ForgotPasswordView(APIView):
                     email=email,
                     otp_code=otp,
                     action_type="password reset",
-                    expiry_minutes=5,
+                    expiry_minutes=otp_expiry_minutes(),
                     user_name=user_name
                 )
                 print("Email sent successfully")
@@ -1247,19 +1515,17 @@ class ResetPasswordView(APIView):
                 return Response({"error": "Email not registered"}, status=status.HTTP_404_NOT_FOUND)
 
             # Verify OTP
-            stored_otp = redis_client.get(f"reset_otp:{email}")
-            if not stored_otp:
-                return Response({"error": "OTP expired or not found"}, status=status.HTTP_400_BAD_REQUEST)
-            
-            if stored_otp != otp:
-                return Response({"error": "Invalid OTP"}, status=status.HTTP_400_BAD_REQUEST)
+            try:
+                verify_otp(email, "password_reset", otp)
+            except OTPError as e:
+                return otp_error_response(e)
             
             # Set new password
             user.set_password(new_password)
             user.save()
             
-            # Clean up Redis
-            redis_client.delete(f"reset_otp:{email}")
+            # Tokens issued before the reset must stop working
+            revoke_access_tokens(user.id)
             
             return Response({"message": "Password reset successful"}, status=status.HTTP_200_OK)
         except Exception as e:
@@ -1304,7 +1570,12 @@ class ChangePasswordView(APIView):
             # Update session auth hash to prevent logout
             update_session_auth_hash(request, user)
             
-            return Response({"message": "Password changed successfully"}, status=status.HTTP_200_OK)
+            # Revoke outstanding access tokens and hand this client a fresh one
+            revoke_access_tokens(user.id)
+            response_data = {"message": "Password changed successfully"}
+            response_data.update(access_token_response_data(user))
+            
+            return Response(response_data, status=status.HTTP_200_OK)
         except Exception as e:
             return Response({"error": "Password change failed", "details": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -1502,6 +1773,7 @@ class CompleteEmployeeRegistrationView(APIView):
                 "is_employee": True,  # Add is_employee flag
                 "session_id": request.session.session_key
             }
+            employee_data.update(access_token_response_data(custom_user))
             
             return Response(employee_data, status=status.HTTP_201_CREATED)
         except Exception as e:
@@ -1514,8 +1786,9 @@ class CompanyEmployeesView(APIView):
     List and manage company employees.
     GET: List all employees
     """
-    authentication_classes = [CsrfExemptSessionAuthentication]
+    authentication_classes = [AccessTokenAuthentication, CsrfExemptSessionAuthentication]
     permission_classes = [permissions.IsAuthenticated]
+    use_read_replica = True
 
     @swagger_auto_schema(
         responses={
@@ -1573,7 +1846,7 @@ class CompanyEmployeeDetailView(APIView):
 
     @swagger_auto_schema(
         responses={
-            204: "Employee deleted successfully",
+            202: "Employee removed; account deletion queued",
             403: "Not authorized (not a company account)",
             404: "Employee not found or company profile not found",
             500: "Internal server error"
@@ -1604,16 +1877,16 @@ class CompanyEmployeeDetailView(APIView):
             except Http404 as e:
                 return Response({"error": str(e)}, status=status.HTTP_404_NOT_FOUND)
             
-            # Delete employee and associated user account
-            with transaction.atomic():
-                # Get the user account
-                user_account = employee.user
-                # Delete the employee record
-                employee.delete()
-                # Delete the user account
-                user_account.delete()
-            
-            return Response(status=status.HTTP_204_NO_CONTENT)
+            # Disable the account now; delete_accounts removes it and its data in the background
+            user_account = employee.user
+            deletion = request_account_deletion(user_account)
+            # Drop the employee record straight away so the seat is freed and they leave the list
+            employee.delete()
+            
+            return Response(
+                {"message": "Employee removed; their account is being deleted", "deletion_id": deletion.pk},
+                status=status.HTTP_202_ACCEPTED
+            )
         except Exception as e:
             return Response(
                 {"error": "Failed to delete employee", "details": str(e)}, 
@@ -1628,6 +1901,7 @@ class SubscriptionPlansView(APIView):
     """
     authentication_classes = [CsrfExemptSessionAuthentication]
     permission_classes = [permissions.AllowAny]
+    use_read_replica = True
 
     @swagger_auto_schema(
         operation_description="Gets a list of available subscription plans",
@@ -1754,17 +2028,91 @@ class SubscriptionPlansView(APIView):
         plan_id = str(plan.plan_id).lower()
         return features_map.get(plan_id, [])
 
+# ---- Search Usage ----
+@method_decorator(csrf_exempt, name='dispatch')
+class SearchUsageView(APIView):
+    """
+    Get the user's monthly search usage.
+    """
+    authentication_classes = [AccessTokenAuthentication, CsrfExemptSessionAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+    use_read_replica = True
+
+    @swagger_auto_schema(
+        operation_description="Gets the current user's search totals per month, newest first",
+        manual_parameters=[
+            openapi.Parameter(
+                'months',
+                openapi.IN_QUERY,
+                description="Number of months to include (default 12, max 36)",
+                type=openapi.TYPE_INTEGER
+            )
+        ],
+        responses={
+            200: openapi.Response(
+                description="Monthly search usage",
+                schema=openapi.Schema(
+                    type=openapi.TYPE_OBJECT,
+                    properties={
+                        "usage": openapi.Schema(
+                            type=openapi.TYPE_ARRAY,
+                            items=openapi.Schema(
+                                type=openapi.TYPE_OBJECT,
+                                properties={
+                                    "month": openapi.Schema(type=openapi.TYPE_STRING),
+                                    "searches": openapi.Schema(type=openapi.TYPE_INTEGER),
+                                    "active_days": openapi.Schema(type=openapi.TYPE_INTEGER)
+                                }
+                            )
+                        )
+                    }
+                )
+            ),
+            400: "Invalid months parameter"
+        }
+    )
+    def get(self, request):
+        try:
+            months = min(int(request.query_params.get('months', 12)), 36)
+            if months < 1:
+                raise ValueError
+        except ValueError:
+            return Response({"error": "months must be a positive integer"}, status=status.HTTP_400_BAD_REQUEST)
+
+        today = timezone.now().date()
+        month_index = today.year * 12 + today.month - months
+        since = today.replace(year=month_index // 12, month=month_index % 12 + 1, day=1)
+
+        usage = [
+            {
+                "month": row["month"].strftime("%Y-%m"),
+                "searches": row["searches"],
+                "active_days": row["active_days"]
+            }
+            for row in MonthlySearchUsage.usage_for(request.user, since)
+        ]
+        return Response({"usage": usage}, status=status.HTTP_200_OK)
+
 # ---- Billing History ----
 @method_decorator(csrf_exempt, name='dispatch')
-class BillingHistoryView(APIView):
+class BillingHistoryView(ConditionalGetMixin, APIView):
     """
     Get user's billing history.
     """
-    authentication_classes = [CsrfExemptSessionAuthentication]
+    authentication_classes = [AccessTokenAuthentication, CsrfExemptSessionAuthentication]
     permission_classes = [permissions.IsAuthenticated]
+    etag_resources = ('billing',)
+    use_read_replica = True
 
     @swagger_auto_schema(
-        operation_description="Gets the current user's billing history",
+        operation_description=(
+            "Gets the current user's billing history, newest first. Pass next_cursor back as "
+            "`cursor` for the following page. Send the ETag in If-None-Match to get 304 when nothing changed."
+        ),
+        manual_parameters=[
+            openapi.Parameter('cursor', openapi.IN_QUERY, description="Cursor from the previous page", type=openapi.TYPE_STRING),
+            openapi.Parameter('limit', openapi.IN_QUERY, description="Page size (default 50, max 100)", type=openapi.TYPE_INTEGER)
+        ],
         responses={
             200: openapi.Response(
                 description="Billing history retrieved successfully",
@@ -1784,23 +2132,46 @@ class BillingHistoryView(APIView):
                                     "receipt_url": openapi.Schema(type=openapi.TYPE_STRING, nullable=True)
                                 }
                             )
-                        )
+                        ),
+                        "next_cursor": openapi.Schema(type=openapi.TYPE_STRING, nullable=True)
                     }
                 )
-            )
+            ),
+            304: "Billing history unchanged",
+            400: "Invalid cursor or limit"
         }
     )
     def get(self, request):
         try:
             user = request.user
-            
-            # Get transactions from the database
-            from .models import Transaction
-            transactions = Transaction.objects.filter(user=user).order_by('-date')
+            cursor = request.query_params.get('cursor')
+            try:
+                limit = get_page_size(request)
+                after = None
+                if cursor:
+                    after_date, after_id = decode_cursor(cursor)
+                    after = (parse_datetime(after_date), int(after_id))
+                    if after[0] is None:
+                        raise ValueError("Invalid cursor")
+            except (TypeError, ValueError) as e:
+                return Response({"error": str(e) or "Invalid cursor"}, status=status.HTTP_400_BAD_REQUEST)
+
+            # Get transactions from the database, newest first, one page at a time
+            transactions = Transaction.objects.filter(user=user)
+            if after:
+                after_date, after_id = after
+                transactions = transactions.filter(
+                    Q(date__lt=after_date) | Q(date=after_date, id__lt=after_id)
+                )
+            page = list(transactions.order_by('-date', '-id')[:limit + 1])
+            next_cursor = None
+            if len(page) > limit:
+                page = page[:limit]
+                next_cursor = encode_cursor(page[-1].date.isoformat(), page[-1].id)
             
             # Format transactions for response
             formatted_transactions = []
-            for transaction in transactions:
+            for transaction in page:
                 formatted_transactions.append({
                     "id": transaction.id,
                     "amount": float(transaction.amount),
@@ -1810,7 +2181,10 @@ class BillingHistoryView(APIView):
                     "receipt_url": transaction.receipt_url
                 })
             
-            return Response({"transactions": formatted_transactions}, status=status.HTTP_200_OK)
+            return Response(
+                {"transactions": formatted_transactions, "next_cursor": next_cursor},
+                status=status.HTTP_200_OK
+            )
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -1873,6 +2247,7 @@ class ActivateSubscriptionView(APIView):
                 subscription.current_period_start = timezone.now()
                 subscription.current_period_end = timezone.now() + timedelta(days=plan.validity)
                 subscription.save()
+            subscription_changed(user.pk)
             
             # Create a test transaction record
             Transaction.objects.create(
@@ -1883,6 +2258,7 @@ class ActivateSubscriptionView(APIView):
                 description=f"Test payment for {plan.name}",
                 date=timezone.now()
             )
+            bump_version('billing', user.pk)
                 
             return Response({
                 "message": "Subscription activated successfully",
@@ -1948,6 +2324,7 @@ class RefreshSessionView(APIView):
                 "session_id": new_session_id,
                 "user": CustomUserSerializer(user).data
             }
+            response_data.update(access_token_response_data(user))
             
             # Add name fields based on user type
             name = None
@@ -2021,6 +2398,14 @@ class SessionStatusView(APIView):
     )
     def get(self, request):
         try:
+            # A signed access token can be checked without loading the session or user
+            access_token = get_request_access_token(request)
+            if access_token:
+                return Response(
+                    {"is_authenticated": verify_access_token(access_token) is not None},
+                    status=status.HTTP_200_OK
+                )
+            
             # Get session ID from header
             session_id = request.META.get('HTTP_X_SESSION_ID')
             
@@ -2113,6 +2498,7 @@ class CancelSubscriptionView(APIView):
             # Update the local subscription record
             subscription.status = "active_until_period_end"
             subscription.save()
+            subscription_changed(subscription.user_id)
             
             # Get the end date of the current period
             timestamp = stripe_subscription.current_period_end
@@ -2142,12 +2528,17 @@ class CancelSubscriptionView(APIView):
             )
 
 @method_decorator(csrf_exempt, name='dispatch')
-class CheckUserFeaturesView(APIView):
+class CheckUserFeaturesView(ConditionalGetMixin, APIView):
     """
     Check what features a user has access to based on their subscription plan.
     """
-    authentication_classes = [CsrfExemptSessionAuthentication]
+    authentication_classes = [AccessTokenAuthentication, CsrfExemptSessionAuthentication]
     permission_classes = [permissions.IsAuthenticated]
+    etag_resources = ('account', 'subscription')
+
+    def etag_variant(self, request, *args, **kwargs):
+        # The free search allowance resets at midnight
+        return (*super().etag_variant(request, *args, **kwargs), timezone.now().date())
 
     @swagger_auto_schema(
         operation_description="Checks what features the current user has access to",
@@ -2229,12 +2620,56 @@ class CheckUserFeaturesView(APIView):
                 "message": "You're on the free plan. Upgrade to get unlimited searches and more features."
             })
 
+@method_decorator(csrf_exempt, name='dispatch')
+class BootstrapView(ConditionalGetMixin, APIView):
+    """
+    Everything the frontend needs on load in one call: session state, user, profile, effective
+    subscription, features and student approval. Replaces session/status/, check-user-features/,
+    subscription/status/ and student/approval-status/ at startup.
+    """
+    authentication_classes = [AccessTokenAuthentication, CsrfExemptSessionAuthentication]
+    permission_classes = [permissions.AllowAny]
+    etag_resources = ('account', 'subscription')
+
+    def etag_variant(self, request, *args, **kwargs):
+        # The free search allowance resets at midnight
+        return (*super().etag_variant(request, *args, **kwargs), timezone.now().date())
+
+    @swagger_auto_schema(
+        operation_description="Gets the current user's account, profile, subscription, features and approval state in one response",
+        responses={
+            200: openapi.Response(
+                description="Bootstrap data, or is_authenticated false when not signed in",
+                schema=openapi.Schema(
+                    type=openapi.TYPE_OBJECT,
+                    properties={
+                        "is_authenticated": openapi.Schema(type=openapi.TYPE_BOOLEAN),
+                        "user": openapi.Schema(type=openapi.TYPE_OBJECT),
+                        "profile": openapi.Schema(type=openapi.TYPE_OBJECT, nullable=True),
+                        "subscription": openapi.Schema(type=openapi.TYPE_OBJECT),
+                        "features": openapi.Schema(type=openapi.TYPE_OBJECT),
+                        "student_approval": openapi.Schema(type=openapi.TYPE_OBJECT, nullable=True),
+                    }
+                )
+            )
+        }
+    )
+    def get(self, request):
+        if not request.user.is_authenticated:
+            return Response({"is_authenticated": False}, status=status.HTTP_200_OK)
+        try:
+            return Response(get_bootstrap(request.user.pk), status=status.HTTP_200_OK)
+        except CustomUser.DoesNotExist:
+            return Response({"is_authenticated": False}, status=status.HTTP_200_OK)
+        except Exception as e:
+            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
 @method_decorator(csrf_exempt, name='dispatch')
 class CheckExportPermissionView(APIView):
     """
     Check if a user has permission to export a summary.
     """
-    authentication_classes = [CsrfExemptSessionAuthentication]
+    authentication_classes = [AccessTokenAuthentication, CsrfExemptSessionAuthentication]
     permission_classes = [permissions.IsAuthenticated]
 
     @swagger_auto_schema(
@@ -2267,18 +2702,17 @@ class CheckExportPermissionView(APIView):
         user = request.user
         
         # Check if query exists and belongs to user
-        try:
-            query = Query.objects.get(query_id=query_id)
-            if query.user != user:
-                return Response(
-                    {"error": "You don't have permission to access this query"}, 
-                    status=status.HTTP_403_FORBIDDEN
-                )
-        except Query.DoesNotExist:
+        query = find_query(query_id)
+        if query is None:
             return Response(
                 {"error": "Query not found"}, 
                 status=status.HTTP_404_NOT_FOUND
             )
+        if query.user_id != user.pk:
+            return Response(
+                {"error": "You don't have permission to access this query"}, 
+                status=status.HTTP_403_FORBIDDEN
+            )
         
         # Check if user is an employee
         try:
@@ -2297,6 +2731,7 @@ class CheckExportPermissionView(APIView):
                     plan_id='free',
                     status='active'
                 )
+                subscription_changed(user.pk)
         
         # Check if user's plan allows exports
         can_export = subscription.can_export_summaries()
@@ -2314,6 +2749,267 @@ class CheckExportPermissionView(APIView):
                 "upgrade_required": True
             }, status=status.HTTP_200_OK)
 
+@method_decorator(csrf_exempt, name='dispatch')
+class ExportQueriesView(APIView):
+    """
+    Stream the user's entire query history as JSONL, CSV or a ZIP of Markdown files.
+    """
+    authentication_classes = [AccessTokenAuthentication, CsrfExemptSessionAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description="Download the user's full query history in one streamed file",
+        manual_parameters=[
+            openapi.Parameter(
+                'export_format',
+                openapi.IN_PATH,
+                description="File format: jsonl, csv or zip (one Markdown file per query)",
+                type=openapi.TYPE_STRING,
+                enum=list(EXPORT_FORMATS)
+            )
+        ],
+        responses={
+            200: "Export file streamed",
+            400: "Unsupported export format",
+            403: "Current plan does not allow exports"
+        }
+    )
+    def get(self, request, export_format):
+        if export_format not in EXPORT_FORMATS:
+            return Response(
+                {"error": f"Unsupported export format. Choose one of: {', '.join(EXPORT_FORMATS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        subscription = Subscription.for_user(request.user)
+        if subscription is None or not subscription.can_export_summaries():
+            return Response({
+                "error": "Your current plan does not allow exporting summaries. Please upgrade to a paid plan.",
+                "upgrade_required": True
+            }, status=status.HTTP_403_FORBIDDEN)
+
+        content_type, extension = EXPORT_FORMATS[export_format]
+        response = StreamingHttpResponse(stream_export(request.user, export_format), content_type=content_type)
+        filename = f"recall-queries-{timezone.now():%Y-%m-%d}.{extension}"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        # Let proxies pass chunks through as they're produced instead of buffering the whole file
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+def render_status_data(request, render):
+    data = {
+        "query_id": str(render.query_id),
+        "format": render.format,
+        "status": render.status,
+    }
+    if render.status == QueryRender.STATUS_DONE:
+        data["download_url"] = request.build_absolute_uri(reverse("query_render_download", args=[render.cache_key]))
+    elif render.status == QueryRender.STATUS_FAILED:
+        data["error"] = "Rendering failed. Request the document again to retry."
+    return data
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class QueryRenderView(APIView):
+    """
+    Request a PDF/DOCX rendering of a query and poll its progress.
+    Documents are rendered by the render_queries worker; an unchanged query is rendered once.
+    """
+    authentication_classes = [AccessTokenAuthentication, CsrfExemptSessionAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+
+    render_parameters = [
+        openapi.Parameter('query_id', openapi.IN_PATH, type=openapi.TYPE_STRING, format=openapi.FORMAT_UUID),
+        openapi.Parameter('render_format', openapi.IN_PATH, type=openapi.TYPE_STRING, enum=list(RENDER_CONTENT_TYPES)),
+    ]
+
+    def get_query(self, request, query_id, render_format):
+        """Return (query, None), or (None, error response) for a bad format or someone else's query."""
+        if render_format not in RENDER_CONTENT_TYPES:
+            return None, Response(
+                {"error": f"Unsupported format. Choose one of: {', '.join(RENDER_CONTENT_TYPES)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        query = Query.objects.filter(query_id=query_id, user=request.user).only('query_id', 'updated_at').first()
+        if query is None:
+            return None, Response({"error": "Query not found"}, status=status.HTTP_404_NOT_FOUND)
+        return query, None
+
+    @swagger_auto_schema(
+        operation_description="Queue a PDF or DOCX rendering of a query (returns immediately)",
+        manual_parameters=render_parameters,
+        responses={
+            200: "Document already rendered; download_url included",
+            202: "Rendering queued",
+            400: "Unsupported format",
+            403: "Current plan does not allow exports",
+            404: "Query not found"
+        }
+    )
+    def post(self, request, query_id, render_format):
+        query, error_response = self.get_query(request, query_id, render_format)
+        if error_response:
+            return error_response
+
+        subscription = Subscription.for_user(request.user)
+        if subscription is None or not subscription.can_export_summaries():
+            return Response({
+                "error": "Your current plan does not allow exporting summaries. Please upgrade to a paid plan.",
+                "upgrade_required": True
+            }, status=status.HTTP_403_FORBIDDEN)
+
+        render, created = QueryRender.objects.get_or_create(
+            cache_key=render_cache_key(query, render_format),
+            defaults={"query": query, "format": render_format}
+        )
+        if render.status == QueryRender.STATUS_FAILED:
+            # An explicit new request gets a fresh set of attempts
+            render.status = QueryRender.STATUS_PENDING
+            render.attempts = 0
+            render.save(update_fields=['status', 'attempts', 'updated_at'])
+
+        response_status = status.HTTP_200_OK if render.status == QueryRender.STATUS_DONE else status.HTTP_202_ACCEPTED
+        return Response(render_status_data(request, render), status=response_status)
+
+    @swagger_auto_schema(
+        operation_description="Check the status of the latest rendering of a query",
+        manual_parameters=render_parameters,
+        responses={
+            200: "Render status",
+            404: "Query not found or no rendering requested"
+        }
+    )
+    def get(self, request, query_id, render_format):
+        query, error_response = self.get_query(request, query_id, render_format)
+        if error_response:
+            return error_response
+        render = QueryRender.objects.filter(cache_key=render_cache_key(query, render_format)).first()
+        if render is None:
+            return Response(
+                {"error": "No rendering has been requested for the current version of this query"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        return Response(render_status_data(request, render), status=status.HTTP_200_OK)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class QueryRenderDownloadView(APIView):
+    """
+    Download a rendered document. The URL is content-addressed, so the file behind it
+    never changes and clients may cache it indefinitely.
+    """
+    authentication_classes = [AccessTokenAuthentication, CsrfExemptSessionAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description="Download a rendered PDF/DOCX",
+        responses={
+            200: "Document file",
+            304: "Not modified",
+            404: "Document not found"
+        }
+    )
+    def get(self, request, cache_key):
+        render = QueryRender.objects.filter(
+            cache_key=cache_key,
+            query__user=request.user,
+            status=QueryRender.STATUS_DONE
+        ).only('cache_key', 'format', 'file').first()
+        if render is None or not render.file:
+            return Response({"error": "Document not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        etag = f'"{render.cache_key}"'
+        cache_control = 'private, max-age=31536000, immutable'
+        if etag in request.headers.get('If-None-Match', ''):
+            response = HttpResponseNotModified()
+        else:
+            response = FileResponse(
+                render.file.open('rb'),
+                as_attachment=True,
+                filename=f"recall-summary.{render.format}",
+                content_type=RENDER_CONTENT_TYPES[render.format]
+            )
+        response['ETag'] = etag
+        response['Cache-Control'] = cache_control
+        return response
+
+
+def data_export_status_data(request, export):
+    data = {
+        "export_id": str(export.export_id),
+        "status": export.status,
+        "created_at": export.created_at.isoformat(),
+    }
+    if export.status == DataExport.STATUS_DONE:
+        data["size"] = export.size
+        data["expires_at"] = export.expires_at.isoformat()
+        data["download_url"] = request.build_absolute_uri(
+            reverse("data_export_download", args=[download_token(export)])
+        )
+    elif export.status == DataExport.STATUS_FAILED:
+        data["error"] = "The export failed. Request a new one to retry."
+    return data
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class DataExportView(APIView):
+    """
+    Request a copy of everything stored about the current user and poll its progress.
+    The ZIP is built by the export_user_data worker.
+    """
+    authentication_classes = [AccessTokenAuthentication, CsrfExemptSessionAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description="Queue a personal-data export (returns immediately). "
+                              "An export that is already queued or running is returned instead of starting another.",
+        responses={202: "Export queued"}
+    )
+    def post(self, request):
+        export = DataExport.objects.filter(
+            user=request.user, status__in=[DataExport.STATUS_PENDING, DataExport.STATUS_RUNNING]
+        ).first()
+        if export is None:
+            export = DataExport.objects.create(user=request.user)
+        return Response(data_export_status_data(request, export), status=status.HTTP_202_ACCEPTED)
+
+    @swagger_auto_schema(
+        operation_description="Status of the latest personal-data export, with a signed download link once it's ready",
+        responses={200: "Export status", 404: "No export requested"}
+    )
+    def get(self, request):
+        export = DataExport.objects.filter(user=request.user).order_by('-created_at').first()
+        if export is None:
+            return Response({"error": "No data export requested"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(data_export_status_data(request, export))
+
+
+class DataExportDownloadView(APIView):
+    """
+    Download a personal-data export. The signed token in the URL is the credential, so the
+    link works from any device until the export expires.
+    """
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
+
+    @swagger_auto_schema(
+        operation_description="Download a personal-data export ZIP",
+        responses={200: "ZIP file", 404: "Link invalid or expired"}
+    )
+    def get(self, request, token):
+        export = export_from_token(token)
+        if export is None or not export.file:
+            return Response({"error": "This download link is invalid or has expired"}, status=status.HTTP_404_NOT_FOUND)
+
+        response = FileResponse(
+            export.file.open('rb'),
+            as_attachment=True,
+            filename=f"recall-data-{export.created_at:%Y-%m-%d}.zip",
+            content_type='application/zip'
+        )
+        response['Cache-Control'] = 'private, no-store'
+        return response
+
 # ---- Student Signup (OTP Sending) ----
 
 class StudentSignupView(APIView):
@@ -2322,6 +3018,8 @@ class StudentSignupView(APIView):
     """
     authentication_classes = [CsrfExemptSessionAuthentication]
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [TokenBucketThrottle]
+    throttle_scope = 'otp'
     
     @swagger_auto_schema(
         operation_description="Student signup step 1: Send OTP to email",
@@ -2344,14 +3042,11 @@ class StudentSignupView(APIView):
             if CustomUser.objects.filter(email=email).exists():
                 return Response({"error": "Email already registered"}, status=status.HTTP_400_BAD_REQUEST)
 
-            # Generate 6-digit OTP
-            otp = "".join([str(random.randint(0, 9)) for _ in range(6)])
-
-            # Store OTP in session
-            request.session['signup_otp'] = otp
-            request.session['signup_email'] = email
-            request.session['signup_type'] = 'student'
-            request.session['otp_created_at'] = datetime.now().timestamp()
+            # Generate and store 6-digit OTP
+            try:
+                otp = issue_otp(email, "signup", user_type="student")
+            except OTPError as e:
+                return otp_error_response(e)
 
             # Send OTP to email
             try:
@@ -2359,7 +3054,7 @@ class StudentSignupView(APIView):
                     email=email,
                     otp_code=otp,
                     action_type="student registration",
-                    expiry_minutes=5
+                    expiry_minutes=otp_expiry_minutes()
                 )
                 return Response({"message": "OTP sent to email"}, status=status.HTTP_200_OK)
             except Exception as e:
@@ -2399,26 +3094,13 @@ class VerifyStudentOTPView(APIView):
             email = serializer.validated_data["email"]
             otp = serializer.validated_data["otp"]
 
-            # Verify session data
-            if not request.session.get('signup_otp') or not request.session.get('signup_email'):
-                return Response({"error": "No OTP session found. Please request a new OTP"}, status=status.HTTP_400_BAD_REQUEST)
-
-            if email != request.session.get('signup_email'):
-                return Response({"error": "Email mismatch"}, status=status.HTTP_400_BAD_REQUEST)
-
-            if request.session.get('signup_type') != 'student':
-                return Response({"error": "Invalid registration type"}, status=status.HTTP_400_BAD_REQUEST)
-
-            # Check OTP expiration (10 minutes)
-            created_at = request.session.get('otp_created_at')
-            if not created_at or (datetime.now().timestamp() - created_at) > 600:
-                return Response({"error": "OTP expired. Please request a new one"}, status=status.HTTP_400_BAD_REQUEST)
-
-            if otp != request.session.get('signup_otp'):
-                return Response({"error": "Invalid OTP"}, status=status.HTTP_400_BAD_REQUEST)
+            try:
+                verify_otp(email, "signup", otp)
+            except OTPError as e:
+                return otp_error_response(e)
 
-            # OTP verified, set verification flag in session
-            request.session['otp_verified'] = True
+            # OTP verified, save verification status in Redis
+            mark_email_verified(email, "student")
 
             return Response({"message": "OTP verified successfully"}, status=status.HTTP_200_OK)
         except Exception as e:
@@ -2454,9 +3136,19 @@ class CompleteStudentRegistrationView(APIView):
             email = serializer.validated_data["email"]
             
             # Check if email was verified using Redis
-            verified = redis_client.get(f"verified:{email}")
-            if not verified:
+            if not get_verified_user_type(email):
                 return Response({"error": "OTP verification required"}, status=status.HTTP_400_BAD_REQUEST)
+
+            upload = None
+            if serializer.validated_data.get("student_id_upload"):
+                upload = StudentIdUpload.objects.filter(
+                    upload_id=serializer.validated_data["student_id_upload"],
+                    email=email,
+                    completed_at__isnull=False,
+                    student__isnull=True,
+                ).first()
+                if upload is None:
+                    return Response({"error": "Student ID upload not found or not finished"}, status=status.HTTP_400_BAD_REQUEST)
             
             # Create CustomUser
             user = CustomUser.objects.create_user(
@@ -2473,14 +3165,34 @@ class CompleteStudentRegistrationView(APIView):
                 last_name=serializer.validated_data["last_name"],
                 phone_number=serializer.validated_data["phone_number"],
                 date_of_birth=serializer.validated_data["date_of_birth"],
-                student_id=serializer.validated_data["student_id"],  # Required file upload
+                student_id=serializer.validated_data.get("student_id"),  # Set from the upload once it's processed
                 student_organisation_name=serializer.validated_data["student_organisation_name"],
                 terms_and_conditions=serializer.validated_data["terms_and_conditions"],
                 is_approved=False,  # Default to not approved
             )
 
+            if upload is not None:
+                upload.student = student
+                upload.save(update_fields=['student', 'updated_at'])
+                # If process_student_ids already finished, it won't look at this upload again
+                upload.refresh_from_db()
+                if upload.status == StudentIdUpload.STATUS_DONE:
+                    attach_to_student(upload)
+            else:
+                # Documents posted directly still need a preview for the approval screen
+                StudentIdUpload.objects.create(
+                    email=email,
+                    filename=student.student_id.name,
+                    content_type=serializer.validated_data["student_id"].content_type or '',
+                    size=student.student_id.size,
+                    received=student.student_id.size,
+                    completed_at=timezone.now(),
+                    file=student.student_id.name,
+                    student=student,
+                )
+
             # Clean up Redis
-            redis_client.delete(f"verified:{email}")
+            clear_email_verified(email)
 
             # Log the user in
             login(request, user)
@@ -2496,6 +3208,7 @@ class CompleteStudentRegistrationView(APIView):
             }
 
             user_data["session_id"] = request.session.session_key
+            user_data.update(access_token_response_data(user))
             
             # Send welcome email
             try:
@@ -2507,11 +3220,128 @@ class CompleteStudentRegistrationView(APIView):
         except Exception as e:
             return Response({"error": "Student registration failed", "details": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+def student_id_upload_data(upload):
+    return {
+        "upload_id": str(upload.upload_id),
+        "size": upload.size,
+        "received": upload.received,
+        "complete": upload.completed_at is not None,
+        "chunk_size": settings.STUDENT_ID_CHUNK_BYTES,
+    }
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class StudentIdUploadView(APIView):
+    """
+    Start a chunked upload of a student ID document, before registration is completed.
+    """
+    authentication_classes = [CsrfExemptSessionAuthentication]
+    permission_classes = [permissions.AllowAny]
+
+    @swagger_auto_schema(
+        operation_description="Student signup step 3a: start a resumable student ID upload. "
+                              "Send the file in chunks to the returned upload, then pass upload_id as "
+                              "student_id_upload when completing registration.",
+        request_body=StudentIdUploadSerializer,
+        responses={
+            201: openapi.Response("Upload created"),
+            400: "OTP not verified, unsupported file type or file too large",
+        }
+    )
+    def post(self, request):
+        serializer = StudentIdUploadSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response({"errors": serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        data = serializer.validated_data
+        if not get_verified_user_type(data["email"]):
+            return Response({"error": "OTP verification required"}, status=status.HTTP_400_BAD_REQUEST)
+        if data["content_type"] not in ALLOWED_CONTENT_TYPES:
+            return Response({"error": f"Unsupported file type {data['content_type']}"}, status=status.HTTP_400_BAD_REQUEST)
+        if data["size"] > settings.STUDENT_ID_MAX_BYTES:
+            return Response({"error": f"File is larger than {settings.STUDENT_ID_MAX_BYTES} bytes"}, status=status.HTTP_400_BAD_REQUEST)
+
+        upload = StudentIdUpload.objects.create(**data)
+        return Response(student_id_upload_data(upload), status=status.HTTP_201_CREATED)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class StudentIdUploadChunkView(APIView):
+    """
+    Append a chunk to a student ID upload, or check how much has arrived so an interrupted
+    upload can resume. Each chunk goes straight to storage; nothing is assembled here.
+    """
+    authentication_classes = [CsrfExemptSessionAuthentication]
+    permission_classes = [permissions.AllowAny]
+
+    @swagger_auto_schema(
+        operation_description="Bytes received so far; resume by sending the next chunk from `received`",
+        responses={200: openapi.Response("Upload progress"), 404: "Upload not found"}
+    )
+    def get(self, request, upload_id):
+        upload = StudentIdUpload.objects.filter(upload_id=upload_id).first()
+        if upload is None:
+            return Response({"error": "Upload not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(student_id_upload_data(upload))
+
+    @swagger_auto_schema(
+        operation_description="Send the raw bytes of one chunk with a `Content-Range: bytes start-end/size` header. "
+                              "`start` must equal the upload's `received`.",
+        manual_parameters=[
+            openapi.Parameter('Content-Range', openapi.IN_HEADER, type=openapi.TYPE_STRING, required=True),
+        ],
+        responses={
+            200: openapi.Response("Chunk stored"),
+            400: "Missing or invalid Content-Range, or chunk too large",
+            404: "Upload not found",
+            409: "Chunk doesn't start where the upload left off; resume from `received`",
+        }
+    )
+    def put(self, request, upload_id):
+        try:
+            unit, _, byte_range = request.headers.get('Content-Range', '').partition(' ')
+            span, _, total = byte_range.partition('/')
+            start, end = (int(value) for value in span.split('-'))
+            total = int(total)
+        except ValueError:
+            return Response({"error": "Content-Range header must be 'bytes start-end/size'"}, status=status.HTTP_400_BAD_REQUEST)
+        if unit != 'bytes' or end < start:
+            return Response({"error": "Content-Range header must be 'bytes start-end/size'"}, status=status.HTTP_400_BAD_REQUEST)
+        if end - start + 1 > settings.STUDENT_ID_CHUNK_BYTES:
+            return Response({"error": f"Chunks can be at most {settings.STUDENT_ID_CHUNK_BYTES} bytes"}, status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            # Serialise chunks of the same upload so `received` can't be advanced twice
+            upload = StudentIdUpload.objects.select_for_update().filter(upload_id=upload_id).first()
+            if upload is None:
+                return Response({"error": "Upload not found"}, status=status.HTTP_404_NOT_FOUND)
+            if total != upload.size or end >= upload.size:
+                return Response({"error": "Content-Range doesn't match the upload size"}, status=status.HTTP_400_BAD_REQUEST)
+            if upload.completed_at is not None or start != upload.received:
+                return Response(student_id_upload_data(upload), status=status.HTTP_409_CONFLICT)
+
+            data = request.body
+            if len(data) != end - start + 1:
+                return Response({"error": "Body length doesn't match Content-Range"}, status=status.HTTP_400_BAD_REQUEST)
+
+            store_chunk(upload, start, data)
+            upload.received = end + 1
+            update_fields = ['received', 'updated_at']
+            if upload.received == upload.size:
+                # Hands the upload to process_student_ids
+                upload.completed_at = timezone.now()
+                update_fields.append('completed_at')
+            upload.save(update_fields=update_fields)
+
+        return Response(student_id_upload_data(upload))
+
 # ---- Consolidated User Signup (OTP Sending) ----
 @method_decorator(csrf_exempt, name='dispatch')
 class SendOTPView(APIView):
     authentication_classes = [CsrfExemptSessionAuthentication]
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [TokenBucketThrottle]
+    throttle_scope = 'otp'
     """
     Consolidated endpoint for sending OTP for any user type (individual, company, student).
     """
@@ -2537,14 +3367,11 @@ class SendOTPView(APIView):
             if CustomUser.objects.filter(email=email).exists():
                 return Response({"error": "Email already registered"}, status=status.HTTP_400_BAD_REQUEST)
 
-            # Generate 6-digit OTP
-            otp = "".join([str(random.randint(0, 9)) for _ in range(6)])
-
-            # Store OTP in Redis (valid for 5 minutes)
-            redis_client.setex(f"otp:{email}", 300, otp)
-            
-            # Also store user_type in Redis for later reference
-            redis_client.setex(f"signup_type:{email}", 300, user_type)
+            # Generate 6-digit OTP and store its hash with the user_type in Redis
+            try:
+                otp = issue_otp(email, "signup", user_type=user_type)
+            except OTPError as e:
+                return otp_error_response(e)
             
             # Determine appropriate action type for the email
             action_type = f"{user_type} registration"
@@ -2555,7 +3382,7 @@ class SendOTPView(APIView):
                     email=email,
                     otp_code=otp,
                     action_type=action_type,
-                    expiry_minutes=5
+                    expiry_minutes=otp_expiry_minutes()
                 )
                 return Response({"message": "OTP sent to email"}, status=status.HTTP_200_OK)
             except Exception as e:
@@ -2592,26 +3419,17 @@ class VerifyOTPView(APIView):
             email = serializer.validated_data["email"]
             otp = serializer.validated_data["otp"]
             
-            # Get OTP from Redis
-            stored_otp = redis_client.get(f"otp:{email}")
-            if not stored_otp:
-                return Response({"errors": "OTP expired or not found"}, status=status.HTTP_400_BAD_REQUEST)
-            
-            # Compare OTP (note: stored_otp is already a string because decode_responses=True in Redis client)
-            if otp != stored_otp:
-                return Response({"errors": "Invalid OTP"}, status=status.HTTP_400_BAD_REQUEST)
+            # Check the OTP against the hash stored in Redis; this also consumes it
+            try:
+                user_type = verify_otp(email, "signup", otp)
+            except OTPError as e:
+                return Response({"errors": e.message}, status=e.status_code)
             
-            # Get user type
-            user_type = redis_client.get(f"signup_type:{email}")
             if not user_type:
                 user_type = "individual"  # Default fallback
             
             # Mark email as verified (valid for 30 minutes)
-            redis_client.setex(f"verified:{email}", 1800, user_type)
-            
-            # Clean up OTP keys
-            redis_client.delete(f"otp:{email}")
-            redis_client.delete(f"signup_type:{email}")
+            mark_email_verified(email, user_type)
             
             return Response({
                 "message": "OTP verification successful", 
@@ -2626,7 +3444,7 @@ class StudentApprovalStatusView(APIView):
     """
     View to check if a student account has been approved by an admin.
     """
-    authentication_classes = [CsrfExemptSessionAuthentication]
+    authentication_classes = [AccessTokenAuthentication, CsrfExemptSessionAuthentication]
     permission_classes = [permissions.IsAuthenticated]
     
     @swagger_auto_schema(
@@ -2722,10 +3540,41 @@ class SyncStripeTransactionsView(APIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+
 @method_decorator(csrf_exempt, name='dispatch')
-class QueryDetailView(APIView):
-    authentication_classes = [CsrfExemptSessionAuthentication]
+class DatabasePoolStatsView(APIView):
+    """
+    Report connection pool wait time and saturation for the worker serving the request.
+    This is an admin-only endpoint meant to be scraped by monitoring.
+    """
+    authentication_classes = [AccessTokenAuthentication, CsrfExemptSessionAuthentication]
+    permission_classes = [permissions.IsAuthenticated, permissions.IsAdminUser]
+
+    @swagger_auto_schema(
+        operation_description="Returns database connection pool metrics for the current worker",
+        responses={
+            200: "Pool metrics",
+            403: "Permission denied",
+            500: "Error reading pool metrics"
+        }
+    )
+    def get(self, request):
+        try:
+            return Response(get_pool_stats(), status=status.HTTP_200_OK)
+        except Exception as e:
+            return Response(
+                {"error": f"Error reading pool metrics: {str(e)}"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class QueryDetailView(ConditionalGetMixin, APIView):
+    authentication_classes = [AccessTokenAuthentication, CsrfExemptSessionAuthentication]
     permission_classes = [permissions.IsAuthenticated]
+    etag_resources = ('queries',)
+    use_read_replica = True
+    cache_compressed_responses = True
 
     @swagger_auto_schema(
         operation_description="Get details of a specific query",
@@ -2745,21 +3594,5 @@ class QueryDetailView(APIView):
         }
     )
     def get(self, request, query_id):
-        try:
-            query = Query.objects.get(query_id=query_id)
-            
-            # Check if the query belongs to the user
-            if query.user != request.user:
-                return Response(
-                    {"error": "You don't have permission to access this query"},
-                    status=status.HTTP_403_FORBIDDEN
-                )
-            
-            return Response(QuerySerializer(query).data)
-            
-        except Query.DoesNotExist:
-            return Response(
-                {"error": "Query not found"},
-                status=status.HTTP_404_NOT_FOUND
-            )
+        return query_detail_response(request, query_id)
 